@@ -0,0 +1,137 @@
+"""
+Batch position analysis.
+
+Reads a position file (see positions.py), and for each position writes one
+JSON line with its Twisted-FEN, legal move count, check and checkmate status
+for the side to move and, with --depth, an engine score and best move.
+Input is read and output written as streams; at most workers * 2 chunks are
+in flight, so memory stays bounded however large the file is. Progress goes
+to stderr.
+
+Run: python analyze.py positions.fen [-o results.jsonl] [--workers N] [--depth D]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+from typing import Iterator, Optional, TextIO, Union
+
+from classes import Board, format_move
+from engine import Searcher, evaluate
+from positions import is_text, iter_records
+
+CHUNK = 256
+
+
+def analyze_position(board: Board, moves_this_round: int = 0, depth: Optional[int] = None) -> dict:
+    """Move count and check/mate status for board.turn; score and best move when depth is given."""
+    color = board.turn
+    moves = board.legal_moves(color)
+    check = board.is_in_check(color)
+    out = {
+        "fen": board.to_fen(moves_this_round),
+        "moves": len(moves),
+        "check": check,
+        "checkmate": check and not moves,
+    }
+    if depth is not None:
+        if depth == 0:
+            out["score"] = evaluate(board)
+        else:
+            result = Searcher(16).best_move(board, 10 ** 9, moves_this_round, depth)
+            out["score"] = result.score
+            out["best"] = format_move(*result.move) if result.move else None
+    return out
+
+
+def _analyze_chunk(items: list[Union[str, bytes]], depth: Optional[int]) -> list[str]:
+    lines = []
+    for item in items:
+        try:
+            board, mtr = Board.from_fen(item) if isinstance(item, str) else Board.from_bytes(item)
+            lines.append(json.dumps(analyze_position(board, mtr, depth)))
+        except ValueError as e:
+            lines.append(json.dumps({"error": str(e), "position": item if isinstance(item, str) else item.hex()}))
+    return lines
+
+
+def _items(path: str) -> Iterator[Union[str, bytes]]:
+    """Unparsed positions: FEN lines, or binary records copied out of the read buffer."""
+    if is_text(path):
+        # a non-ASCII byte turns into U+FFFD, which from_fen rejects: an error record for that line only
+        with open(path, encoding="ascii", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+    else:
+        for record in iter_records(path):
+            yield bytes(record)
+
+
+def _chunks(items: Iterator[Union[str, bytes]], size: int) -> Iterator[list[Union[str, bytes]]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(path: str, out: TextIO, workers: int = 1, depth: Optional[int] = None, chunk: int = CHUNK,
+        progress: Optional[TextIO] = sys.stderr) -> int:
+    """Analyze every position in path, writing JSON lines to out in input order; returns the count."""
+    start = last_report = time.perf_counter()
+    count = 0
+
+    def emit(lines: list[str]) -> None:
+        nonlocal count, last_report
+        out.write("\n".join(lines) + "\n")
+        count += len(lines)
+        now = time.perf_counter()
+        if progress and now - last_report >= 1.0:
+            last_report = now
+            progress.write(f"\r{count} positions  {count / (now - start):,.0f}/sec")
+            progress.flush()
+
+    if workers <= 1:
+        for items in _chunks(_items(path), chunk):
+            emit(_analyze_chunk(items, depth))
+    else:
+        with Pool(workers) as pool:
+            pending: deque = deque()
+            for items in _chunks(_items(path), chunk):
+                pending.append(pool.apply_async(_analyze_chunk, (items, depth)))
+                if len(pending) >= workers * 2:
+                    emit(pending.popleft().get())
+            while pending:
+                emit(pending.popleft().get())
+    if progress:
+        elapsed = time.perf_counter() - start
+        progress.write(f"\r{count} positions in {elapsed:.2f}s  ({count / elapsed if elapsed else 0:,.0f}/sec)\n")
+    return count
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess batch position analysis")
+    ap.add_argument("input", help="position file: .fen/.txt Twisted-FEN lines, otherwise binary records")
+    ap.add_argument("-o", "--output", default="-", help="JSON lines output (default stdout)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--depth", type=int, help="also search each position this deep (0 = static evaluation)")
+    ap.add_argument("--chunk", type=int, default=CHUNK, help="positions per worker task")
+    args = ap.parse_args()
+
+    if args.output == "-":
+        run(args.input, sys.stdout, args.workers, args.depth, args.chunk)
+    else:
+        with open(args.output, "w", encoding="ascii") as out:
+            run(args.input, out, args.workers, args.depth, args.chunk)
+
+
+if __name__ == "__main__":
+    main()
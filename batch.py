@@ -0,0 +1,439 @@
+"""
+NumPy batch of TwistedChess boards.
+
+BoardBatch holds N positions as arrays in the on-screen frame, where white
+pawns always move up and black pawns down:
+
+    cells     (N, 8, 8) int8   0 empty, 1..6 white P N B R Q K, -1..-6 black
+    rotation  (N,) int8        Board.rotation
+    turn      (N,) int8        1 white to move, -1 black
+    rights    (N,) uint8       castling rights as in Board._castle_rights (K=1 Q=2 k=4 q=8)
+
+Attack maps and pseudo-legal moves are computed with whole-array shifts, one
+pass for the batch; legality tries every move at once and looks outward from
+each king through precomputed square tables. rotate applies np.rot90 to the
+selected boards. Promotion squares and castling follow the rotation exactly
+as Board does.
+
+Run: python batch.py --verify [--games 100]   compare against classes.Board
+     python batch.py --bench [--boards 2000]  legal move generation, boards/sec
+"""
+import argparse
+import random
+import time
+from typing import Optional
+
+import numpy as np
+
+from classes import (
+    _CASTLE, _KING_HOMES, _PIECE_CODES, _ROOK_HOMES, _VIEW, DIAG_DIRS, KING_OFFSETS, KNIGHT_OFFSETS, ORTHO_DIRS,
+    PROMOTION_MASK, Board,
+)
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+PROMOTION_CODES = {"Q": QUEEN, "R": ROOK, "N": KNIGHT, "B": BISHOP}
+
+
+def _view_square(rot: int, r: int, c: int) -> tuple[int, int]:
+    return divmod(_VIEW[rot][r * 8 + c], 8)
+
+
+def _castle_table() -> list[tuple[int, int, int, int, tuple[int, int], tuple[int, int], tuple[int, int],
+                                  tuple[int, int], list[tuple[int, int]]]]:
+    """(rotation, color sign, rights bit, rook code sign, king, sq1, sq2, rook, path) per castling option, on screen."""
+    table = []
+    for rot in range(4):
+        for i, color in enumerate(("w", "b")):
+            for side in ("k", "q"):
+                dr, dc = _CASTLE[side]
+                kr, kc = _KING_HOMES[color]
+                rr, rc = _ROOK_HOMES[color]["rook_" + side]
+                path, (r, c) = [], (kr + dr, kc + dc)
+                while (r, c) != (rr, rc):
+                    path.append(_view_square(rot, r, c))
+                    r, c = r + dr, c + dc
+                sign = 1 if color == "w" else -1
+                bit = 1 << (2 * i + (side == "q"))
+                table.append((rot, sign, bit, sign * ROOK, _view_square(rot, kr, kc),
+                              _view_square(rot, kr + dr, kc + dc), _view_square(rot, kr + 2 * dr, kc + 2 * dc),
+                              _view_square(rot, rr, rc), path))
+    return table
+
+CASTLE_TABLE = _castle_table()
+# PROMOTION_ROWS[rotation, 0 white / 1 black]: on-screen promotion squares
+PROMOTION_ROWS = np.array([[[[bool(PROMOTION_MASK[(rot, color)] >> (r * 8 + c) & 1) for c in range(8)]
+                             for r in range(8)] for color in ("w", "b")] for rot in range(4)])
+
+
+def _lookup_tables() -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Per flat square: rays (8 dirs x 7 steps), knight and king squares, pawn attacker squares; 64 pads."""
+    def on(r: int, c: int) -> bool:
+        return 0 <= r < 8 and 0 <= c < 8
+
+    rays = np.full((64, 8, 7), 64, np.int64)
+    knights = np.full((64, 8), 64, np.int64)
+    kings = np.full((64, 8), 64, np.int64)
+    pawns = np.full((2, 64, 2), 64, np.int64)  # [0 white / 1 black attacker, square]
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        for d, (dr, dc) in enumerate(ORTHO_DIRS + DIAG_DIRS):
+            for k in range(1, 8):
+                if on(r + k * dr, c + k * dc):
+                    rays[sq, d, k - 1] = (r + k * dr) * 8 + c + k * dc
+        for table, offsets in ((knights, KNIGHT_OFFSETS), (kings, KING_OFFSETS)):
+            for i, (dr, dc) in enumerate(offsets):
+                if on(r + dr, c + dc):
+                    table[sq, i] = (r + dr) * 8 + c + dc
+        for color, dr in ((0, 1), (1, -1)):  # white pawns attack upward, so they sit one row below
+            for i, dc in enumerate((-1, 1)):
+                if on(r + dr, c + dc):
+                    pawns[color, sq, i] = (r + dr) * 8 + c + dc
+    return rays, knights, kings, pawns
+
+RAYS, KNIGHT_SQUARES, KING_SQUARES, PAWN_ATTACKER_SQUARES = _lookup_tables()
+
+
+def shift(a: np.ndarray, dr: int, dc: int) -> np.ndarray:
+    """out[:, r + dr, c + dc] = a[:, r, c], dropping whatever leaves the board."""
+    out = np.zeros_like(a)
+    out[:, max(dr, 0):8 + min(dr, 0), max(dc, 0):8 + min(dc, 0)] = \
+        a[:, max(-dr, 0):8 + min(-dr, 0), max(-dc, 0):8 + min(-dc, 0)]
+    return out
+
+
+def attacked_by(cells: np.ndarray, sign: np.ndarray) -> np.ndarray:
+    """(N, 8, 8) bool: squares attacked by the pieces of color sign (1 white, -1 black) on each board."""
+    own = cells * sign[:, None, None]
+    empty = cells == 0
+    pawns = own == PAWN
+    up = shift(pawns, -1, -1) | shift(pawns, -1, 1)
+    down = shift(pawns, 1, -1) | shift(pawns, 1, 1)
+    att = np.where((sign > 0)[:, None, None], up, down)
+    for piece, offsets in ((KNIGHT, KNIGHT_OFFSETS), (KING, KING_OFFSETS)):
+        mask = own == piece
+        if mask.any():
+            for dr, dc in offsets:
+                att |= shift(mask, dr, dc)
+    for sliders, dirs in (((ROOK, QUEEN), ORTHO_DIRS), ((BISHOP, QUEEN), DIAG_DIRS)):
+        mask = (own == sliders[0]) | (own == sliders[1])
+        for dr, dc in dirs:
+            ray = shift(mask, dr, dc)
+            while ray.any():
+                att |= ray
+                ray = shift(ray & empty, dr, dc)
+    return att
+
+
+def square_attacked(cells: np.ndarray, square: np.ndarray, sign: np.ndarray) -> np.ndarray:
+    """(M,) bool: square[i] (flat) is attacked by color sign[i] on board cells[i].
+
+    Looks outward from the square only, which is much cheaper than attacked_by
+    when one square per board matters (a king after a trial move).
+    """
+    m = len(cells)
+    # own-color codes, padded with an off-board column 64 that blocks and attacks nothing
+    own = np.concatenate([cells.reshape(m, 64) * sign[:, None], np.full((m, 1), 127, np.int8)], axis=1)
+    rows = np.arange(m)[:, None]
+    hit = (own[rows, KNIGHT_SQUARES[square]] == KNIGHT).any(axis=1)
+    hit |= (own[rows, KING_SQUARES[square]] == KING).any(axis=1)
+    hit |= (own[rows, PAWN_ATTACKER_SQUARES[(sign < 0).astype(np.int64), square]] == PAWN).any(axis=1)
+    rows = np.arange(m)
+    for d in range(8):
+        line = own[rows[:, None], RAYS[square, d]]
+        first = line[rows, (line != 0).argmax(axis=1)]
+        hit |= (first == QUEEN) | (first == (ROOK if d < 4 else BISHOP))
+    return hit
+
+
+class BoardBatch:
+    def __init__(self, cells: np.ndarray, rotation: np.ndarray, turn: np.ndarray, rights: np.ndarray):
+        self.cells = cells
+        self.rotation = rotation
+        self.turn = turn
+        self.rights = rights
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    @classmethod
+    def from_boards(cls, boards: list[Board]) -> "BoardBatch":
+        n = len(boards)
+        cells = np.zeros((n, 8, 8), np.int8)
+        for i, board in enumerate(boards):
+            for r in range(8):
+                for c in range(8):
+                    p = board.get(r, c)
+                    if p:
+                        cells[i, r, c] = _PIECE_CODES.index(p.type) * (1 if p.color == "w" else -1)
+        return cls(cells,
+                   np.array([b.rotation for b in boards], np.int8),
+                   np.array([1 if b.turn == "w" else -1 for b in boards], np.int8),
+                   np.array([b._castle_rights() for b in boards], np.uint8))
+
+    def to_board(self, i: int, moves_this_round: int = 0) -> Board:
+        rot = int(self.rotation[i])
+        grid = [["."] * 8 for _ in range(8)]
+        for r in range(8):
+            for c in range(8):
+                code = int(self.cells[i, r, c])
+                if code:
+                    gr, gc = divmod(_VIEW[rot].index(r * 8 + c), 8)
+                    grid[gr][gc] = _PIECE_CODES[abs(code)] if code > 0 else _PIECE_CODES[-code].lower()
+        rights = int(self.rights[i])
+        castle = "".join(ch for k, ch in enumerate("KQkq") if rights >> k & 1) or "-"
+        placement = "/".join("".join(row) for row in grid).translate({ord("."): "1"})
+        fen = f"{placement} {'w' if self.turn[i] > 0 else 'b'} {rot} {castle} {moves_this_round}"
+        return Board.from_fen(fen)[0]
+
+    def copy(self) -> "BoardBatch":
+        return BoardBatch(self.cells.copy(), self.rotation.copy(), self.turn.copy(), self.rights.copy())
+
+    # ── ATTACKS ───────────────────────────────────────────────────────────────
+
+    def attacked(self, color_sign: np.ndarray) -> np.ndarray:
+        """Squares attacked by color_sign (per board: 1 white, -1 black)."""
+        return attacked_by(self.cells, np.broadcast_to(np.asarray(color_sign, np.int8), (len(self),)))
+
+    def king_squares(self, sign: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(has_king, flat square) of the first king of color sign on each board, as Board._find."""
+        kings = (self.cells * sign[:, None, None] == KING).reshape(len(self), 64)
+        return kings.any(axis=1), kings.argmax(axis=1)
+
+    def in_check(self) -> np.ndarray:
+        """Side to move is in check, per board."""
+        has_king, ksq = self.king_squares(self.turn)
+        return has_king & square_attacked(self.cells, ksq, -self.turn)
+
+    # ── MOVES ─────────────────────────────────────────────────────────────────
+
+    def _pseudo_moves(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(board, from, to) flat-square arrays of non-castling pseudo-legal moves for the side to move."""
+        own = self.cells * self.turn[:, None, None]
+        mine, empty = own > 0, own == 0
+        targets = ~mine
+        rows = np.arange(8)[None, :, None]
+        out_b, out_f, out_t = [], [], []
+
+        def emit(mask: np.ndarray, dr: int, dc: int) -> None:
+            b, r, c = np.nonzero(mask)
+            out_b.append(b)
+            out_f.append((r - dr) * 8 + c - dc)
+            out_t.append(r * 8 + c)
+
+        for fwd, start, movers in ((-1, 6, self.turn > 0), (1, 1, self.turn < 0)):
+            pawns = (own == PAWN) & movers[:, None, None]
+            one = shift(pawns, fwd, 0) & empty
+            emit(one, fwd, 0)
+            emit(shift(one & (rows == start + fwd), fwd, 0) & empty, 2 * fwd, 0)
+            for dc in (-1, 1):
+                emit(shift(pawns, fwd, dc) & (own < 0), fwd, dc)
+        for piece, offsets in ((KNIGHT, KNIGHT_OFFSETS), (KING, KING_OFFSETS)):
+            mask = own == piece
+            for dr, dc in offsets:
+                emit(shift(mask, dr, dc) & targets, dr, dc)
+        for sliders, dirs in (((ROOK, QUEEN), ORTHO_DIRS), ((BISHOP, QUEEN), DIAG_DIRS)):
+            mask = (own == sliders[0]) | (own == sliders[1])
+            for dr, dc in dirs:
+                ray, k = shift(mask, dr, dc), 1
+                while ray.any():
+                    emit(ray & targets, k * dr, k * dc)
+                    ray, k = shift(ray & empty, dr, dc), k + 1
+        return np.concatenate(out_b), np.concatenate(out_f), np.concatenate(out_t)
+
+    def _castle_moves(self, in_check: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Castling as Board._castle_moves: rights, empty path, king, sq1 and sq2 not attacked."""
+        out_b, out_f, out_t = [], [], []
+        for rot, sign, bit, _, (kr, kc), sq1, sq2, _, path in CASTLE_TABLE:
+            ok = (self.rotation == rot) & (self.turn == sign) & (self.rights & bit).astype(bool) & ~in_check
+            for r, c in path:
+                ok &= self.cells[:, r, c] == 0
+            b = np.nonzero(ok)[0]
+            if not len(b):
+                continue
+            for r, c in (sq1, sq2):
+                b = b[~square_attacked(self.cells[b], np.full(len(b), r * 8 + c), np.full(len(b), -sign, np.int8))]
+            out_b.append(b)
+            out_f.append(np.full(len(b), kr * 8 + kc))
+            out_t.append(np.full(len(b), sq2[0] * 8 + sq2[1]))
+        if not out_b:
+            empty = np.zeros(0, np.int64)
+            return empty, empty, empty
+        return np.concatenate(out_b), np.concatenate(out_f), np.concatenate(out_t)
+
+    def legal_moves(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(board, from, to) arrays of legal moves for the side to move, flat on-screen squares.
+
+        Non-castling moves are tried on copies of their boards all at once and
+        kept if the mover's king is not attacked afterwards.
+        """
+        has_king, ksq = self.king_squares(self.turn)
+        in_check = has_king & square_attacked(self.cells, ksq, -self.turn)
+
+        b, f, t = self._pseudo_moves()
+        m = np.arange(len(b))
+        trial = self.cells[b].reshape(len(b), 64)
+        piece = trial[m, f]
+        trial[m, t] = piece
+        trial[m, f] = 0
+        king_after = np.where(np.abs(piece) == KING, t, ksq[b])
+        safe = ~has_king[b] | ~square_attacked(trial, king_after, -self.turn[b])
+
+        cb, cf, ct = self._castle_moves(in_check)
+        b, f, t = np.concatenate([b[safe], cb]), np.concatenate([f[safe], cf]), np.concatenate([t[safe], ct])
+        order = np.lexsort((t, f, b))
+        return b[order], f[order], t[order]
+
+    def legal_mask(self) -> np.ndarray:
+        """(N, 64, 64) bool: [board, from, to] is a legal move."""
+        mask = np.zeros((len(self), 64, 64), bool)
+        b, f, t = self.legal_moves()
+        mask[b, f, t] = True
+        return mask
+
+    def checkmate(self) -> np.ndarray:
+        """Side to move is checkmated, per board."""
+        b, _, _ = self.legal_moves()
+        return self.in_check() & (np.bincount(b, minlength=len(self)) == 0)
+
+    def is_promotion(self, b: np.ndarray, f: np.ndarray, t: np.ndarray) -> np.ndarray:
+        """Which of the moves (board, from, to) are pawn moves onto the promotion rank."""
+        piece = self.cells.reshape(len(self), 64)[b, f]
+        color = (piece < 0).astype(np.int64)
+        return (np.abs(piece) == PAWN) & PROMOTION_ROWS[self.rotation[b], color].reshape(len(b), 64)[np.arange(len(b)), t]
+
+    def make_moves(self, b: np.ndarray, f: np.ndarray, t: np.ndarray, promotion: Optional[np.ndarray] = None) -> None:
+        """Board.move for one move per listed board (flat squares); promotion codes default to queen."""
+        flat = self.cells.reshape(len(self), 64)
+        piece = flat[b, f].copy()
+        sign = np.sign(piece).astype(np.int8)
+        promotes = self.is_promotion(b, f, t)
+        if promotion is None:
+            promotion = np.full(len(b), QUEEN, np.int8)
+        flat[b, t] = np.where(promotes, sign * promotion, piece)
+        flat[b, f] = 0
+        king = np.abs(piece) == KING
+        rot = self.rotation[b]
+        for crot, csign, bit, rook, (kr, kc), sq1, sq2, (rr, rc), _ in CASTLE_TABLE:
+            at_rot = rot == crot
+            corner = rr * 8 + rc
+            # a king castling: move the rook next to it
+            castles = at_rot & king & (sign == csign) & (f == kr * 8 + kc) & (t == sq2[0] * 8 + sq2[1])
+            if castles.any():
+                flat[b[castles], corner] = 0
+                flat[b[castles], sq1[0] * 8 + sq1[1]] = rook
+            # the right goes when the king moves or anything leaves or lands on the rook's corner
+            lost = at_rot & (((sign == csign) & king) | (f == corner) | (t == corner))
+            self.rights[b[lost]] &= np.uint8(~bit & 15)
+        self.turn[b] = -self.turn[b]
+
+    def rotate(self, boards: Optional[np.ndarray] = None) -> None:
+        """rotate_board on the listed boards (all by default)."""
+        if boards is None:
+            boards = np.arange(len(self))
+        self.cells[boards] = np.rot90(self.cells[boards], k=-1, axes=(1, 2))
+        self.rotation[boards] = (self.rotation[boards] + 1) % 4
+
+
+# ── VERIFICATION ──────────────────────────────────────────────────────────────
+
+def _random_boards(games: int, seed: int) -> list[tuple[Board, int]]:
+    """Positions from random games, rotating every second ply; biased toward castling and pawn moves."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(games):
+        board, mtr = Board(), 0
+        for _ in range(rng.randint(0, 160)):
+            out.append((board.to_fen(mtr), mtr))
+            moves = board.legal_moves(board.turn)
+            if not moves:
+                break
+            kinds = {"K": [], "P": []}  # type: dict[str, list]
+            for m in moves:
+                p = board.get(m[0], m[1])
+                if p.type == "P" or p.type == "K" and abs(m[0] - m[2]) + abs(m[1] - m[3]) == 2:  # type: ignore[union-attr]
+                    kinds[p.type].append(m)  # type: ignore[union-attr]
+            x = rng.random()
+            preferred = kinds["K"] if x < 0.7 else kinds["P"] if x < 0.9 else []
+            fr, fc, tr, tc = rng.choice(preferred or moves)
+            mtr += 1
+            board.make_move(fr, fc, tr, tc, rng.choice("QRNB"), rotate=mtr == 2)
+            mtr %= 2
+    return [Board.from_fen(fen) for fen, _ in out]
+
+
+def verify(games: int = 100, seed: int = 1) -> int:
+    """Compare attacks, legal moves, check, mate, make_moves and rotate with classes.Board; returns boards checked."""
+    positions = _random_boards(games, seed)
+    boards = [b for b, _ in positions]
+    batch = BoardBatch.from_boards(boards)
+    n = len(boards)
+    for color, sign in (("w", 1), ("b", -1)):
+        att = batch.attacked(np.full(n, sign, np.int8))
+        for i, board in enumerate(boards):
+            expected = np.zeros((8, 8), bool)
+            for r in range(8):
+                for c in range(8):
+                    vr, vc = board.to_view(r, c)
+                    expected[vr, vc] = board.attacks[color][r][c] > 0
+            assert (att[i] == expected).all(), f"attacks differ: {board.to_fen()} {color}"
+    b, f, t = batch.legal_moves()
+    check, mate = batch.in_check(), batch.checkmate()
+    moves_by_board: list[set] = [set() for _ in range(n)]
+    for bi, fi, ti in zip(b.tolist(), f.tolist(), t.tolist()):
+        moves_by_board[bi].add((*divmod(fi, 8), *divmod(ti, 8)))
+    for i, board in enumerate(boards):
+        assert moves_by_board[i] == set(board.legal_moves(board.turn)), f"moves differ: {board.to_fen()}"
+        assert check[i] == board.is_in_check(board.turn), f"check differs: {board.to_fen()}"
+        assert mate[i] == board.is_checkmate(board.turn), f"mate differs: {board.to_fen()}"
+    # one random legal move on every board that has one, with a random promotion, then rotate half
+    rng = np.random.default_rng(seed)
+    first = np.full(n, -1)
+    first[b[::-1]] = np.arange(len(b))[::-1]
+    pick = np.array([first[i] + rng.integers(np.count_nonzero(b == i)) if first[i] >= 0 else -1 for i in range(n)])
+    movers = np.nonzero(pick >= 0)[0]
+    promo = rng.choice([QUEEN, ROOK, KNIGHT, BISHOP], len(movers)).astype(np.int8)
+    batch.make_moves(movers, f[pick[movers]], t[pick[movers]], promo)
+    rotated = movers[rng.random(len(movers)) < 0.5]
+    batch.rotate(rotated)
+    codes = {v: k for k, v in PROMOTION_CODES.items()}
+    rotated_set = set(rotated.tolist())
+    for j, i in enumerate(movers.tolist()):
+        fr, fc = divmod(int(f[pick[i]]), 8)
+        tr, tc = divmod(int(t[pick[i]]), 8)
+        boards[i].make_move(fr, fc, tr, tc, codes[int(promo[j])], rotate=i in rotated_set)
+        assert batch.to_board(i).to_fen() == boards[i].to_fen(), f"make_moves differs on board {i}"
+    return n
+
+
+def bench(boards: int = 2000, seed: int = 2) -> None:
+    positions = _random_boards(max(1, boards // 60), seed)[:boards]
+    batch = BoardBatch.from_boards([b for b, _ in positions])
+    start = time.perf_counter()
+    b, _, _ = batch.legal_moves()
+    elapsed = time.perf_counter() - start
+    scalar_start = time.perf_counter()
+    for board, _ in positions:
+        board.legal_moves(board.turn)
+    scalar = time.perf_counter() - scalar_start
+    print(f"{len(batch)} boards, {len(b)} legal moves: batch {len(batch) / elapsed:,.0f} boards/sec, "
+          f"Board {len(batch) / scalar:,.0f} boards/sec")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess NumPy board batch")
+    ap.add_argument("--verify", action="store_true", help="compare against classes.Board on random positions")
+    ap.add_argument("--games", type=int, default=100, help="random games to take positions from (--verify)")
+    ap.add_argument("--bench", action="store_true", help="legal move generation throughput")
+    ap.add_argument("--boards", type=int, default=2000, help="batch size for --bench")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    if args.verify:
+        print(f"ok: {verify(args.games, args.seed)} boards match classes.Board")
+    if args.bench:
+        bench(args.boards, args.seed)
+    if not (args.verify or args.bench):
+        ap.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""
+Bitboard-backed TwistedChess board.
+
+Same public API as classes.Board (get, get_legal_moves, legal_moves, move,
+make_move/unmake_move, rotate_board, is_in_check, is_checkmate, find_piece)
+but pieces live in one 64-bit integer per (color, type). Like Board.grid the
+bits stay in the rotation-0 frame, so rotate_board only bumps rotation and
+the pawn tables are picked per rotation; square index is r * 8 + c, bit
+1 << sq. Keys match Board.key for the same position. Piece numbers and
+has_moved are not kept.
+"""
+from typing import NamedTuple, Optional
+
+from classes import (
+    PAWN_ATTACKERS, PAWN_CAPTURES, PAWN_PUSHES, ZOBRIST_CASTLING, ZOBRIST_PIECES, ZOBRIST_ROTATION,
+    ZOBRIST_TURN, _CANONICAL, _CASTLE, _PROMOTION_ROW, _VIEW, Board, ChessPiece,
+)
+
+TYPES = ("P", "N", "B", "R", "Q", "K")
+FULL = (1 << 64) - 1
+
+DIRS: dict[tuple[int, int], int] = {
+    (-1, 0): -8, (1, 0): 8, (0, -1): -1, (0, 1): 1,
+    (-1, -1): -9, (-1, 1): -7, (1, -1): 7, (1, 1): 9,
+}
+ORTHO = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAG = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _bit(r: int, c: int) -> int:
+    return 1 << (r * 8 + c)
+
+
+def _mask(squares) -> int:
+    m = 0
+    for r, c in squares:
+        m |= _bit(r, c)
+    return m
+
+
+def _bits(bb: int):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _low(bb: int) -> int:
+    return (bb & -bb).bit_length() - 1
+
+
+# ── LOOKUP TABLES ─────────────────────────────────────────────────────────────
+def _step_table(offsets) -> list[int]:
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        table.append(_mask((r + dr, c + dc) for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8))
+    return table
+
+KNIGHT = _step_table(((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)))
+KING = _step_table([(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc])
+
+# classes' pawn tables as masks, [(rotation, color)][sq]: single push, double
+# push (from the second row on screen), captures, and the squares a pawn of
+# color attacks sq from
+PUSH1: dict[tuple[int, str], list[int]] = {}
+PUSH2: dict[tuple[int, str], list[int]] = {}
+PAWN_CAPS: dict[tuple[int, str], list[int]] = {}
+PAWN_FROM: dict[tuple[int, str], list[int]] = {}
+for _k, _pushes in PAWN_PUSHES.items():
+    _squares = [divmod(sq, 8) for sq in range(64)]
+    PUSH1[_k] = [_mask([p[0]]) if (p := _pushes[r][c]) else 0 for r, c in _squares]
+    PUSH2[_k] = [_mask([p[1]]) if (p := _pushes[r][c]) and p[1] else 0 for r, c in _squares]
+    PAWN_CAPS[_k] = [_mask(PAWN_CAPTURES[_k][r][c]) for r, c in _squares]
+    PAWN_FROM[_k] = [_mask(PAWN_ATTACKERS[_k][r][c]) for r, c in _squares]
+PROMOTION_ROWS = {color: 0xFF << 8 * row for color, row in _PROMOTION_ROW.items()}
+
+RAYS: dict[tuple[int, int], list[int]] = {}
+for _d in DIRS:
+    RAYS[_d] = []
+    for _sq in range(64):
+        _r, _c = divmod(_sq, 8)
+        _m = 0
+        _r, _c = _r + _d[0], _c + _d[1]
+        while 0 <= _r < 8 and 0 <= _c < 8:
+            _m |= _bit(_r, _c)
+            _r, _c = _r + _d[0], _c + _d[1]
+        RAYS[_d].append(_m)
+ORTHO_LINES = [RAYS[(-1, 0)][sq] | RAYS[(1, 0)][sq] | RAYS[(0, -1)][sq] | RAYS[(0, 1)][sq] for sq in range(64)]
+DIAG_LINES = [RAYS[(-1, -1)][sq] | RAYS[(-1, 1)][sq] | RAYS[(1, -1)][sq] | RAYS[(1, 1)][sq] for sq in range(64)]
+
+# BETWEEN[a][b]: squares strictly between a and b on a shared line, else 0.
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _d in DIRS:
+    for _a in range(64):
+        for _b in _bits(RAYS[_d][_a]):
+            BETWEEN[_a][_b] = RAYS[_d][_a] & ~RAYS[_d][_b] & ~(1 << _b)
+
+
+def _ray_attacks(sq: int, occ: int, dirs) -> int:
+    att = 0
+    for d in dirs:
+        ray = RAYS[d][sq]
+        blockers = ray & occ
+        if blockers:
+            # first blocker: lowest bit for increasing index, highest otherwise
+            b = _low(blockers) if DIRS[d] > 0 else blockers.bit_length() - 1
+            ray ^= RAYS[d][b]
+        att |= ray
+    return att
+
+
+def rook_attacks(sq: int, occ: int) -> int:
+    return _ray_attacks(sq, occ, ORTHO)
+
+
+def bishop_attacks(sq: int, occ: int) -> int:
+    return _ray_attacks(sq, occ, DIAG)
+
+
+class BitUndo(NamedTuple):
+    frm: int
+    to: int
+    kind: str                   # the mover's type
+    placed: str                 # what landed on to: kind, or the promotion piece
+    captured: Optional[str]
+    rook: Optional[tuple[int, int]]  # castling rook: from, to
+    castling: tuple[Optional[tuple[int, int]], ...]
+    flags: int
+    key: int
+    turn: str
+    rotated: bool
+
+
+class BitBoard:
+    def __init__(self):
+        self.bb: dict[str, dict[str, int]] = {"w": dict.fromkeys(TYPES, 0), "b": dict.fromkeys(TYPES, 0)}
+        self.rotation = 0
+        self.turn = "w"
+        self.castling: dict[str, dict[str, Optional[tuple[int, int]]]] = {
+            "w": {"king": (7, 4), "rook_k": (7, 7), "rook_q": (7, 0)},
+            "b": {"king": (0, 4), "rook_k": (0, 7), "rook_q": (0, 0)},
+        }
+        # king flags, mirroring ChessPiece.can_castle_*: bit 0/1 white kingside/queenside, bit 2/3 black
+        self.flags = 0b1111
+        back = ["R", "N", "B", "Q", "K", "B", "N", "R"]
+        for col, t in enumerate(back):
+            self.bb["b"][t] |= _bit(0, col)
+            self.bb["w"][t] |= _bit(7, col)
+        self.bb["b"]["P"] = 0xFF << 8
+        self.bb["w"]["P"] = 0xFF << 48
+        self.key = self.compute_key()
+
+    @classmethod
+    def from_board(cls, board: Board) -> "BitBoard":
+        bb = cls()
+        bb.bb = {"w": dict.fromkeys(TYPES, 0), "b": dict.fromkeys(TYPES, 0)}
+        bb.flags = 0
+        for r, row in enumerate(board.grid):
+            for c, p in enumerate(row):
+                if p:
+                    bb.bb[p.color][p.type] |= _bit(r, c)
+                    if p.type == "K":
+                        shift = 2 if p.color == "b" else 0
+                        bb.flags |= (int(p.can_castle_kingside) | int(p.can_castle_queenside) << 1) << shift
+        bb.rotation = board.rotation
+        bb.turn = board.turn
+        bb.castling = {color: dict(v) for color, v in board.castling.items()}
+        bb.key = bb.compute_key()
+        return bb
+
+    # ── HASHING ───────────────────────────────────────────────────────────────
+    def _castle_rights(self) -> int:
+        rights = 0
+        for i, color in enumerate(("w", "b")):
+            kpos = self.castling[color]["king"]
+            if kpos is None or not self.bb[color]["K"] & _bit(*kpos):
+                continue
+            if self.flags >> (2 * i) & 1 and self.castling[color]["rook_k"] is not None:
+                rights |= 1 << (2 * i)
+            if self.flags >> (2 * i) & 2 and self.castling[color]["rook_q"] is not None:
+                rights |= 2 << (2 * i)
+        return rights
+
+    def compute_key(self) -> int:
+        key = ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_CASTLING[self._castle_rights()]
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        for color, boards in self.bb.items():
+            for t, bb in boards.items():
+                zobrist = ZOBRIST_PIECES[t + color]
+                for sq in _bits(bb):
+                    key ^= zobrist[sq]
+        return key
+
+    # ── QUERIES ───────────────────────────────────────────────────────────────
+    def occupancy(self, color: str) -> int:
+        s = self.bb[color]
+        return s["P"] | s["N"] | s["B"] | s["R"] | s["Q"] | s["K"]
+
+    def _piece_at(self, sq: int) -> Optional[tuple[str, str]]:
+        m = 1 << sq
+        for color in ("w", "b"):
+            for t, bb in self.bb[color].items():
+                if bb & m:
+                    return t, color
+        return None
+
+    def get(self, r: int, c: int) -> Optional[ChessPiece]:
+        if not (0 <= r < 8 and 0 <= c < 8):
+            return None
+        found = self._piece_at(_CANONICAL[self.rotation][r * 8 + c])
+        if found is None:
+            return None
+        t, color = found
+        piece = ChessPiece(t, color)
+        if t == "K":
+            shift = 2 if color == "b" else 0
+            piece.can_castle_kingside = bool(self.flags >> shift & 1)
+            piece.can_castle_queenside = bool(self.flags >> shift & 2)
+        return piece
+
+    def _attackers(self, sq: int, by_color: str, occ: int) -> int:
+        """Pieces of by_color attacking grid square sq given occupancy occ."""
+        s = self.bb[by_color]
+        return ((PAWN_FROM[(self.rotation, by_color)][sq] & s["P"])
+                | (KNIGHT[sq] & s["N"])
+                | (KING[sq] & s["K"])
+                | (rook_attacks(sq, occ) & (s["R"] | s["Q"]))
+                | (bishop_attacks(sq, occ) & (s["B"] | s["Q"])))
+
+    def _is_square_attacked(self, r: int, c: int, by_color: str) -> bool:
+        """Check if grid square (r, c) is attacked by any piece of by_color."""
+        occ = self.occupancy("w") | self.occupancy("b")
+        return self._attackers(r * 8 + c, by_color, occ) != 0
+
+    def is_in_check(self, color: str) -> bool:
+        king = self.bb[color]["K"]
+        if not king:
+            return False
+        occ = self.occupancy("w") | self.occupancy("b")
+        return self._attackers(_low(king), "b" if color == "w" else "w", occ) != 0
+
+    def find_piece(self, piece_type: str, color: str) -> Optional[tuple[int, int]]:
+        """Find first piece of given type and color. Returns (r, c) or None."""
+        bb = self.bb[color][piece_type]
+        view = _VIEW[self.rotation]
+        return divmod(min(view[sq] for sq in _bits(bb)), 8) if bb else None
+
+    def _is_promotion_square(self, tr: int, tc: int, color: str) -> bool:
+        """Check if (tr,tc) is the promotion rank for color, given current board rotation."""
+        return bool(PROMOTION_ROWS[color] >> _CANONICAL[self.rotation][tr * 8 + tc] & 1)
+
+    # ── MOVE GENERATION ───────────────────────────────────────────────────────
+    def _targets(self, sq: int, t: str, color: str, own: int, occ: int) -> int:
+        """Pseudo-legal destination mask for a non-castling move from sq."""
+        if t == "P":
+            k = (self.rotation, color)
+            single = PUSH1[k][sq] & ~occ
+            double = PUSH2[k][sq] & ~occ if single else 0
+            return single | double | (PAWN_CAPS[k][sq] & occ & ~own)
+        if t == "N":
+            att = KNIGHT[sq]
+        elif t == "K":
+            att = KING[sq]
+        elif t == "B":
+            att = bishop_attacks(sq, occ)
+        elif t == "R":
+            att = rook_attacks(sq, occ)
+        else:
+            att = rook_attacks(sq, occ) | bishop_attacks(sq, occ)
+        return att & ~own
+
+    def _castles(self, ksq: int, color: str, occ: int) -> list[tuple[int, int, int]]:
+        """(king_to, rook_from, rook_to) for each castling option of color's king on ksq, not in check."""
+        if self.castling[color]["king"] != divmod(ksq, 8):
+            return []
+        r, c = divmod(ksq, 8)
+        opp = "b" if color == "w" else "w"
+        shift = 2 if color == "b" else 0
+        out = []
+        for side, (dr, dc) in _CASTLE.items():
+            if not self.flags >> shift & (1 if side == "k" else 2):
+                continue
+            rook_pos = self.castling[color]["rook_k" if side == "k" else "rook_q"]
+            if rook_pos is None or not (0 <= r + 2 * dr < 8 and 0 <= c + 2 * dc < 8):
+                continue
+            between = BETWEEN[ksq][rook_pos[0] * 8 + rook_pos[1]]
+            if not between or between & occ:
+                continue
+            sq1, sq2 = (r + dr) * 8 + c + dc, (r + 2 * dr) * 8 + c + 2 * dc
+            if self._attackers(sq1, opp, occ) or self._attackers(sq2, opp, occ):
+                continue
+            out.append((sq2, rook_pos[0] * 8 + rook_pos[1], sq1))
+        return out
+
+    def _gen_legal(self, color: str, only: int = FULL) -> list[tuple[int, int]]:
+        """Legal (from, to) grid squares for color's pieces on only, from checkers and pins, without trial moves."""
+        s = self.bb[color]
+        opp = "b" if color == "w" else "w"
+        o = self.bb[opp]
+        own = self.occupancy(color)
+        occ = own | self.occupancy(opp)
+        moves: list[tuple[int, int]] = []
+        king = s["K"]
+        if not king:
+            for sq in _bits(own & only):
+                t = self._piece_at(sq)[0]  # type: ignore[index]
+                moves.extend((sq, to) for to in _bits(self._targets(sq, t, color, own, occ)))
+            return moves
+        ksq = _low(king)
+        checkers = self._attackers(ksq, opp, occ)
+        if king & only:
+            # the king's own square is cleared so it cannot hide behind itself on a checking line
+            bare = occ ^ king
+            for to in _bits(KING[ksq] & ~own):
+                if not self._attackers(to, opp, bare):
+                    moves.append((ksq, to))
+            if not checkers:
+                moves.extend((ksq, to) for to, _, _ in self._castles(ksq, color, occ))
+        if checkers & (checkers - 1):
+            return moves  # double check: only the king moves
+        evasions = checkers | BETWEEN[ksq][_low(checkers)] if checkers else FULL
+        pins: dict[int, int] = {}
+        snipers = (ORTHO_LINES[ksq] & (o["R"] | o["Q"])) | (DIAG_LINES[ksq] & (o["B"] | o["Q"]))
+        for sniper in _bits(snipers):
+            line = BETWEEN[ksq][sniper]
+            blockers = line & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pins[_low(blockers)] = line | 1 << sniper
+        for t in ("P", "N", "B", "R", "Q"):
+            for sq in _bits(s[t] & only):
+                targets = self._targets(sq, t, color, own, occ) & evasions & pins.get(sq, FULL)
+                moves.extend((sq, to) for to in _bits(targets))
+        return moves
+
+    def get_legal_moves(self, r: int, c: int) -> list[tuple[int, int]]:
+        """Returns list of (tr, tc) that are legal (don't leave own king in check)."""
+        if not (0 <= r < 8 and 0 <= c < 8):
+            return []
+        sq = _CANONICAL[self.rotation][r * 8 + c]
+        found = self._piece_at(sq)
+        if found is None:
+            return []
+        view = _VIEW[self.rotation]
+        return [divmod(view[to], 8) for _, to in self._gen_legal(found[1], 1 << sq)]
+
+    def legal_moves(self, color: str) -> list[tuple[int, int, int, int]]:
+        """All legal (fr, fc, tr, tc) for color in one pass."""
+        view = _VIEW[self.rotation]
+        out = []
+        for frm, to in self._gen_legal(color):
+            f, t = view[frm], view[to]
+            out.append((f >> 3, f & 7, t >> 3, t & 7))
+        return out
+
+    def is_checkmate(self, color: str) -> bool:
+        if not self.is_in_check(color):
+            return False
+        return not self._gen_legal(color)
+
+    # ── MUTATION ──────────────────────────────────────────────────────────────
+    def move(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> None:
+        if not (0 <= fr < 8 and 0 <= fc < 8 and 0 <= tr < 8 and 0 <= tc < 8):
+            return
+        canonical = _CANONICAL[self.rotation]
+        self._move(canonical[fr * 8 + fc], canonical[tr * 8 + tc], promotion)
+
+    def _move(self, frm: int, to: int, promotion: Optional[str]) -> Optional[tuple[str, str, Optional[str], Optional[tuple[int, int]]]]:
+        """Board.move on grid squares; returns (mover, placed, captured, castling rook from/to), None if frm is empty."""
+        found = self._piece_at(frm)
+        if not found:
+            return None
+        t, color = found
+        s = self.bb[color]
+        opp = "b" if color == "w" else "w"
+        zobrist = ZOBRIST_PIECES[t + color]
+        key = self.key ^ ZOBRIST_CASTLING[self._castle_rights()] ^ zobrist[frm]
+        fr, fc = divmod(frm, 8)
+        tr, tc = divmod(to, 8)
+        castle = self.castling[color]
+        rook_moved = None
+        if t == "K" and ((abs(tr-fr)==2 and tc==fc) or (abs(tc-fc)==2 and tr==fr)):
+            dr = (tr - fr) // 2 if tr != fr else 0
+            dc = (tc - fc) // 2 if tc != fc else 0
+            rook_key = "rook_k" if (dr, dc) == _CASTLE["k"] else "rook_q"
+            rook_pos = castle[rook_key]
+            if rook_pos:
+                rsq, mid = rook_pos[0] * 8 + rook_pos[1], frm + dr * 8 + dc
+                rook = self._piece_at(rsq)
+                if rook:
+                    self.bb[rook[1]][rook[0]] ^= 1 << rsq | 1 << mid
+                    rz = ZOBRIST_PIECES[rook[0] + rook[1]]
+                    key ^= rz[rsq] ^ rz[mid]
+                    rook_moved = (rsq, mid)
+            castle[rook_key] = None
+
+        if t == "K":
+            castle["king"] = (tr, tc)
+            self.flags &= ~(3 << (2 if color == "b" else 0))
+        if t == "R":
+            if (fr, fc) == castle["rook_k"]:
+                castle["rook_k"] = None
+            if (fr, fc) == castle["rook_q"]:
+                castle["rook_q"] = None
+
+        captured = None
+        m = 1 << to
+        for ct, bb in self.bb[opp].items():
+            if bb & m:
+                captured = ct
+                self.bb[opp][ct] ^= m
+                key ^= ZOBRIST_PIECES[ct + opp][to]
+                if ct == "R":
+                    cap = self.castling[opp]
+                    if (tr, tc) == cap["rook_k"]:
+                        cap["rook_k"] = None
+                    if (tr, tc) == cap["rook_q"]:
+                        cap["rook_q"] = None
+                break
+
+        placed = t
+        if t == "P" and tr == _PROMOTION_ROW[color]:
+            promo = (promotion or "Q").upper()
+            placed = promo if promo in ("Q", "R", "N", "B") else "Q"
+        s[t] ^= 1 << frm
+        s[placed] |= m
+
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        self.turn = opp
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        self.key = key ^ ZOBRIST_PIECES[placed + color][to] ^ ZOBRIST_CASTLING[self._castle_rights()]
+        return t, placed, captured, rook_moved
+
+    def make_move(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None,
+                  rotate: bool = False) -> Optional[BitUndo]:
+        """move (then rotate_board if rotate) that unmake_move can reverse. None if nothing moved."""
+        if not (0 <= fr < 8 and 0 <= fc < 8 and 0 <= tr < 8 and 0 <= tc < 8):
+            return None
+        canonical = _CANONICAL[self.rotation]
+        frm, to = canonical[fr * 8 + fc], canonical[tr * 8 + tc]
+        castling = tuple(pos for color in ("w", "b") for pos in self.castling[color].values())
+        flags, key, turn = self.flags, self.key, self.turn
+        moved = self._move(frm, to, promotion)
+        if moved is None:
+            return None
+        if rotate:
+            self.rotate_board()
+        kind, placed, captured, rook = moved
+        return BitUndo(frm, to, kind, placed, captured, rook, castling, flags, key, turn, rotate)
+
+    def unmake_move(self, undo: BitUndo) -> None:
+        if undo.rotated:
+            self.rotation = (self.rotation - 1) % 4
+        color = undo.turn
+        s = self.bb[color]
+        s[undo.placed] ^= 1 << undo.to
+        s[undo.kind] |= 1 << undo.frm
+        if undo.captured:
+            self.bb["b" if color == "w" else "w"][undo.captured] |= 1 << undo.to
+        if undo.rook:
+            rfrom, rto = undo.rook
+            s["R"] ^= 1 << rfrom | 1 << rto
+        saved = iter(undo.castling)
+        for c in ("w", "b"):
+            for name in ("king", "rook_k", "rook_q"):
+                self.castling[c][name] = next(saved)
+        self.flags, self.key, self.turn = undo.flags, undo.key, undo.turn
+
+    def rotate_board(self) -> None:
+        self.key ^= ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_ROTATION[(self.rotation + 1) % 4]
+        self.rotation = (self.rotation + 1) % 4
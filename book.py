@@ -0,0 +1,220 @@
+"""
+Memory-mapped TwistedChess position book.
+
+A book file is a header followed by fixed-size records sorted by position
+key (classes.position_key), then by weight, heaviest first:
+
+    header  magic b"TCBK", version u16, record size u16, record count u64
+    record  key u64, move u16 (selfplay.encode_move), weight u16, score i16
+
+Book opens the file with mmap and binary-searches it, so a probe touches a
+few pages and every process that opens the same book shares one copy in the
+page cache. Scores are for the side to move: centipawns from analysis
+output, or the average self-play result (+100 always won, -100 always lost).
+
+Run: python book.py build games.bin [results.jsonl ...] -o book.bin [--plies 16]
+     python book.py probe book.bin [--moves "6444 1434"]
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, NamedTuple, Optional
+
+from classes import Board, format_move, parse_move, position_key, setup
+from engine import SearchResult, Searcher
+from game import BLACK_WINS, WHITE_WINS, Game
+from selfplay import Move, decode_move, encode_move, iter_games
+
+MAGIC = b"TCBK"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHQ")
+_RECORD = struct.Struct("<QHHh")
+_KEY = struct.Struct("<Q")
+BOOK_PLIES = 16
+_MAX_WEIGHT = 0xFFFF
+_MAX_SCORE = 0x7FFF
+
+
+class BookMove(NamedTuple):
+    move: Move
+    weight: int
+    score: int
+
+
+class Book:
+    """Read-only view of a book file; lookups are binary searches over the mapping."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"{path}: not a book file")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or record_size != _RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path}: not a version {VERSION} book file")
+        if size != _HEADER.size + count * _RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path}: truncated book ({count} records declared)")
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _key_at(self, i: int) -> int:
+        return _KEY.unpack_from(self._map, _HEADER.size + i * _RECORD.size)[0]
+
+    def lookup(self, key: int) -> list[BookMove]:
+        """Book moves for a position key, heaviest first; empty if the position is not in the book."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        out = []
+        offset = _HEADER.size + lo * _RECORD.size
+        while lo < self.count:
+            k, move, weight, score = _RECORD.unpack_from(self._map, offset)
+            if k != key:
+                break
+            out.append(BookMove(decode_move(move), weight, score))
+            lo += 1
+            offset += _RECORD.size
+        return out
+
+    def probe(self, board: Board, moves_this_round: int = 0) -> list[BookMove]:
+        return self.lookup(position_key(board, moves_this_round))
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "Book":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _is_legal(board: Board, move: Move, legal: set[tuple[int, int, int, int]]) -> bool:
+    """move is legal and names a promotion exactly when it is one."""
+    fr, fc, tr, tc, promotion = move
+    if (fr, fc, tr, tc) not in legal:
+        return False
+    piece = board.get(fr, fc)
+    return (promotion is not None) == (piece.type == "P" and board._is_promotion_square(tr, tc, piece.color))  # type: ignore[union-attr]
+
+
+def best_move(board: Board, time_ms: int, moves_this_round: int = 0, book: Optional[Book] = None,
+              searcher: Optional[Searcher] = None) -> SearchResult:
+    """The book's heaviest legal move for the position when it has one, else
+    engine.Searcher.best_move. A book built from other games or an older rule
+    set can hold moves that are illegal here, so each hit is checked."""
+    if book is not None:
+        hits = book.probe(board, moves_this_round)
+        if hits:
+            legal = set(board.legal_moves(board.turn))
+            for hit in hits:
+                if _is_legal(board, hit.move, legal):
+                    return SearchResult(hit.move, hit.score, 0, 0, 0.0)
+    return (searcher or Searcher()).best_move(board, time_ms, moves_this_round)
+
+
+# ── BUILDING ──────────────────────────────────────────────────────────────────
+# Entries are gathered as {(key, encoded move): [weight, score sum]} and
+# written sorted, so a book holds each (position, move) pair once.
+
+def add_games(entries: dict, path: str, plies: int = BOOK_PLIES) -> int:
+    """Count the first plies moves of every self-play game in path; returns the games read."""
+    games = 0
+    for moves, result in iter_games(path):
+        game = Game()
+        for m in moves[:plies]:
+            mover = game.board.turn
+            won = result == (WHITE_WINS if mover == "w" else BLACK_WINS)
+            lost = result == (BLACK_WINS if mover == "w" else WHITE_WINS)
+            entry = entries.setdefault((position_key(game.board, game.moves_this_round), encode_move(*m)), [0, 0])
+            entry[0] += 1
+            entry[1] += 100 if won else -100 if lost else 0
+            game.play(*m, validate=False)
+            if game.over:
+                break
+        games += 1
+    return games
+
+
+def add_analysis(entries: dict, path: str) -> int:
+    """Best moves and scores from analyze.py JSON lines; returns the positions used."""
+    used = 0
+    with open(path, encoding="ascii") as f:
+        for line in f:
+            record = json.loads(line)
+            if not record.get("best"):
+                continue
+            board, mtr = Board.from_fen(record["fen"])
+            entry = entries.setdefault((position_key(board, mtr), encode_move(*parse_move(record["best"]))), [0, 0])
+            entry[0] += 1
+            entry[1] += record.get("score", 0)
+            used += 1
+    return used
+
+
+def write_book(path: str, entries: dict) -> int:
+    """Write entries as a book file; replaces path atomically, so open Books keep their old copy."""
+    records = sorted(((key, -weight, move, score_sum) for (key, move), (weight, score_sum) in entries.items()))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, len(records)))
+        for key, neg_weight, move, score_sum in records:
+            weight = -neg_weight
+            score = max(-_MAX_SCORE, min(_MAX_SCORE, round(score_sum / weight)))
+            f.write(_RECORD.pack(key, move, min(weight, _MAX_WEIGHT), score))
+    os.replace(tmp, path)
+    return len(records)
+
+
+def build(inputs: Iterable[str], out_path: str, plies: int = BOOK_PLIES) -> int:
+    """Book from self-play record files and .jsonl analysis files; returns the record count."""
+    entries: dict = {}
+    for path in inputs:
+        if path.endswith(".jsonl"):
+            add_analysis(entries, path)
+        else:
+            add_games(entries, path, plies)
+    return write_book(out_path, entries)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess position book")
+    sub = ap.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="build a book from self-play records and analysis output")
+    b.add_argument("inputs", nargs="+", help="selfplay.py record files; .jsonl files are analyze.py output")
+    b.add_argument("-o", "--output", default="book.bin")
+    b.add_argument("--plies", type=int, default=BOOK_PLIES, help="moves taken from the start of each game")
+    p = sub.add_parser("probe", help="look up a position")
+    p.add_argument("book")
+    p.add_argument("--moves", default="", help='moves from the start, e.g. "6444 1434"')
+    args = ap.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        n = build(args.inputs, args.output, args.plies)
+        print(f"{n} records written to {args.output} in {time.perf_counter() - start:.2f}s")
+        return
+    board, mtr = setup(args.moves)
+    with Book(args.book) as book:
+        start = time.perf_counter()
+        hits = book.probe(board, mtr)
+        elapsed = time.perf_counter() - start
+        for hit in hits:
+            print(f"{format_move(*hit.move):6} weight {hit.weight:5}  score {hit.score:6}")
+        print(f"{len(hits)} book moves among {len(book)} records, lookup {elapsed * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
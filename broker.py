@@ -0,0 +1,355 @@
+"""
+Room routing between TwistedChess server workers.
+
+server.py keeps a Room per room code holding the connections it serves
+itself. A Broker owns what has to be shared: which player slots of a room
+are taken, and the messages relayed to the room's connections on other
+workers.
+
+    LocalBroker  one worker (the default): slots in a dict, nothing to carry
+    HubBroker    any number of workers, on one box or several, each connected
+                 to a hub process (python broker.py --listen ...) over a Unix
+                 or TCP socket
+
+TWISTEDCHESS_BROKER picks one: unset or "local", or the hub's address as
+"unix:/path/to.sock" or "tcp:host:port".
+
+Hub protocol, one JSON object per line. Workers send
+    {"op": "claim", "code": c, "id": n}     -> {"id": n, "index": 0 | 1 | -1}
+    {"op": "open", "code": c, "id": n}      -> {"id": n, "log": [...], "white": 0 | 1}
+    {"op": "release", "code": c, "index": i}
+    {"op": "close", "code": c}
+    {"op": "pub", "code": c, "from": i, "seq": n, "data": [d, b]}
+and the hub forwards each "pub" to the other workers that opened the room as
+    {"op": "msg", "code": c, "from": i, "seq": n, "data": [d, b]}
+A message is [text, 0], or [frame bytes as Latin-1, 1] for protocol.py
+frames. A room's log holds the frames of its moves and resignations since
+the last reset, at most MAX_LOG of them (a worker ends a room that would
+log more); other messages are forwarded but not logged. "white" is the slot
+playing white: it swaps on every reset. A worker that disconnects gives up
+its slots and subscriptions.
+
+Run: python broker.py --listen unix:/tmp/twistedchess.sock
+     TWISTEDCHESS_BROKER=unix:/tmp/twistedchess.sock uvicorn server:app --workers 4
+"""
+import argparse
+import asyncio
+from abc import ABC, abstractmethod
+import itertools
+import json
+import os
+import signal
+import time
+from typing import Optional, Protocol
+
+from protocol import RESET, Message, game_frame
+
+# A room logs at most this many moves and resignations, for spectators'
+# snapshots and for workers that open it late. An authoritative game ends
+# well before: the fifty-move count restarts only on one of at most 46
+# captures and promotions, so it lasts under 4,800 plies. server.Room ends a
+# room whose log would pass the cap rather than keep a truncated one.
+MAX_LOG = int(os.environ.get("TWISTEDCHESS_MAX_LOG", "12000"))
+_LINE_LIMIT = 1 << 24  # an "open" reply carries a whole game's log, ~25 bytes a move
+_CONNECT_TIMEOUT = 10.0
+
+
+class Subscriber(Protocol):
+    """What a Broker delivers to: server.Room."""
+
+    def restore(self, log: list[Message], white: int) -> None: ...
+
+    def receive(self, index: int, data: Message, seq: int) -> None: ...
+
+
+def _pack(data: Message) -> list:
+    return [data.decode("latin-1"), 1] if isinstance(data, bytes) else [data, 0]
+
+
+def _unpack(packed: list) -> Message:
+    return packed[0].encode("latin-1") if packed[1] else packed[0]
+
+
+class Broker(ABC):
+    """Slots and cross-worker delivery for rooms. Methods are called from the
+    worker's event loop; publish must not wait, it is on the relay path."""
+
+    name = "local"
+    healthy = True  # False once the worker can no longer reach the other workers' rooms
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def claim(self, code: str) -> int:
+        """Take the first free player slot of room code; -1 if both are taken."""
+
+    @abstractmethod
+    async def release(self, code: str, index: int) -> None:
+        """Give player slot index of room code back."""
+
+    @abstractmethod
+    async def open(self, code: str, room: Subscriber) -> None:
+        """Start delivering room code's messages from other workers to room,
+        after handing it the log so far and the slot playing white with room.restore."""
+
+    @abstractmethod
+    async def close(self, code: str) -> None:
+        """Stop delivering room code's messages to this worker."""
+
+    @abstractmethod
+    def publish(self, code: str, index: int, data: Message, seq: int) -> None:
+        """Send player index's message number seq to the room's connections on other workers."""
+
+
+class LocalBroker(Broker):
+    """Single worker: every connection of a room is in this process."""
+
+    def __init__(self):
+        self.slots: dict[str, list[bool]] = {}
+
+    async def claim(self, code: str) -> int:
+        slots = self.slots.setdefault(code, [False, False])
+        for i, taken in enumerate(slots):
+            if not taken:
+                slots[i] = True
+                return i
+        return -1
+
+    async def release(self, code: str, index: int) -> None:
+        slots = self.slots.get(code)
+        if slots is not None:
+            slots[index] = False
+            if not any(slots):
+                del self.slots[code]
+
+    async def open(self, code: str, room: Subscriber) -> None:
+        pass  # a new room has no history anywhere else
+
+    async def close(self, code: str) -> None:
+        pass
+
+    def publish(self, code: str, index: int, data: Message, seq: int) -> None:
+        pass
+
+
+async def _connect(address: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    kind, _, where = address.partition(":")
+    if kind == "unix":
+        return await asyncio.open_unix_connection(where, limit=_LINE_LIMIT)
+    if kind == "tcp":
+        host, _, port = where.rpartition(":")
+        return await asyncio.open_connection(host, int(port), limit=_LINE_LIMIT)
+    raise ValueError(f"broker address must be unix:PATH or tcp:HOST:PORT, not {address!r}")
+
+
+class HubBroker(Broker):
+    """A worker's link to the hub. Requests are matched to replies by id; one
+    reader task handles replies and forwarded messages in the order the hub
+    sent them, so a room's log is restored before any later message lands.
+
+    Losing the hub loses this worker's slots and subscriptions with it, so
+    rather than reconnect into rooms it no longer holds, the worker reports
+    unhealthy and shuts itself down (SIGTERM) for its supervisor to restart."""
+
+    def __init__(self, address: str):
+        self.name = address
+        self.address = address
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._ids = itertools.count()
+        self._pending: dict[int, tuple[asyncio.Future, str]] = {}
+        self._rooms: dict[str, Subscriber] = {}
+        self._stopping = False
+
+    @property
+    def healthy(self) -> bool:
+        return self._writer is not None
+
+    async def start(self) -> None:
+        # workers may come up before the hub does
+        deadline = time.monotonic() + _CONNECT_TIMEOUT
+        while True:
+            try:
+                reader, self._writer = await _connect(self.address)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    def _send(self, msg: dict) -> None:
+        if self._writer is None:
+            raise ConnectionError("broker hub is not connected")
+        self._writer.write(json.dumps(msg).encode() + b"\n")
+
+    async def _request(self, msg: dict) -> dict:
+        msg["id"] = i = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[i] = (future, msg["code"])
+        self._send(msg)
+        return await future
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        try:
+            async for line in reader:
+                msg = json.loads(line)
+                if msg.get("op") == "msg":
+                    room = self._rooms.get(msg["code"])
+                    if room is not None:
+                        room.receive(msg["from"], _unpack(msg["data"]), msg["seq"])
+                    continue
+                future, code = self._pending.pop(msg["id"])
+                if "log" in msg and code in self._rooms:
+                    self._rooms[code].restore([_unpack(m) for m in msg["log"]], msg["white"])
+                future.set_result(msg)
+        finally:
+            self._writer = None
+            for future, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("lost the broker hub"))
+            self._pending.clear()
+            if not self._stopping:
+                print(f"lost the broker hub at {self.address} — stopping this worker")
+                signal.raise_signal(signal.SIGTERM)
+
+    async def claim(self, code: str) -> int:
+        return (await self._request({"op": "claim", "code": code}))["index"]
+
+    async def release(self, code: str, index: int) -> None:
+        if self._writer is None:
+            return  # the hub gave up this worker's slots when the link dropped
+        self._send({"op": "release", "code": code, "index": index})
+
+    async def open(self, code: str, room: Subscriber) -> None:
+        self._rooms[code] = room
+        await self._request({"op": "open", "code": code})
+
+    async def close(self, code: str) -> None:
+        self._rooms.pop(code, None)
+        if self._writer is not None:
+            self._send({"op": "close", "code": code})
+
+    def publish(self, code: str, index: int, data: Message, seq: int) -> None:
+        self._send({"op": "pub", "code": code, "from": index, "seq": seq, "data": _pack(data)})
+
+
+def make_broker(address: Optional[str]) -> Broker:
+    """The broker for a TWISTEDCHESS_BROKER value."""
+    if not address or address == "local":
+        return LocalBroker()
+    return HubBroker(address)
+
+
+# ── HUB ───────────────────────────────────────────────────────────────────────
+
+class _HubRoom:
+    def __init__(self):
+        self.slots: list[Optional[asyncio.StreamWriter]] = [None, None]
+        self.workers: set[asyncio.StreamWriter] = set()
+        self.log: list[list] = []  # packed frames
+        self.white = 0
+
+    @property
+    def empty(self) -> bool:
+        return self.slots == [None, None] and not self.workers
+
+
+class Hub:
+    """Slots, logs and subscribing workers for every room. Runs on one event
+    loop and handles each line to completion, so it needs no locks."""
+
+    def __init__(self):
+        self.rooms: dict[str, _HubRoom] = {}
+        self.forwarded = 0
+
+    async def serve(self, address: str) -> None:
+        kind, _, where = address.partition(":")
+        if kind == "unix":
+            server = await asyncio.start_unix_server(self._worker, where, limit=_LINE_LIMIT)
+        elif kind == "tcp":
+            host, _, port = where.rpartition(":")
+            server = await asyncio.start_server(self._worker, host, int(port), limit=_LINE_LIMIT)
+        else:
+            raise ValueError(f"hub address must be unix:PATH or tcp:HOST:PORT, not {address!r}")
+        async with server:
+            await server.serve_forever()
+
+    async def _worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            async for line in reader:
+                self.handle(json.loads(line), writer)
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            for code, room in list(self.rooms.items()):
+                room.slots = [None if w is writer else w for w in room.slots]
+                room.workers.discard(writer)
+                if room.empty:
+                    del self.rooms[code]
+            writer.close()
+
+    def handle(self, msg: dict, writer: asyncio.StreamWriter) -> None:
+        op, code = msg["op"], msg["code"]
+        room = self.rooms.get(code)
+        if room is None:
+            room = self.rooms[code] = _HubRoom()
+        reply: Optional[dict] = None
+        if op == "pub":
+            frame = game_frame(_unpack(msg["data"]))
+            if frame is not None:
+                if frame[0] == RESET:
+                    room.log.clear()
+                    room.white = 1 - room.white
+                elif len(room.log) < MAX_LOG:
+                    room.log.append(_pack(frame))
+            msg["op"] = "msg"
+            line = json.dumps(msg).encode() + b"\n"
+            for w in room.workers:
+                if w is not writer:
+                    w.write(line)
+                    self.forwarded += 1
+        elif op == "claim":
+            index = room.slots.index(None) if None in room.slots else -1
+            if index >= 0:
+                room.slots[index] = writer
+            reply = {"index": index}
+        elif op == "release":
+            if room.slots[msg["index"]] is writer:
+                room.slots[msg["index"]] = None
+        elif op == "open":
+            room.workers.add(writer)
+            reply = {"log": room.log, "white": room.white}
+        elif op == "close":
+            room.workers.discard(writer)
+        if room.empty:
+            del self.rooms[code]
+        if reply is not None:
+            reply["id"] = msg["id"]
+            writer.write(json.dumps(reply).encode() + b"\n")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess room broker hub")
+    ap.add_argument("--listen", default="unix:/tmp/twistedchess.sock", help="unix:PATH or tcp:HOST:PORT")
+    args = ap.parse_args()
+    print(f"broker hub listening on {args.listen}")
+    try:
+        asyncio.run(Hub().serve(args.listen))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
-from typing import Optional
+import random
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 
 CASTLE_VECTORS: dict[int, dict[str, tuple[int,int]]] = {
     0: {"k": (0,  1), "q": (0, -1)},
@@ -7,6 +10,211 @@ CASTLE_VECTORS: dict[int, dict[str, tuple[int,int]]] = {
     3: {"k": (-1, 0), "q": (1,  0)},
 }
 
+# ── ZOBRIST KEYS ──────────────────────────────────────────────────────────────
+# Squares are hashed in the rotation-0 frame, so rotate_board only swaps the
+# rotation key instead of rehashing 64 squares.
+_zrng = random.Random(0x7C1E55)
+ZOBRIST_PIECES: dict[str, list[int]] = {
+    t + color: [_zrng.getrandbits(64) for _ in range(64)] for color in ("w", "b") for t in "PNBRQK"
+}
+ZOBRIST_ROTATION: list[int] = [_zrng.getrandbits(64) for _ in range(4)]
+ZOBRIST_CASTLING: list[int] = [_zrng.getrandbits(64) for _ in range(16)]
+ZOBRIST_TURN: int = _zrng.getrandbits(64)
+ZOBRIST_PENDING = random.Random(0x7C1E56).getrandbits(64)  # one ply left before the rotation
+
+
+def _canonical_table() -> list[list[int]]:
+    """_CANONICAL[rotation][r * 8 + c] -> square index in the rotation-0 frame."""
+    table = []
+    for rot in range(4):
+        row = []
+        for r in range(8):
+            for c in range(8):
+                cr, cc = r, c
+                for _ in range(rot):  # undo one rotate_board step: (r, c) -> (7 - c, r)
+                    cr, cc = 7 - cc, cr
+                row.append(cr * 8 + cc)
+        table.append(row)
+    return table
+
+_CANONICAL = _canonical_table()
+# _VIEW[rotation][square in the rotation-0 frame] -> r * 8 + c on screen
+_VIEW = [[0] * 64 for _ in range(4)]
+for _rot in range(4):
+    for _sq, _csq in enumerate(_CANONICAL[_rot]):
+        _VIEW[_rot][_csq] = _sq
+
+# Board.grid never moves: it stays in the rotation-0 frame. On screen white
+# pawns always advance up and castling follows CASTLE_VECTORS[rotation]; in
+# the stored frame that turns into a rotation-dependent pawn direction, while
+# castling vectors and promotion ranks stay fixed.
+PAWN_FORWARD: dict[int, tuple[int, int]] = {0: (-1, 0), 1: (0, -1), 2: (1, 0), 3: (0, 1)}  # white
+_PROMOTION_ROW = {"w": 0, "b": 7}
+_CASTLE = CASTLE_VECTORS[0]
+
+# ── GEOMETRY TABLES ───────────────────────────────────────────────────────────
+# Built once at import so move generation never bounds-checks coordinates.
+# Squares are (r, c) tuples in the grid frame; tables are indexed [r][c], and
+# pawn tables additionally by (rotation, color).
+Square = tuple[int, int]
+ORTHO_DIRS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAG_DIRS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _square_table(fn) -> list[list]:
+    return [[fn(r, c) for c in range(8)] for r in range(8)]
+
+
+def _steps(r: int, c: int, offsets) -> tuple[Square, ...]:
+    return tuple((r + dr, c + dc) for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+
+
+def _ray(r: int, c: int, dr: int, dc: int) -> tuple[Square, ...]:
+    out = []
+    r, c = r + dr, c + dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        out.append((r, c))
+        r, c = r + dr, c + dc
+    return tuple(out)
+
+
+KNIGHT_OFFSETS = ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))
+KING_OFFSETS = tuple((dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc)
+KNIGHT_TARGETS = _square_table(lambda r, c: _steps(r, c, KNIGHT_OFFSETS))
+KING_TARGETS = _square_table(lambda r, c: _steps(r, c, KING_OFFSETS))
+# ORTHO_RAYS[r][c][i]: squares outward from (r, c) along ORTHO_DIRS[i]; same for DIAG
+ORTHO_RAYS = _square_table(lambda r, c: tuple(_ray(r, c, dr, dc) for dr, dc in ORTHO_DIRS))
+DIAG_RAYS = _square_table(lambda r, c: tuple(_ray(r, c, dr, dc) for dr, dc in DIAG_DIRS))
+# Square just behind (r, c) for each direction, used for x-ray king moves
+BEHIND = {d: _square_table(lambda r, c, d=d: _steps(r, c, ((-d[0], -d[1]),))) for d in ORTHO_DIRS + DIAG_DIRS}
+
+# PAWN_PUSHES[(rot, color)][r][c]: (one step, two steps or None), or None at the edge
+PAWN_PUSHES: dict[tuple[int, str], list[list[Optional[tuple[Square, Optional[Square]]]]]] = {}
+# PAWN_CAPTURES[(rot, color)][r][c]: squares a pawn on (r, c) captures on
+PAWN_CAPTURES: dict[tuple[int, str], list[list[tuple[Square, ...]]]] = {}
+# PAWN_ATTACKERS[(rot, color)][r][c]: squares a pawn of color attacks (r, c) from
+PAWN_ATTACKERS: dict[tuple[int, str], list[list[tuple[Square, ...]]]] = {}
+# PROMOTION_MASK[(rot, color)]: bit r * 8 + c set for on-screen promotion squares
+PROMOTION_MASK: dict[tuple[int, str], int] = {}
+
+
+def _pawn_push(r: int, c: int, rot: int, color: str, fwd: Square) -> Optional[tuple[Square, Optional[Square]]]:
+    one = _steps(r, c, (fwd,))
+    if not one:
+        return None
+    # double push from the second row as seen on screen
+    two = _steps(r, c, ((2 * fwd[0], 2 * fwd[1]),)) if _VIEW[rot][r * 8 + c] >> 3 == (6 if color == "w" else 1) else ()
+    return one[0], (two[0] if two else None)
+
+
+for _rot, (_dr, _dc) in PAWN_FORWARD.items():
+    for _color, _s in (("w", 1), ("b", -1)):
+        _f = (_s * _dr, _s * _dc)
+        _caps = ((_f[0] + _dc, _f[1] + _dr), (_f[0] - _dc, _f[1] - _dr))  # forward plus sideways
+        PAWN_PUSHES[(_rot, _color)] = _square_table(lambda r, c: _pawn_push(r, c, _rot, _color, _f))
+        PAWN_CAPTURES[(_rot, _color)] = _square_table(lambda r, c: _steps(r, c, _caps))
+        PAWN_ATTACKERS[(_rot, _color)] = _square_table(lambda r, c: _steps(r, c, [(-dr, -dc) for dr, dc in _caps]))
+        PROMOTION_MASK[(_rot, _color)] = sum(
+            1 << sq for sq in range(64) if _CANONICAL[_rot][sq] >> 3 == _PROMOTION_ROW[_color]
+        )
+
+
+# ── EVALUATION TABLES ─────────────────────────────────────────────────────────
+# Piece-square tables are written for the screen with white moving up (row 0
+# at the top) and mirrored for black, which is where pawns push whatever the
+# rotation. Each grid square therefore scores differently at each rotation:
+# PST[type + color][grid square] holds the four values, material included and
+# signed for white, packed into one int with a 32-bit lane per rotation. Packed
+# values add lane by lane, so Board.scores keeps all four sums with one integer
+# add or subtract per piece change, and rotate_board only changes which lane
+# is read.
+PIECE_VALUES = {"P": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+_PST_SCREEN = {
+    "P": (0, 0, 0, 0, 0, 0, 0, 0,
+          50, 50, 50, 50, 50, 50, 50, 50,
+          10, 10, 20, 30, 30, 20, 10, 10,
+          5, 5, 10, 25, 25, 10, 5, 5,
+          0, 0, 0, 20, 20, 0, 0, 0,
+          5, -5, -10, 0, 0, -10, -5, 5,
+          5, 10, 10, -20, -20, 10, 10, 5,
+          0, 0, 0, 0, 0, 0, 0, 0),
+    "N": (-50, -40, -30, -30, -30, -30, -40, -50,
+          -40, -20, 0, 0, 0, 0, -20, -40,
+          -30, 0, 10, 15, 15, 10, 0, -30,
+          -30, 5, 15, 20, 20, 15, 5, -30,
+          -30, 0, 15, 20, 20, 15, 0, -30,
+          -30, 5, 10, 15, 15, 10, 5, -30,
+          -40, -20, 0, 5, 5, 0, -20, -40,
+          -50, -40, -30, -30, -30, -30, -40, -50),
+    "B": (-20, -10, -10, -10, -10, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 10, 10, 5, 0, -10,
+          -10, 5, 5, 10, 10, 5, 5, -10,
+          -10, 0, 10, 10, 10, 10, 0, -10,
+          -10, 10, 10, 10, 10, 10, 10, -10,
+          -10, 5, 0, 0, 0, 0, 5, -10,
+          -20, -10, -10, -10, -10, -10, -10, -20),
+    "R": (0, 0, 0, 0, 0, 0, 0, 0,
+          5, 10, 10, 10, 10, 10, 10, 5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          0, 0, 0, 5, 5, 0, 0, 0),
+    "Q": (-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20),
+    "K": (-30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -20, -30, -30, -40, -40, -30, -30, -20,
+          -10, -20, -20, -20, -20, -20, -20, -10,
+          20, 20, 0, 0, 0, 0, 20, 20,
+          20, 30, 10, 0, 0, 10, 30, 20),
+}
+# Pawns one or two grid rows from their (rotation-independent) promotion row:
+# after a rotation the promotion edge is a side of the screen, reached by a capture.
+_PAWN_NEAR_PROMOTION = {1: 30, 2: 10}
+
+_LANE_BIAS = sum(1 << 31 << 32 * rot for rot in range(4))
+
+
+def pack_scores(values) -> int:
+    return sum(v << 32 * rot for rot, v in enumerate(values))
+
+
+def unpack_score(packed: int, rotation: int) -> int:
+    """The rotation's lane of a packed score."""
+    return ((packed + _LANE_BIAS) >> 32 * rotation & 0xFFFFFFFF) - (1 << 31)
+
+
+def _pst_table() -> dict[str, list[int]]:
+    table = {}
+    for t, screen in _PST_SCREEN.items():
+        for color, sign in (("w", 1), ("b", -1)):
+            values = []
+            for sq in range(64):
+                per_rot = []
+                for rot in range(4):
+                    vr, vc = divmod(_VIEW[rot][sq], 8)
+                    v = PIECE_VALUES[t] + screen[(vr if color == "w" else 7 - vr) * 8 + vc]
+                    if t == "P":
+                        v += _PAWN_NEAR_PROMOTION.get(abs((sq >> 3) - _PROMOTION_ROW[color]), 0)
+                    per_rot.append(sign * v)
+                values.append(pack_scores(per_rot))
+            table[t + color] = values
+    return table
+
+PST = _pst_table()
+
+
 class ChessPiece:
     def __init__(self, type: str, color: str, number: Optional[int] = None):
         self.type = type   # "P","R","N","B","Q","K"
@@ -21,11 +229,64 @@ class ChessPiece:
         return f"{self.type}{n}{self.color}"
 
 
+class Undo(NamedTuple):
+    """What Board.unmake_move needs to restore the position before Board.make_move.
+
+    Squares are in the rotation-0 frame of Board.grid.
+    """
+    fr: int
+    fc: int
+    tr: int
+    tc: int
+    piece: ChessPiece                   # the mover; put back on (fr, fc), which also undoes promotion
+    captured: Optional[ChessPiece]
+    flags: tuple[bool, bool, bool]      # piece.has_moved, can_castle_kingside, can_castle_queenside
+    rook: Optional[tuple[ChessPiece, tuple[int, int], tuple[int, int], bool]]  # castling: rook, from, to, has_moved
+    castling: tuple[Optional[tuple[int, int]], ...]
+    key: int
+    turn: str
+    rotated: bool
+    scores: int
+
+
+# Board pickling: code byte = type index | black | moved | king castle flags
+_PIECE_CODES = " PNBRQK"
+_CODE_BLACK, _CODE_MOVED, _CODE_CASTLE_K, _CODE_CASTLE_Q = 8, 16, 32, 64
+
+# Position formats (Board.to_fen / to_bytes)
+FEN_START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w 0 KQkq 0"
+POSITION_BYTES = 33
+_FEN_EXPAND = str.maketrans({str(n): "." * n for n in range(1, 9)})
+_FEN_PIECES = {ch: (ch.upper(), "w" if ch.isupper() else "b") for ch in "PNBRQKpnbrqk"}
+# nibble (type index | 8 for black) -> (type, color)
+_NIBBLE_PIECES = {_PIECE_CODES.index(t) | (_CODE_BLACK if color == "b" else 0): (t, color)
+                  for t in "PNBRQK" for color in ("w", "b")}
+_KING_HOMES = {"w": (7, 4), "b": (0, 4)}
+_ROOK_HOMES = {"w": {"rook_k": (7, 7), "rook_q": (7, 0)}, "b": {"rook_k": (0, 7), "rook_q": (0, 0)}}
+
+
 def _on_board(r: int, c: int) -> bool:
     return 0 <= r < 8 and 0 <= c < 8
 
 
+def format_move(fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> str:
+    """Grid coordinates as sent over the wire, e.g. "6444" or "1070q"."""
+    return f"{fr}{fc}{tr}{tc}{promotion.lower() if promotion else ''}"
+
+
+def parse_move(text: str) -> tuple[int, int, int, int, Optional[str]]:
+    """Inverse of format_move. Raises ValueError on malformed input."""
+    if len(text) not in (4, 5) or not text[:4].isdigit():
+        raise ValueError(f"bad move {text!r}")
+    fr, fc, tr, tc = (int(ch) for ch in text[:4])
+    return fr, fc, tr, tc, (text[4].upper() if len(text) == 5 else None)
+
+
 class Board:
+    """Public methods take and return on-screen (r, c) for the current rotation;
+    grid and castling are kept in the rotation-0 frame, so rotate_board only
+    bumps rotation."""
+
     def __init__(self):
         self.grid: list[list[Optional[ChessPiece]]] = [[None] * 8 for _ in range(8)]
         self.rotation = 0
@@ -33,7 +294,11 @@ class Board:
             "w": {"king": (7, 4), "rook_k": (7, 7), "rook_q": (7, 0)},
             "b": {"king": (0, 4), "rook_k": (0, 7), "rook_q": (0, 0)},
         }
+        self.turn = "w"
         self._place_pieces()
+        self.key = self.compute_key()
+        self.scores = self.compute_scores()
+        self.compute_attacks()
 
     def _place_pieces(self) -> None:
         # Queen on its color: white Q on d1 (light), black Q on d8 (dark). Standard: R,N,B,Q,K,B,N,R
@@ -50,192 +315,508 @@ class Board:
             num = 0 if t in ("R", "N", "B") and col < 4 else (1 if t in ("R", "N", "B") else None)
             self.grid[7][col] = ChessPiece(t, "w", num)
 
+    def _zkey(self, r: int, c: int, piece: ChessPiece) -> int:
+        return ZOBRIST_PIECES[piece.type + piece.color][r * 8 + c]
+
+    def _castle_rights(self) -> int:
+        """4-bit castling rights: king flag set and rook still tracked, per color and side."""
+        rights = 0
+        for i, color in enumerate(("w", "b")):
+            kpos = self.castling[color]["king"]
+            king = self.grid[kpos[0]][kpos[1]] if kpos else None
+            if king is None or king.type != "K":
+                continue
+            if king.can_castle_kingside and self.castling[color]["rook_k"] is not None:
+                rights |= 1 << (2 * i)
+            if king.can_castle_queenside and self.castling[color]["rook_q"] is not None:
+                rights |= 2 << (2 * i)
+        return rights
+
+    def compute_key(self) -> int:
+        """Zobrist key from scratch; Board.key holds the same value, updated incrementally."""
+        key = ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_CASTLING[self._castle_rights()]
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        sq = 0
+        for row in self.grid:
+            for p in row:
+                if p:
+                    key ^= ZOBRIST_PIECES[p.type + p.color][sq]
+                sq += 1
+        return key
+
+    def compute_scores(self) -> int:
+        """Packed evaluation sums from scratch; Board.scores holds the same, updated by move."""
+        scores = 0
+        sq = 0
+        for row in self.grid:
+            for p in row:
+                if p:
+                    scores += PST[p.type + p.color][sq]
+                sq += 1
+        return scores
+
+    @property
+    def score(self) -> int:
+        """Material plus piece-square value for white at the current rotation."""
+        return unpack_score(self.scores, self.rotation)
+
+    # ── PICKLING ──────────────────────────────────────────────────────────────
+    # A Board pickles to 103 bytes instead of a graph of ChessPiece objects:
+    # one code byte per grid square, piece numbers two to a byte, the six
+    # castling squares (255 = None) and a rotation/turn byte.
+
+    def __getstate__(self) -> bytes:
+        codes = bytearray(64)
+        numbers = bytearray(32)
+        for sq in range(64):
+            p = self.grid[sq >> 3][sq & 7]
+            num = 15
+            if p:
+                codes[sq] = (_PIECE_CODES.index(p.type) | (_CODE_BLACK if p.color == "b" else 0)
+                             | (_CODE_MOVED if p.has_moved else 0)
+                             | (_CODE_CASTLE_K if p.can_castle_kingside else 0)
+                             | (_CODE_CASTLE_Q if p.can_castle_queenside else 0))
+                num = 15 if p.number is None else p.number
+            numbers[sq >> 1] |= num << (4 * (sq & 1))
+        castle = bytes(255 if pos is None else pos[0] * 8 + pos[1]
+                       for color in ("w", "b") for pos in self.castling[color].values())
+        return bytes(codes) + bytes(numbers) + castle + bytes([self.rotation | (4 if self.turn == "b" else 0)])
+
+    def __setstate__(self, state: bytes) -> None:
+        self.grid = [[None] * 8 for _ in range(8)]
+        for sq in range(64):
+            code = state[sq]
+            if code & 7:
+                num = state[64 + (sq >> 1)] >> (4 * (sq & 1)) & 15
+                p = ChessPiece(_PIECE_CODES[code & 7], "b" if code & _CODE_BLACK else "w", None if num == 15 else num)
+                p.has_moved = bool(code & _CODE_MOVED)
+                p.can_castle_kingside = bool(code & _CODE_CASTLE_K)
+                p.can_castle_queenside = bool(code & _CODE_CASTLE_Q)
+                self.grid[sq >> 3][sq & 7] = p
+        castle = iter(state[96:102])
+        self.castling = {color: {name: None if (sq := next(castle)) == 255 else (sq >> 3, sq & 7)
+                                 for name in ("king", "rook_k", "rook_q")} for color in ("w", "b")}
+        self.rotation = state[102] & 3
+        self.turn = "b" if state[102] & 4 else "w"
+        self.key = self.compute_key()
+
+    # ── POSITION FORMATS ──────────────────────────────────────────────────────
+    # Twisted-FEN: "<placement> <turn> <rotation> <castling> <moves_this_round>",
+    # FEN_START for the initial position. Placement lists Board.grid rows 0..7
+    # (the rotation-0 frame) with uppercase for white; castling letters are the
+    # effective rights (king flag set and rook still tracked). The binary form
+    # packs the same fields into POSITION_BYTES: a nibble per grid square
+    # (type index, 8 for black), then rotation | turn << 2 |
+    # moves_this_round << 3 | rights << 4. Piece numbers and has_moved are
+    # not part of a position.
+
+    def to_fen(self, moves_this_round: int = 0) -> str:
+        rows = []
+        for row in self.grid:
+            out, empty = "", 0
+            for p in row:
+                if p is None:
+                    empty += 1
+                    continue
+                if empty:
+                    out, empty = out + str(empty), 0
+                out += p.type if p.color == "w" else p.type.lower()
+            rows.append(out + str(empty) if empty else out)
+        rights = self._castle_rights()
+        castle = "".join(ch for i, ch in enumerate("KQkq") if rights >> i & 1) or "-"
+        return f"{'/'.join(rows)} {self.turn} {self.rotation} {castle} {moves_this_round}"
+
+    @classmethod
+    def from_fen(cls, text: str) -> tuple["Board", int]:
+        """Inverse of to_fen: (board, moves_this_round). Raises ValueError on malformed input."""
+        fields = text.split()
+        if len(fields) != 5:
+            raise ValueError(f"bad position {text!r}")
+        placement, turn, rotation, castle, mtr = fields
+        rows = placement.translate(_FEN_EXPAND).split("/")
+        if len(rows) != 8 or any(len(row) != 8 for row in rows):
+            raise ValueError(f"bad placement {placement!r}")
+        if turn not in ("w", "b") or rotation not in ("0", "1", "2", "3") or mtr not in ("0", "1"):
+            raise ValueError(f"bad position {text!r}")
+        grid: list[list[Optional[ChessPiece]]] = [[None] * 8 for _ in range(8)]
+        for r, row in enumerate(rows):
+            for c, ch in enumerate(row):
+                if ch != ".":
+                    if ch not in _FEN_PIECES:
+                        raise ValueError(f"bad piece {ch!r}")
+                    grid[r][c] = ChessPiece(*_FEN_PIECES[ch])
+        if castle == "-":
+            rights = 0
+        elif all(ch in "KQkq" for ch in castle) and len(set(castle)) == len(castle):
+            rights = sum(1 << "KQkq".index(ch) for ch in castle)
+        else:
+            raise ValueError(f"bad castling {castle!r}")
+        board = cls.__new__(cls)
+        board._load(grid, rotation=int(rotation), turn=turn, rights=rights)
+        return board, int(mtr)
+
+    def to_bytes(self, moves_this_round: int = 0) -> bytes:
+        out = bytearray(POSITION_BYTES)
+        for sq in range(64):
+            p = self.grid[sq >> 3][sq & 7]
+            if p:
+                out[sq >> 1] |= (_PIECE_CODES.index(p.type) | (_CODE_BLACK if p.color == "b" else 0)) << (4 * (sq & 1))
+        out[32] = (self.rotation | (4 if self.turn == "b" else 0) | moves_this_round << 3
+                   | self._castle_rights() << 4)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> tuple["Board", int]:
+        """Inverse of to_bytes: (board, moves_this_round). Raises ValueError on malformed input."""
+        if len(data) != POSITION_BYTES:
+            raise ValueError(f"position record must be {POSITION_BYTES} bytes, got {len(data)}")
+        grid: list[list[Optional[ChessPiece]]] = [[None] * 8 for _ in range(8)]
+        for i in range(32):
+            byte = data[i]
+            if byte:
+                for c, code in ((2 * (i & 3), byte & 15), (2 * (i & 3) + 1, byte >> 4)):
+                    if code:
+                        if code not in _NIBBLE_PIECES:
+                            raise ValueError(f"bad piece code {code}")
+                        grid[i >> 2][c] = ChessPiece(*_NIBBLE_PIECES[code])
+        meta = data[32]
+        board = cls.__new__(cls)
+        board._load(grid, rotation=meta & 3, turn="b" if meta & 4 else "w", rights=meta >> 4)
+        return board, meta >> 3 & 1
+
+    def _load(self, grid: list[list[Optional[ChessPiece]]], rotation: int, turn: str, rights: int) -> None:
+        """Set up a board from a parsed position; rights as in _castle_rights."""
+        self.grid = grid
+        self.rotation = rotation
+        self.turn = turn
+        self.castling = {}
+        for i, color in enumerate(("w", "b")):
+            king_pos = self._find("K", color)
+            self.castling[color] = {"king": king_pos, "rook_k": None, "rook_q": None}
+            for name, bit in (("rook_k", 1 << 2 * i), ("rook_q", 2 << 2 * i)):
+                if not rights & bit:
+                    continue
+                rr, rc = _ROOK_HOMES[color][name]
+                rook = grid[rr][rc]
+                if king_pos != _KING_HOMES[color] or not rook or rook.type != "R" or rook.color != color:
+                    raise ValueError(f"castling right {'KQkq'[2 * i + (name == 'rook_q')]} without king and rook at home")
+                self.castling[color][name] = (rr, rc)
+            if king_pos:
+                king = grid[king_pos[0]][king_pos[1]]
+                king.can_castle_kingside = self.castling[color]["rook_k"] is not None  # type: ignore[union-attr]
+                king.can_castle_queenside = self.castling[color]["rook_q"] is not None  # type: ignore[union-attr]
+        self.key = self.compute_key()
+        # attack maps and scores are built on first use (__getattr__): bulk loads often never need them
+
+    # ── ATTACK MAPS ───────────────────────────────────────────────────────────
+    # kings[color] is the king's grid square; attacks[color][r][c] counts the
+    # pieces of color attacking grid (r, c). _attack_sets[r][c] remembers what
+    # the piece on (r, c) was counted as attacking so it can be taken back.
+
+    def compute_attacks(self) -> None:
+        """Kings and attack maps from scratch; move, rotate_board and make/unmake keep them current."""
+        self.kings: dict[str, Optional[tuple[int, int]]] = {"w": None, "b": None}
+        self.attacks: dict[str, list[list[int]]] = {"w": [[0] * 8 for _ in range(8)], "b": [[0] * 8 for _ in range(8)]}
+        self._attack_sets: list[list[Optional[tuple[str, tuple[tuple[int, int], ...]]]]] = [[None] * 8 for _ in range(8)]
+        for r, row in enumerate(self.grid):
+            sets = self._attack_sets[r]
+            for c, p in enumerate(row):
+                if p:
+                    if p.type == "K" and self.kings[p.color] is None:
+                        self.kings[p.color] = (r, c)
+                    squares = self._piece_attacks(r, c, p)
+                    counts = self.attacks[p.color]
+                    for tr, tc in squares:
+                        counts[tr][tc] += 1
+                    sets[c] = (p.color, squares)
+
+    def __getattr__(self, name: str):
+        # only reached when the attribute is missing, i.e. maps or scores not built yet
+        if name in ("kings", "attacks", "_attack_sets"):
+            self.compute_attacks()
+            return self.__dict__[name]
+        if name == "scores":
+            self.scores = self.compute_scores()
+            return self.scores
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def _piece_attacks(self, r: int, c: int, piece: ChessPiece) -> tuple[tuple[int, int], ...]:
+        if piece.type == "P":
+            return PAWN_CAPTURES[(self.rotation, piece.color)][r][c]
+        if piece.type == "N":
+            return KNIGHT_TARGETS[r][c]
+        if piece.type == "K":
+            return KING_TARGETS[r][c]
+        rays = ORTHO_RAYS[r][c] if piece.type == "R" else DIAG_RAYS[r][c] if piece.type == "B" else ORTHO_RAYS[r][c] + DIAG_RAYS[r][c]
+        grid = self.grid
+        out = []
+        for ray in rays:
+            for sq in ray:
+                out.append(sq)
+                if grid[sq[0]][sq[1]] is not None:
+                    break
+        return tuple(out)
+
+    def _set_attacks(self, r: int, c: int) -> None:
+        """Replace the attacks counted for grid (r, c) with those of the piece now there."""
+        old = self._attack_sets[r][c]
+        if old:
+            counts = self.attacks[old[0]]
+            for tr, tc in old[1]:
+                counts[tr][tc] -= 1
+        piece = self.grid[r][c]
+        if piece is None:
+            self._attack_sets[r][c] = None
+            return
+        squares = self._piece_attacks(r, c, piece)
+        counts = self.attacks[piece.color]
+        for tr, tc in squares:
+            counts[tr][tc] += 1
+        self._attack_sets[r][c] = (piece.color, squares)
+
+    def _update_attacks(self, squares: list[tuple[int, int]]) -> None:
+        """Occupancy changed on squares: refresh them and every slider whose line reaches them."""
+        grid = self.grid
+        redo = set(squares)
+        for r, c in squares:
+            for rays, sliders in ((ORTHO_RAYS[r][c], ("R", "Q")), (DIAG_RAYS[r][c], ("B", "Q"))):
+                for ray in rays:
+                    for nr, nc in ray:
+                        p = grid[nr][nc]
+                        if p is not None:
+                            if p.type in sliders:
+                                redo.add((nr, nc))
+                            break
+        for r, c in redo:
+            self._set_attacks(r, c)
+
+    def _update_pawn_attacks(self) -> None:
+        """Pawn captures follow the rotation; everything else is rotation-independent."""
+        for r in range(8):
+            for c in range(8):
+                p = self.grid[r][c]
+                if p and p.type == "P":
+                    self._set_attacks(r, c)
+
+    def to_canonical(self, r: int, c: int) -> tuple[int, int]:
+        """On-screen square -> grid square."""
+        sq = _CANONICAL[self.rotation][r * 8 + c]
+        return sq >> 3, sq & 7
+
+    def to_view(self, r: int, c: int) -> tuple[int, int]:
+        """Grid square -> on-screen square."""
+        sq = _VIEW[self.rotation][r * 8 + c]
+        return sq >> 3, sq & 7
+
     def get(self, r: int, c: int) -> Optional[ChessPiece]:
         if not _on_board(r, c):
             return None
-        return self.grid[r][c]
+        sq = _CANONICAL[self.rotation][r * 8 + c]
+        return self.grid[sq >> 3][sq & 7]
 
     def _is_square_attacked(self, r: int, c: int, by_color: str) -> bool:
-        """Check if (r, c) is attacked by any piece of by_color."""
-        # Pawns
-        dr = -1 if by_color == "w" else 1
-        for dc in (-1, 1):
-            nr, nc = r - dr, c + dc
-            if _on_board(nr, nc):
-                p = self.grid[nr][nc]
-                if p and p.type == "P" and p.color == by_color:
-                    return True
-        # Knights
-        for mr, mc in ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)):
-            nr, nc = r + mr, c + mc
-            if _on_board(nr, nc):
-                p = self.grid[nr][nc]
-                if p and p.type == "N" and p.color == by_color:
-                    return True
-        # King (one step)
-        for dr in (-1, 0, 1):
-            for dc in (-1, 0, 1):
-                if dr == 0 and dc == 0:
-                    continue
-                nr, nc = r + dr, c + dc
-                if _on_board(nr, nc):
-                    p = self.grid[nr][nc]
-                    if p and p.type == "K" and p.color == by_color:
-                        return True
-        # Rook/Queen along ranks and files
-        for dr, dc in ((-1,0),(1,0),(0,-1),(0,1)):
-            nr, nc = r + dr, c + dc
-            while _on_board(nr, nc):
-                p = self.grid[nr][nc]
-                if p:
-                    if p.color == by_color and p.type in ("R", "Q"):
-                        return True
-                    break
-                nr, nc = nr + dr, nc + dc
-        # Bishop/Queen diagonals
-        for dr, dc in ((-1,-1),(-1,1),(1,-1),(1,1)):
-            nr, nc = r + dr, c + dc
-            while _on_board(nr, nc):
-                p = self.grid[nr][nc]
-                if p:
-                    if p.color == by_color and p.type in ("B", "Q"):
-                        return True
-                    break
-                nr, nc = nr + dr, nc + dc
-        return False
+        """Check if grid square (r, c) is attacked by any piece of by_color."""
+        return self.attacks[by_color][r][c] > 0
 
     def is_in_check(self, color: str) -> bool:
-        pos = self.find_piece("K", color)
+        pos = self.kings[color]
         if pos is None:
             return False
-        r, c = pos
-        opp = "b" if color == "w" else "w"
-        return self._is_square_attacked(r, c, opp)
+        return self.attacks["b" if color == "w" else "w"][pos[0]][pos[1]] > 0
 
     def _raw_moves(self, r: int, c: int) -> list[tuple[int, int]]:
-        """Moves for piece at (r,c) without check filtering. No promotion info here."""
+        """Grid moves for piece at grid (r,c) without check filtering. No promotion info here."""
         if not _on_board(r, c):
             return []
-        piece = self.grid[r][c]
+        grid = self.grid
+        piece = grid[r][c]
         if not piece:
             return []
         color = piece.color
         moves: list[tuple[int, int]] = []
-        dr_pawn = -1 if color == "w" else 1
-        start_row_pawn = 6 if color == "w" else 1
 
         if piece.type == "P":
-            # One forward
-            nr, nc = r + dr_pawn, c
-            if _on_board(nr, nc) and self.grid[nr][nc] is None:
-                moves.append((nr, nc))
-            # Two from start
-            if r == start_row_pawn:
-                nr2 = r + 2 * dr_pawn
-                if _on_board(nr2, nc) and self.grid[nr2][nc] is None and self.grid[nr][nc] is None:
-                    moves.append((nr2, nc))
-            # Captures
-            for dc in (-1, 1):
-                nr, nc = r + dr_pawn, c + dc
-                if _on_board(nr, nc) and self.grid[nr][nc] is not None and self.grid[nr][nc].color != color:  # type: ignore[attr-defined]
+            push = PAWN_PUSHES[(self.rotation, color)][r][c]
+            if push:
+                one, two = push
+                if grid[one[0]][one[1]] is None:
+                    moves.append(one)
+                    if two and grid[two[0]][two[1]] is None:
+                        moves.append(two)
+            for nr, nc in PAWN_CAPTURES[(self.rotation, color)][r][c]:
+                p = grid[nr][nc]
+                if p is not None and p.color != color:
                     moves.append((nr, nc))
 
-        elif piece.type == "N":
-            for mr, mc in ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)):
-                nr, nc = r + mr, c + mc
-                if _on_board(nr, nc):
-                    p = self.grid[nr][nc]
-                    if p is None or p.color != color:
-                        moves.append((nr, nc))
-
-        elif piece.type in ("R", "Q"):
-            for dr, dc in ((-1,0),(1,0),(0,-1),(0,1)):
-                nr, nc = r + dr, c + dc
-                while _on_board(nr, nc):
-                    p = self.grid[nr][nc]
-                    if p is None:
-                        moves.append((nr, nc))
-                    else:
-                        if p.color != color:
-                            moves.append((nr, nc))
-                        break
-                    nr, nc = nr + dr, nc + dc
-        if piece.type in ("B", "Q"):
-            for dr, dc in ((-1,-1),(-1,1),(1,-1),(1,1)):
-                nr, nc = r + dr, c + dc
-                while _on_board(nr, nc):
-                    p = self.grid[nr][nc]
+        elif piece.type == "N" or piece.type == "K":
+            for nr, nc in (KNIGHT_TARGETS if piece.type == "N" else KING_TARGETS)[r][c]:
+                p = grid[nr][nc]
+                if p is None or p.color != color:
+                    moves.append((nr, nc))
+            if piece.type == "K":
+                moves.extend(self._castle_moves(r, c, piece))
+
+        else:
+            rays = ORTHO_RAYS[r][c] if piece.type == "R" else DIAG_RAYS[r][c] if piece.type == "B" else ORTHO_RAYS[r][c] + DIAG_RAYS[r][c]
+            for ray in rays:
+                for sq in ray:
+                    p = grid[sq[0]][sq[1]]
                     if p is None:
-                        moves.append((nr, nc))
+                        moves.append(sq)
                     else:
                         if p.color != color:
-                            moves.append((nr, nc))
+                            moves.append(sq)
                         break
-                    nr, nc = nr + dr, nc + dc
 
-        elif piece.type == "K":
-            for dr in (-1, 0, 1):
-                for dc in (-1, 0, 1):
-                    if dr == 0 and dc == 0:
-                        continue
-                    nr, nc = r + dr, c + dc
-                    if _on_board(nr, nc):
-                        p = self.grid[nr][nc]
-                        if p is None or p.color != color:
-                            moves.append((nr, nc))
-            # Castling
-            opp = "b" if color == "w" else "w"
-            vecs = CASTLE_VECTORS[self.rotation]
-            kpos = self.castling[color]["king"]
-            if kpos == (r, c):
-                for side, (dr, dc) in vecs.items():
-                    rook_key = "rook_k" if side == "k" else "rook_q"
-                    can_key  = "can_castle_kingside" if side == "k" else "can_castle_queenside"
-                    if not getattr(piece, can_key):
-                        continue
-                    rook_pos = self.castling[color][rook_key]
-                    if rook_pos is None:
-                        continue
-                    sq1 = (r + dr,     c + dc)
-                    sq2 = (r + 2*dr,   c + 2*dc)
-                    if not (_on_board(*sq1) and _on_board(*sq2)):
-                        continue
-                    # all squares between king and rook must be empty
-                    rr, rc = rook_pos
-                    path_clear = True
-                    nr2, nc2 = r + dr, c + dc
-                    while (nr2, nc2) != (rr, rc):
-                        if self.grid[nr2][nc2] is not None:
-                            path_clear = False
-                            break
-                        nr2, nc2 = nr2 + dr, nc2 + dc
-                    if not path_clear:
-                        continue
-                    # king must not pass through check
-                    if (self._is_square_attacked(r,       c,       opp) or
-                        self._is_square_attacked(sq1[0],  sq1[1],  opp) or
-                        self._is_square_attacked(sq2[0],  sq2[1],  opp)):
-                        continue
-                    moves.append(sq2)
+        return moves
 
+    def _castle_moves(self, r: int, c: int, piece: ChessPiece) -> list[tuple[int, int]]:
+        """King destinations for castling from grid (r, c); CASTLE_VECTORS[rotation] on screen."""
+        moves: list[tuple[int, int]] = []
+        color = piece.color
+        opp = "b" if color == "w" else "w"
+        vecs = _CASTLE
+        kpos = self.castling[color]["king"]
+        if kpos == (r, c):
+            for side, (dr, dc) in vecs.items():
+                rook_key = "rook_k" if side == "k" else "rook_q"
+                can_key  = "can_castle_kingside" if side == "k" else "can_castle_queenside"
+                if not getattr(piece, can_key):
+                    continue
+                rook_pos = self.castling[color][rook_key]
+                if rook_pos is None:
+                    continue
+                sq1 = (r + dr,     c + dc)
+                sq2 = (r + 2*dr,   c + 2*dc)
+                if not (_on_board(*sq1) and _on_board(*sq2)):
+                    continue
+                # all squares between king and rook must be empty
+                rr, rc = rook_pos
+                path_clear = True
+                nr2, nc2 = r + dr, c + dc
+                while (nr2, nc2) != (rr, rc):
+                    if self.grid[nr2][nc2] is not None:
+                        path_clear = False
+                        break
+                    nr2, nc2 = nr2 + dr, nc2 + dc
+                if not path_clear:
+                    continue
+                # king must not pass through check
+                if (self._is_square_attacked(r,       c,       opp) or
+                    self._is_square_attacked(sq1[0],  sq1[1],  opp) or
+                    self._is_square_attacked(sq2[0],  sq2[1],  opp)):
+                    continue
+                moves.append(sq2)
         return moves
 
     def get_legal_moves(self, r: int, c: int) -> list[tuple[int, int]]:
         """Returns list of (tr, tc) that are legal (don't leave own king in check)."""
-        piece = self.grid[r][c]
-        if not piece or not _on_board(r, c):
+        if not _on_board(r, c):
             return []
-        color = piece.color
-        raw = self._raw_moves(r, c)
-        legal = []
-        for (tr, tc) in raw:
-            if not self._move_leaves_king_safe(r, c, tr, tc, piece):
+        view = _VIEW[self.rotation]
+        sq = _CANONICAL[self.rotation][r * 8 + c]
+        piece = self.grid[sq >> 3][sq & 7]
+        if not piece:
+            return []
+        return [divmod(view[tr * 8 + tc], 8) for _, _, tr, tc in self._gen_legal(piece.color, (sq >> 3, sq & 7))]
+
+    def legal_moves(self, color: str) -> list[tuple[int, int, int, int]]:
+        """All legal (fr, fc, tr, tc) for color in one pass."""
+        view = _VIEW[self.rotation]
+        out = []
+        for fr, fc, tr, tc in self._gen_legal(color):
+            frm, to = view[fr * 8 + fc], view[tr * 8 + tc]
+            out.append((frm >> 3, frm & 7, to >> 3, to & 7))
+        return out
+
+    def _checks_and_pins(self, kr: int, kc: int, color: str) -> tuple[
+        list[tuple[int, int]], set[tuple[int, int]], dict[tuple[int, int], set[tuple[int, int]]], set[tuple[int, int]]
+    ]:
+        """Checkers of color's king at (kr, kc) and pinned pieces.
+
+        Returns (checkers, evasions, pins, xray): checkers is a list of (r, c);
+        evasions the squares a non-king move must land on to answer a single
+        check; pins maps a pinned square to the squares it may still move to;
+        xray the squares behind the king on a checking slider's line.
+        """
+        opp = "b" if color == "w" else "w"
+        checkers: list[tuple[int, int]] = []
+        evasions: set[tuple[int, int]] = set()
+        pins: dict[tuple[int, int], set[tuple[int, int]]] = {}
+        xray: set[tuple[int, int]] = set()
+        grid = self.grid
+        # leaper checkers only need looking for when the attack map says the king is hit
+        leapers = (
+            (PAWN_ATTACKERS[(self.rotation, opp)][kr][kc], "P"),
+            (KNIGHT_TARGETS[kr][kc], "N"),
+            (KING_TARGETS[kr][kc], "K"),  # only in illegal positions
+        ) if self.attacks[opp][kr][kc] else ()
+        for squares, kind in leapers:
+            for nr, nc in squares:
+                p = grid[nr][nc]
+                if p and p.type == kind and p.color == opp:
+                    checkers.append((nr, nc))
+                    evasions.add((nr, nc))
+        for dirs, rays, sliders in ((ORTHO_DIRS, ORTHO_RAYS[kr][kc], ("R", "Q")), (DIAG_DIRS, DIAG_RAYS[kr][kc], ("B", "Q"))):
+            for d, ray in zip(dirs, rays):
+                own: Optional[tuple[int, int]] = None
+                for i, (nr, nc) in enumerate(ray):
+                    p = grid[nr][nc]
+                    if not p:
+                        continue
+                    if p.color == color:
+                        if own is not None:
+                            break
+                        own = (nr, nc)
+                        continue
+                    if p.type in sliders:
+                        if own is None:
+                            checkers.append((nr, nc))
+                            evasions.update(ray[:i + 1])
+                            xray.update(BEHIND[d][kr][kc])
+                        else:
+                            pins[own] = set(ray[:i + 1])
+                    break
+        return checkers, evasions, pins, xray
+
+    def _gen_legal(self, color: str, only: Optional[tuple[int, int]] = None) -> list[tuple[int, int, int, int]]:
+        """Legal grid moves for color (or just the piece on only) from pins and checkers, without trial moves."""
+        squares = [only] if only else [(r, c) for r in range(8) for c in range(8)]
+        kpos = self.kings[color]
+        if kpos is None:
+            return [(r, c, tr, tc) for r, c in squares
+                    if (p := self.grid[r][c]) and p.color == color for tr, tc in self._raw_moves(r, c)]
+        kr, kc = kpos
+        opp = "b" if color == "w" else "w"
+        checkers, evasions, pins, xray = self._checks_and_pins(kr, kc, color)
+        moves: list[tuple[int, int, int, int]] = []
+        for r, c in squares:
+            p = self.grid[r][c]
+            if not p or p.color != color:
+                continue
+            if p.type == "K":
+                for nr, nc in KING_TARGETS[r][c]:
+                    if (nr, nc) not in xray:
+                        q = self.grid[nr][nc]
+                        if (q is None or q.color != color) and not self._is_square_attacked(nr, nc, opp):
+                            moves.append((r, c, nr, nc))
+                if not checkers:
+                    moves.extend((r, c, tr, tc) for tr, tc in self._castle_moves(r, c, p))
                 continue
-            legal.append((tr, tc))
-        return legal
+            if len(checkers) > 1:
+                continue
+            pin = pins.get((r, c))
+            for tr, tc in self._raw_moves(r, c):
+                if checkers and (tr, tc) not in evasions:
+                    continue
+                if pin is not None and (tr, tc) not in pin:
+                    continue
+                moves.append((r, c, tr, tc))
+        return moves
 
     def _move_leaves_king_safe(self, fr: int, fc: int, tr: int, tc: int, piece: ChessPiece) -> bool:
-        """After moving piece from (fr,fc) to (tr,tc), is own king not in check? Handles castling (moves rook)."""
+        """After moving piece from grid (fr,fc) to (tr,tc), is own king not in check? Handles castling (moves rook)."""
         captured = self.grid[tr][tc]
         self._apply_raw_move(fr, fc, tr, tc, piece)
         safe = not self.is_in_check(piece.color)
@@ -243,63 +824,95 @@ class Board:
         return safe
 
     def _apply_raw_move(self, fr: int, fc: int, tr: int, tc: int, piece: ChessPiece) -> None:
+        captured = self.grid[tr][tc]
+        if captured:
+            self.key ^= self._zkey(tr, tc, captured)
+        self.key ^= self._zkey(fr, fc, piece) ^ self._zkey(tr, tc, piece)
         self.grid[fr][fc] = None
         self.grid[tr][tc] = piece
+        changed = [(fr, fc), (tr, tc)]
+        if piece.type == "K":
+            self.kings[piece.color] = (tr, tc)
+        if captured and captured.type == "K":
+            self.kings[captured.color] = None
         # castling: king moves exactly 2 in one axis, 0 in the other
         if piece.type == "K" and ((abs(tr-fr)==2 and tc==fc) or (abs(tc-fc)==2 and tr==fr)):
             dr = (tr - fr) // 2 if tr != fr else 0
             dc = (tc - fc) // 2 if tc != fc else 0
-            vecs = CASTLE_VECTORS[self.rotation]
-            side = "k" if (dr, dc) == vecs["k"] else "q"
+            side = "k" if (dr, dc) == _CASTLE["k"] else "q"
             rook_pos = self.castling[piece.color]["rook_k" if side=="k" else "rook_q"]
             if rook_pos:
                 rook = self.grid[rook_pos[0]][rook_pos[1]]
                 if rook:
+                    self.key ^= self._zkey(rook_pos[0], rook_pos[1], rook) ^ self._zkey(fr + dr, fc + dc, rook)
                     self.grid[rook_pos[0]][rook_pos[1]] = None
                     # rook lands on the square the king just passed through
                     self.grid[fr + dr][fc + dc] = rook
+                    changed += [rook_pos, (fr + dr, fc + dc)]
+        self._update_attacks(changed)
 
     def _undo_raw_move(self, fr: int, fc: int, tr: int, tc: int, piece: ChessPiece, captured: Optional[ChessPiece]) -> None:
+        self.key ^= self._zkey(fr, fc, piece) ^ self._zkey(tr, tc, piece)
+        if captured:
+            self.key ^= self._zkey(tr, tc, captured)
         self.grid[fr][fc] = piece
         self.grid[tr][tc] = captured
+        changed = [(fr, fc), (tr, tc)]
+        if piece.type == "K":
+            self.kings[piece.color] = (fr, fc)
+        if captured and captured.type == "K":
+            self.kings[captured.color] = (tr, tc)
         if piece.type == "K" and ((abs(tr-fr)==2 and tc==fc) or (abs(tc-fc)==2 and tr==fr)):
             dr = (tr - fr) // 2 if tr != fr else 0
             dc = (tc - fc) // 2 if tc != fc else 0
-            vecs = CASTLE_VECTORS[self.rotation]
-            side = "k" if (dr, dc) == vecs["k"] else "q"
+            side = "k" if (dr, dc) == _CASTLE["k"] else "q"
             rook_pos = self.castling[piece.color]["rook_k" if side=="k" else "rook_q"]
             if rook_pos:
                 rook = self.grid[fr + dr][fc + dc]
                 if rook:
+                    self.key ^= self._zkey(rook_pos[0], rook_pos[1], rook) ^ self._zkey(fr + dr, fc + dc, rook)
                     self.grid[fr + dr][fc + dc] = None
                     self.grid[rook_pos[0]][rook_pos[1]] = rook
+                    changed += [rook_pos, (fr + dr, fc + dc)]
+        self._update_attacks(changed)
 
     def move(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> None:
         if not (_on_board(fr, fc) and _on_board(tr, tc)):
             return
+        self._move(*self.to_canonical(fr, fc), *self.to_canonical(tr, tc), promotion)
+
+    def _move(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> None:
+        """Board.move on grid squares."""
         piece = self.grid[fr][fc]
         if not piece:
             return
         color = piece.color
+        key = self.key ^ ZOBRIST_CASTLING[self._castle_rights()] ^ self._zkey(fr, fc, piece)
+        changed = [(fr, fc), (tr, tc)]
+        scores = self.scores - PST[piece.type + color][fr * 8 + fc]
         # Castling: move rook
         if piece.type == "K" and ((abs(tr-fr)==2 and tc==fc) or (abs(tc-fc)==2 and tr==fr)):
             dr = (tr - fr) // 2 if tr != fr else 0
             dc = (tc - fc) // 2 if tc != fc else 0
-            vecs = CASTLE_VECTORS[self.rotation]
-            side = "k" if (dr, dc) == vecs["k"] else "q"
+            side = "k" if (dr, dc) == _CASTLE["k"] else "q"
             rook_key = "rook_k" if side == "k" else "rook_q"
             rook_pos = self.castling[color][rook_key]
             if rook_pos:
                 rook = self.grid[rook_pos[0]][rook_pos[1]]
                 if rook:
+                    key ^= self._zkey(rook_pos[0], rook_pos[1], rook) ^ self._zkey(fr + dr, fc + dc, rook)
                     self.grid[rook_pos[0]][rook_pos[1]] = None
                     self.grid[fr + dr][fc + dc] = rook
                     rook.has_moved = True
+                    rook_pst = PST[rook.type + color]
+                    scores += rook_pst[(fr + dr) * 8 + fc + dc] - rook_pst[rook_pos[0] * 8 + rook_pos[1]]
+                    changed += [rook_pos, (fr + dr, fc + dc)]
             self.castling[color][rook_key] = None
 
         piece.has_moved = True
         if piece.type == "K":
             self.castling[color]["king"] = (tr, tc)
+            self.kings[color] = (tr, tc)
             piece.can_castle_kingside = False
             piece.can_castle_queenside = False
         if piece.type == "R":
@@ -309,6 +922,11 @@ class Board:
                 self.castling[color]["rook_q"] = None
 
         captured = self.grid[tr][tc]
+        if captured:
+            key ^= self._zkey(tr, tc, captured)
+            scores -= PST[captured.type + captured.color][tr * 8 + tc]
+            if captured.type == "K":
+                self.kings[captured.color] = None
         if captured and captured.type == "R":
             cap_color = captured.color
             if (tr, tc) == self.castling[cap_color]["rook_k"]:
@@ -320,52 +938,300 @@ class Board:
         self.grid[fr][fc] = None
 
         # Promotion: pawn reaches opposite original back rank
-        if piece.type == "P" and self._is_promotion_square(tr, tc, color):
+        if piece.type == "P" and tr == _PROMOTION_ROW[color]:
             promo = (promotion or "Q").upper()
             if promo not in ("Q", "R", "N", "B"):
                 promo = "Q"
             self.grid[tr][tc] = ChessPiece(promo, color)
+        self.scores = scores + PST[self.grid[tr][tc].type + color][tr * 8 + tc]  # type: ignore[union-attr]
+        self._update_attacks(changed)
+
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        self.turn = "b" if color == "w" else "w"
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        self.key = key ^ self._zkey(tr, tc, self.grid[tr][tc]) ^ ZOBRIST_CASTLING[self._castle_rights()]  # type: ignore[arg-type]
+
+    def make_move(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None,
+                  rotate: bool = False) -> Optional[Undo]:
+        """Board.move (then rotate_board if rotate) that unmake_move can reverse. None if nothing moved."""
+        if not (_on_board(fr, fc) and _on_board(tr, tc)):
+            return None
+        fr, fc = self.to_canonical(fr, fc)
+        tr, tc = self.to_canonical(tr, tc)
+        piece = self.grid[fr][fc]
+        if not piece:
+            return None
+        rook = None
+        if piece.type == "K" and ((abs(tr-fr)==2 and tc==fc) or (abs(tc-fc)==2 and tr==fr)):
+            dr = (tr - fr) // 2 if tr != fr else 0
+            dc = (tc - fc) // 2 if tc != fc else 0
+            side = "k" if (dr, dc) == _CASTLE["k"] else "q"
+            rook_pos = self.castling[piece.color]["rook_k" if side == "k" else "rook_q"]
+            if rook_pos and self.grid[rook_pos[0]][rook_pos[1]]:
+                rook_piece = self.grid[rook_pos[0]][rook_pos[1]]
+                rook = (rook_piece, rook_pos, (fr + dr, fc + dc), rook_piece.has_moved)  # type: ignore[union-attr]
+        undo = Undo(
+            fr, fc, tr, tc, piece, self.grid[tr][tc],
+            (piece.has_moved, piece.can_castle_kingside, piece.can_castle_queenside),
+            rook,
+            tuple(pos for color in ("w", "b") for pos in self.castling[color].values()),
+            self.key, self.turn, rotate,
+            self.scores,
+        )
+        self._move(fr, fc, tr, tc, promotion)
+        if rotate:
+            self.rotate_board()
+        return undo
+
+    def unmake_move(self, undo: Undo) -> None:
+        """Restore the position exactly as it was before the make_move that returned undo.
+        Attack maps are updated back for the squares the move changed, as make_move did."""
+        if undo.rotated:
+            self.key ^= ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_ROTATION[(self.rotation - 1) % 4]
+            self.rotation = (self.rotation - 1) % 4
+            self._update_pawn_attacks()
+        piece, captured = undo.piece, undo.captured
+        self.grid[undo.tr][undo.tc] = captured
+        self.grid[undo.fr][undo.fc] = piece
+        changed = [(undo.fr, undo.fc), (undo.tr, undo.tc)]
+        piece.has_moved, piece.can_castle_kingside, piece.can_castle_queenside = undo.flags
+        if piece.type == "K":
+            self.kings[piece.color] = (undo.fr, undo.fc)
+        if captured and captured.type == "K":
+            self.kings[captured.color] = (undo.tr, undo.tc)
+        if undo.rook:
+            rook, (rr, rc), (tr, tc), rook.has_moved = undo.rook
+            self.grid[tr][tc] = None
+            self.grid[rr][rc] = rook
+            changed += [(rr, rc), (tr, tc)]
+        self._update_attacks(changed)
+        self.scores = undo.scores
+        saved = iter(undo.castling)
+        for color in ("w", "b"):
+            for name in self.castling[color]:
+                self.castling[color][name] = next(saved)
+        self.key = undo.key
+        self.turn = undo.turn
 
     def _is_promotion_square(self, tr: int, tc: int, color: str) -> bool:
         """Check if (tr,tc) is the promotion rank for color, given current board rotation."""
-        r = self.rotation
-        if color == "w":
-            return (r == 0 and tr == 0) or (r == 1 and tc == 7) or (r == 2 and tr == 7) or (r == 3 and tc == 0)
-        else:
-            return (r == 0 and tr == 7) or (r == 1 and tc == 0) or (r == 2 and tr == 0) or (r == 3 and tc == 7)
+        return bool(PROMOTION_MASK[(self.rotation, color)] >> (tr * 8 + tc) & 1)
 
     def rotate_board(self) -> None:
-        new_grid: list[list[Optional[ChessPiece]]] = [[None] * 8 for _ in range(8)]
-        for r in range(8):
-            for c in range(8):
-                new_grid[c][7 - r] = self.grid[r][c]
-        self.grid = new_grid
+        self.key ^= ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_ROTATION[(self.rotation + 1) % 4]
         self.rotation = (self.rotation + 1) % 4
-        for color in ("w", "b"):
-            kr, kc = self.castling[color]["king"]  # type: ignore
-            self.castling[color]["king"] = (kc, 7 - kr)
-            if self.castling[color]["rook_k"] is not None:
-                rr, rc = self.castling[color]["rook_k"]  # type: ignore
-                self.castling[color]["rook_k"] = (rc, 7 - rr)
-            if self.castling[color]["rook_q"] is not None:
-                rr, rc = self.castling[color]["rook_q"]  # type: ignore
-                self.castling[color]["rook_q"] = (rc, 7 - rr)
+        self._update_pawn_attacks()
+
+    def rotated(self) -> "Board":
+        """A copy one rotation further on, for judging the coming position without
+        touching this board. It shares the pieces, so it must not be moved on."""
+        board = Board.__new__(Board)
+        board.grid = [row[:] for row in self.grid]
+        board.castling = self.castling
+        board.turn = self.turn
+        board.rotation = (self.rotation + 1) % 4
+        board.key = self.key ^ ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_ROTATION[board.rotation]
+        board.kings = dict(self.kings)
+        board.attacks = {color: [row[:] for row in counts] for color, counts in self.attacks.items()}
+        board._attack_sets = [row[:] for row in self._attack_sets]
+        board._update_pawn_attacks()
+        return board
 
     def is_checkmate(self, color: str) -> bool:
         if not self.is_in_check(color):
             return False
-        for r in range(8):
-            for c in range(8):
-                p = self.grid[r][c]
-                if p and p.color == color and self.get_legal_moves(r, c):
-                    return False
-        return True
+        return not self._gen_legal(color)
 
     def find_piece(self, piece_type: str, color: str) -> Optional[tuple[int, int]]:
         """Find first piece of given type and color. Returns (r, c) or None."""
+        pos = self._find(piece_type, color)
+        return None if pos is None else self.to_view(*pos)
+
+    def _find(self, piece_type: str, color: str) -> Optional[tuple[int, int]]:
+        """find_piece in grid coordinates."""
         for r in range(8):
             for c in range(8):
                 p = self.grid[r][c]
                 if p and p.type == piece_type and p.color == color:
                     return (r, c)
         return None
+
+
+def position_key(board: Board, moves_this_round: int) -> int:
+    """Board.key, telling apart the ply before a rotation: the same board there plays differently."""
+    return board.key ^ ZOBRIST_PENDING if moves_this_round == 1 else board.key
+
+
+def setup(moves: str, board: Optional[Board] = None) -> tuple[Board, int]:
+    """Replay space-separated moves on board (a new Board by default) from the start;
+    returns (board, moves_this_round)."""
+    if board is None:
+        board = Board()
+    mtr = 0
+    for text in moves.split():
+        fr, fc, tr, tc, promo = parse_move(text)
+        mtr += 1
+        board.make_move(fr, fc, tr, tc, promo, rotate=mtr == 2)
+        mtr %= 2
+    return board, mtr
+
+
+# ── GAME TERMINATION ──────────────────────────────────────────────────────────
+CHECKMATE, STALEMATE, REPETITION, FIFTY_MOVES, INSUFFICIENT_MATERIAL = (
+    "checkmate", "stalemate", "threefold repetition", "fifty-move rule", "insufficient material")
+FIFTY_MOVE_PLIES = 100
+
+
+class Termination:
+    """End-of-game detection for one game on one Board, judged once per move.
+
+    Drive it with move() instead of Board.move, then call update() before any
+    pending rotation is applied. Checkmate is judged there, as main.apply_move
+    always did; everything else on the position the next player actually moves
+    in, after the rotation (on Board.rotated(), so a board another thread is
+    drawing never turns under it): no legal moves is checkmate when in check,
+    else stalemate. Positions are counted by Zobrist key (plus whether a rotation
+    is one ply away), so repetition is a dict lookup. A pawn's forward
+    direction turns with the board, so a pawn can walk back to a square it
+    left and a pawn push does not rule out a repetition; only captures and
+    promotions can never be undone, and only they drop the history and
+    restart the fifty-move count.
+    """
+
+    def __init__(self, board: Board, moves_this_round: int = 0):
+        self.history: dict[int, int] = {}
+        self.quiet_plies = 0            # plies since the last capture or promotion
+        self.reason: Optional[str] = None
+        self.winner: Optional[str] = None  # color, for checkmate
+        self.legal: list[tuple[int, int, int, int]] = []  # side to move's, on screen once any rotation is applied
+        self.legal_key = 0  # Board.key of the position legal belongs to
+        self._record(board, moves_this_round)
+        self._judge(board)
+
+    @property
+    def over(self) -> bool:
+        return self.reason is not None
+
+    def _record(self, board: Board, moves_this_round: int) -> int:
+        key = position_key(board, moves_this_round)
+        self.history[key] = count = self.history.get(key, 0) + 1
+        return count
+
+    def move(self, board: Board, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> None:
+        """Board.move, keeping the fifty-move count."""
+        piece = board.get(fr, fc)
+        if board.get(tr, tc) or (piece and piece.type == "P" and board._is_promotion_square(tr, tc, piece.color)):
+            self.quiet_plies = 0
+            self.history.clear()
+        else:
+            self.quiet_plies += 1
+        board.move(fr, fc, tr, tc, promotion)
+
+    def update(self, board: Board, moves_this_round: int, rotate: bool) -> Optional[str]:
+        """Judge the position after a move; rotate says a rotation is due but not yet applied.
+
+        Returns and keeps the reason the game ended, or None while it goes on.
+        """
+        color = board.turn
+        if board.is_checkmate(color):
+            self.reason, self.winner, self.legal = CHECKMATE, "b" if color == "w" else "w", []
+            return self.reason
+        if rotate:
+            board = board.rotated()
+        repeats = self._record(board, moves_this_round)
+        self._judge(board)
+        if not self.over:
+            if repeats >= 3:
+                self.reason = REPETITION
+            elif self.quiet_plies >= FIFTY_MOVE_PLIES:
+                self.reason = FIFTY_MOVES
+            elif self._insufficient_material(board):
+                self.reason = INSUFFICIENT_MATERIAL
+        if self.over:
+            self.legal = []
+        return self.reason
+
+    def _judge(self, board: Board) -> None:
+        self.legal = board.legal_moves(board.turn)
+        self.legal_key = board.key
+        if not self.legal:
+            if board.is_in_check(board.turn):
+                self.reason, self.winner = CHECKMATE, "b" if board.turn == "w" else "w"
+            else:
+                self.reason = STALEMATE
+
+    @staticmethod
+    def _insufficient_material(board: Board) -> bool:
+        """Kings alone, plus at most one minor piece, or bishops all on one square color."""
+        minors = []
+        for r, row in enumerate(board.grid):
+            for c, p in enumerate(row):
+                if p and p.type != "K":
+                    if p.type not in ("N", "B"):
+                        return False
+                    minors.append((p.type, (r + c) & 1))
+        return len(minors) <= 1 or all(t == "B" for t, _ in minors) and len({sq for _, sq in minors}) == 1
+
+
+# ── LEGAL MOVE CACHE ──────────────────────────────────────────────────────────
+
+class MoveCache:
+    """Bounded LRU of legal moves per position, keyed by Board.key.
+
+    A key names a whole position (grid, rotation, side to move, castling), so
+    entries never go stale: Board.move and rotate_board change the key, and
+    with it which entry a lookup reaches. Each entry maps a square to its
+    targets (on screen, as get_legal_moves returns them) and may be complete
+    for one color, when filled from a full move list. Safe to fill from
+    another thread.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self.hits = self.misses = 0
+        self._entries: OrderedDict[int, tuple[Optional[str], dict[tuple[int, int], list[tuple[int, int]]]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, key: int, color: str, moves: list[tuple[int, int, int, int]]) -> None:
+        """Store every legal (fr, fc, tr, tc) of color in the position with Board.key key."""
+        targets: dict[tuple[int, int], list[tuple[int, int]]] = {}
+        for fr, fc, tr, tc in moves:
+            targets.setdefault((fr, fc), []).append((tr, tc))
+        self._store(key, color, targets)
+
+    def _store(self, key: int, color: Optional[str], targets: dict) -> None:
+        with self._lock:
+            self._entries[key] = (color, targets)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get_legal_moves(self, board: Board, r: int, c: int) -> list[tuple[int, int]]:
+        """board.get_legal_moves(r, c), from the cache when the position has been seen."""
+        key = board.key
+        piece = board.get(r, c)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                color, targets = entry
+                if (r, c) in targets or (color is not None and (piece is None or piece.color == color)):
+                    self.hits += 1
+                    return targets.get((r, c), [])
+            self.misses += 1
+        moves = board.get_legal_moves(r, c)
+        if entry is None:
+            self._store(key, None, {(r, c): moves})
+        else:
+            with self._lock:
+                entry[1][(r, c)] = moves
+        return moves
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
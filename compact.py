@@ -0,0 +1,438 @@
+"""
+Compact TwistedChess board: a 64-byte bytearray of small-int piece codes.
+
+Same public API as classes.Board, without a ChessPiece per square. Piece
+numbers (for ChessPiece.id) and has_moved live in a parallel bytearray,
+castling squares in a 6-byte bytearray, and the instance uses __slots__,
+so thousands of live games or search nodes stay cheap. Keys match
+Board.key for the same position.
+"""
+from typing import NamedTuple, Optional
+
+from classes import (
+    CASTLE_VECTORS, PROMOTION_MASK, ZOBRIST_CASTLING, ZOBRIST_PIECES, ZOBRIST_ROTATION, ZOBRIST_TURN, _CANONICAL,
+    _VIEW, Board, ChessPiece,
+)
+
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+BLACK = 8  # color bit: code = type | BLACK for black pieces
+TYPE_CHARS = " PNBRQK"
+CODE_OF = {ch: i for i, ch in enumerate(TYPE_CHARS) if ch != " "}
+NONE_SQ = 255
+
+# meta byte per square: low nibble piece number (15 = None), bit 4 has_moved
+_NO_NUMBER = 15
+_MOVED = 16
+
+# castling slots in the 6-byte table
+_CASTLE_SLOTS = (("w", "king"), ("w", "rook_k"), ("w", "rook_q"), ("b", "king"), ("b", "rook_k"), ("b", "rook_q"))
+
+
+def _color_bit(color: str) -> int:
+    return BLACK if color == "b" else 0
+
+
+def _targets(offsets) -> list[tuple[int, ...]]:
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        table.append(tuple((r + dr) * 8 + c + dc for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8))
+    return table
+
+KNIGHT_TARGETS = _targets(((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)))
+KING_TARGETS = _targets([(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc])
+# PAWN_CAPTURES[color_bit][sq]: squares a pawn on sq captures on
+PAWN_CAPTURES = {0: _targets(((-1, -1), (-1, 1))), BLACK: _targets(((1, -1), (1, 1)))}
+# PAWN_ATTACKERS[color_bit][sq]: squares a pawn of that color attacks sq from
+PAWN_ATTACKERS = {0: _targets(((1, -1), (1, 1))), BLACK: _targets(((-1, -1), (-1, 1)))}
+
+
+def _rays(dirs) -> list[tuple[tuple[int, ...], ...]]:
+    """_rays(dirs)[sq]: for each direction, the squares from sq outward to the edge."""
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        table.append(tuple(
+            tuple((r + k * dr) * 8 + c + k * dc for k in range(1, 8) if 0 <= r + k * dr < 8 and 0 <= c + k * dc < 8)
+            for dr, dc in dirs
+        ))
+    return table
+
+ORTHO_RAYS = _rays(((-1, 0), (1, 0), (0, -1), (0, 1)))
+DIAG_RAYS = _rays(((-1, -1), (-1, 1), (1, -1), (1, 1)))
+# rotate_board: new[c][7 - r] = old[r][c], i.e. new square i takes old square _ROT_SRC[i]
+_ROT_SRC = [(7 - (i % 8)) * 8 + i // 8 for i in range(64)]
+
+
+class CompactUndo(NamedTuple):
+    frm: int
+    to: int
+    code: int
+    meta: int
+    captured: int
+    captured_meta: int
+    rook: Optional[tuple[int, int, int]]  # castling rook: from, to, meta
+    castling: bytes
+    flags: int
+    key: int
+    turn: str
+    rotated: bool
+
+
+class CompactBoard:
+    __slots__ = ("cells", "meta", "castle_sq", "flags", "rotation", "turn", "key")
+
+    def __init__(self):
+        self.cells = bytearray(64)
+        self.meta = bytearray([_NO_NUMBER]) * 64
+        self.rotation = 0
+        self.turn = "w"
+        # king flags: bit 0/1 white kingside/queenside, bit 2/3 black
+        self.flags = 0b1111
+        self.castle_sq = bytearray([60, 63, 56, 4, 7, 0])
+        back = "RNBQKBNR"
+        for col, t in enumerate(back):
+            num = 0 if t in "RNB" and col < 4 else (1 if t in "RNB" else _NO_NUMBER)
+            self.cells[col] = CODE_OF[t] | BLACK
+            self.cells[56 + col] = CODE_OF[t]
+            self.meta[col] = self.meta[56 + col] = num
+            self.cells[8 + col] = PAWN | BLACK
+            self.cells[48 + col] = PAWN
+            self.meta[8 + col] = self.meta[48 + col] = col
+        self.key = self.compute_key()
+
+    @classmethod
+    def from_board(cls, board: Board) -> "CompactBoard":
+        cb = cls()
+        cb.flags = 0
+        for r in range(8):
+            for c in range(8):
+                p = board.get(r, c)
+                sq = r * 8 + c
+                cb.cells[sq] = CODE_OF[p.type] | _color_bit(p.color) if p else EMPTY
+                cb.meta[sq] = ((_NO_NUMBER if p.number is None else p.number) | (_MOVED if p.has_moved else 0)) if p else _NO_NUMBER
+                if p and p.type == "K":
+                    shift = 2 if p.color == "b" else 0
+                    cb.flags |= (int(p.can_castle_kingside) | int(p.can_castle_queenside) << 1) << shift
+        for i, (color, name) in enumerate(_CASTLE_SLOTS):
+            pos = board.castling[color][name]  # grid frame
+            cb.castle_sq[i] = NONE_SQ if pos is None else _VIEW[board.rotation][pos[0] * 8 + pos[1]]
+        cb.rotation = board.rotation
+        cb.turn = board.turn
+        cb.key = cb.compute_key()
+        return cb
+
+    @property
+    def castling(self) -> dict[str, dict[str, Optional[tuple[int, int]]]]:
+        """Board.castling-shaped copy of the castling table."""
+        out: dict[str, dict[str, Optional[tuple[int, int]]]] = {"w": {}, "b": {}}
+        for (color, name), sq in zip(_CASTLE_SLOTS, self.castle_sq):
+            out[color][name] = None if sq == NONE_SQ else divmod(sq, 8)
+        return out
+
+    # ── HASHING ───────────────────────────────────────────────────────────────
+    def _zkey(self, sq: int, code: int) -> int:
+        return ZOBRIST_PIECES[TYPE_CHARS[code & 7] + ("b" if code & BLACK else "w")][_CANONICAL[self.rotation][sq]]
+
+    def _castle_rights(self) -> int:
+        rights = 0
+        for i, bit in enumerate((0, BLACK)):
+            ksq = self.castle_sq[3 * i]
+            if ksq == NONE_SQ or self.cells[ksq] != KING | bit:
+                continue
+            if self.flags >> (2 * i) & 1 and self.castle_sq[3 * i + 1] != NONE_SQ:
+                rights |= 1 << (2 * i)
+            if self.flags >> (2 * i) & 2 and self.castle_sq[3 * i + 2] != NONE_SQ:
+                rights |= 2 << (2 * i)
+        return rights
+
+    def compute_key(self) -> int:
+        key = ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_CASTLING[self._castle_rights()]
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        for sq, code in enumerate(self.cells):
+            if code:
+                key ^= self._zkey(sq, code)
+        return key
+
+    # ── QUERIES ───────────────────────────────────────────────────────────────
+    def get(self, r: int, c: int) -> Optional[ChessPiece]:
+        if not (0 <= r < 8 and 0 <= c < 8):
+            return None
+        code = self.cells[r * 8 + c]
+        if not code:
+            return None
+        meta = self.meta[r * 8 + c]
+        color = "b" if code & BLACK else "w"
+        piece = ChessPiece(TYPE_CHARS[code & 7], color, None if meta & 15 == _NO_NUMBER else meta & 15)
+        piece.has_moved = bool(meta & _MOVED)
+        if code & 7 == KING:
+            shift = 2 if code & BLACK else 0
+            piece.can_castle_kingside = bool(self.flags >> shift & 1)
+            piece.can_castle_queenside = bool(self.flags >> shift & 2)
+        return piece
+
+    def _attacked(self, sq: int, by: int) -> bool:
+        """Is sq attacked by the side whose color bit is by?"""
+        cells = self.cells
+        pawn, knight, king = PAWN | by, KNIGHT | by, KING | by
+        rook, bishop, queen = ROOK | by, BISHOP | by, QUEEN | by
+        for s in PAWN_ATTACKERS[by][sq]:
+            if cells[s] == pawn:
+                return True
+        for s in KNIGHT_TARGETS[sq]:
+            if cells[s] == knight:
+                return True
+        for s in KING_TARGETS[sq]:
+            if cells[s] == king:
+                return True
+        for ray in ORTHO_RAYS[sq]:
+            for s in ray:
+                code = cells[s]
+                if code:
+                    if code == rook or code == queen:
+                        return True
+                    break
+        for ray in DIAG_RAYS[sq]:
+            for s in ray:
+                code = cells[s]
+                if code:
+                    if code == bishop or code == queen:
+                        return True
+                    break
+        return False
+
+    def _is_square_attacked(self, r: int, c: int, by_color: str) -> bool:
+        return self._attacked(r * 8 + c, _color_bit(by_color))
+
+    def _king_sq(self, bit: int) -> int:
+        return self.cells.find(KING | bit)
+
+    def is_in_check(self, color: str) -> bool:
+        bit = _color_bit(color)
+        ksq = self._king_sq(bit)
+        return ksq >= 0 and self._attacked(ksq, bit ^ BLACK)
+
+    def find_piece(self, piece_type: str, color: str) -> Optional[tuple[int, int]]:
+        """Find first piece of given type and color. Returns (r, c) or None."""
+        sq = self.cells.find(CODE_OF[piece_type] | _color_bit(color))
+        return None if sq < 0 else divmod(sq, 8)
+
+    # ── MOVE GENERATION ───────────────────────────────────────────────────────
+    def _pseudo(self, sq: int) -> list[int]:
+        cells = self.cells
+        code = cells[sq]
+        bit = code & BLACK
+        kind = code & 7
+        out: list[int] = []
+        if kind == PAWN:
+            step = 8 if bit else -8
+            one = sq + step
+            if 0 <= one < 64 and not cells[one]:
+                out.append(one)
+                if sq // 8 == (1 if bit else 6) and not cells[one + step]:
+                    out.append(one + step)
+            for s in PAWN_CAPTURES[bit][sq]:
+                if cells[s] and cells[s] & BLACK != bit:
+                    out.append(s)
+            return out
+        if kind == KNIGHT or kind == KING:
+            for s in (KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS)[sq]:
+                if not cells[s] or cells[s] & BLACK != bit:
+                    out.append(s)
+            return out
+        rays = ORTHO_RAYS[sq] if kind == ROOK else DIAG_RAYS[sq] if kind == BISHOP else ORTHO_RAYS[sq] + DIAG_RAYS[sq]
+        for ray in rays:
+            for s in ray:
+                if not cells[s]:
+                    out.append(s)
+                else:
+                    if cells[s] & BLACK != bit:
+                        out.append(s)
+                    break
+        return out
+
+    def _castles(self, sq: int) -> list[tuple[int, int, int]]:
+        """(king_to, rook_from, rook_to) for each castling option of the king on sq."""
+        bit = self.cells[sq] & BLACK
+        i = 1 if bit else 0
+        if self.castle_sq[3 * i] != sq:
+            return []
+        r, c = divmod(sq, 8)
+        out = []
+        for side, (dr, dc) in CASTLE_VECTORS[self.rotation].items():
+            slot, flag = (1, 1) if side == "k" else (2, 2)
+            rook_sq = self.castle_sq[3 * i + slot]
+            if not self.flags >> (2 * i) & flag or rook_sq == NONE_SQ:
+                continue
+            if not (0 <= r + 2 * dr < 8 and 0 <= c + 2 * dc < 8):
+                continue
+            nr, nc = r + dr, c + dc
+            clear = True
+            while 0 <= nr < 8 and 0 <= nc < 8 and nr * 8 + nc != rook_sq:
+                if self.cells[nr * 8 + nc]:
+                    clear = False
+                    break
+                nr, nc = nr + dr, nc + dc
+            if not clear or nr * 8 + nc != rook_sq:
+                continue
+            sq1, sq2 = sq + dr * 8 + dc, sq + 2 * (dr * 8 + dc)
+            opp = bit ^ BLACK
+            if self._attacked(sq, opp) or self._attacked(sq1, opp) or self._attacked(sq2, opp):
+                continue
+            out.append((sq2, rook_sq, sq1))
+        return out
+
+    def _safe(self, frm: int, to: int, rook: Optional[tuple[int, int]] = None) -> bool:
+        """Trial-apply on the byte array and test the mover's king."""
+        cells = self.cells
+        code, captured = cells[frm], cells[to]
+        bit = code & BLACK
+        cells[to], cells[frm] = code, EMPTY
+        if rook:
+            cells[rook[1]], cells[rook[0]] = cells[rook[0]], EMPTY
+        ksq = self._king_sq(bit)
+        safe = ksq < 0 or not self._attacked(ksq, bit ^ BLACK)
+        if rook:
+            cells[rook[0]], cells[rook[1]] = cells[rook[1]], EMPTY
+        cells[frm], cells[to] = code, captured
+        return safe
+
+    def _legal_from(self, sq: int) -> list[int]:
+        moves = [to for to in self._pseudo(sq) if self._safe(sq, to)]
+        if self.cells[sq] & 7 == KING:
+            moves.extend(to for to, rfrom, rto in self._castles(sq) if self._safe(sq, to, (rfrom, rto)))
+        return moves
+
+    def get_legal_moves(self, r: int, c: int) -> list[tuple[int, int]]:
+        """Returns list of (tr, tc) that are legal (don't leave own king in check)."""
+        if not (0 <= r < 8 and 0 <= c < 8) or not self.cells[r * 8 + c]:
+            return []
+        return [divmod(to, 8) for to in self._legal_from(r * 8 + c)]
+
+    def legal_moves(self, color: str) -> list[tuple[int, int, int, int]]:
+        """All legal (fr, fc, tr, tc) for color."""
+        bit = _color_bit(color)
+        out = []
+        for sq, code in enumerate(self.cells):
+            if code and code & BLACK == bit:
+                fr, fc = divmod(sq, 8)
+                out.extend((fr, fc, to >> 3, to & 7) for to in self._legal_from(sq))
+        return out
+
+    def is_checkmate(self, color: str) -> bool:
+        if not self.is_in_check(color):
+            return False
+        bit = _color_bit(color)
+        return not any(code and code & BLACK == bit and self._legal_from(sq) for sq, code in enumerate(self.cells))
+
+    def _is_promotion_square(self, tr: int, tc: int, color: str) -> bool:
+        """Check if (tr,tc) is the promotion rank for color, given current board rotation."""
+        return bool(PROMOTION_MASK[(self.rotation, color)] >> (tr * 8 + tc) & 1)
+
+    # ── MUTATION ──────────────────────────────────────────────────────────────
+    def move(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> None:
+        if not (0 <= fr < 8 and 0 <= fc < 8 and 0 <= tr < 8 and 0 <= tc < 8):
+            return
+        self._move(fr * 8 + fc, tr * 8 + tc, promotion)
+
+    def _move(self, frm: int, to: int, promotion: Optional[str]) -> Optional[tuple[int, int, int]]:
+        """Board.move on square indices; returns the castling rook (from, to, meta) if one moved."""
+        cells, meta, csq = self.cells, self.meta, self.castle_sq
+        code = cells[frm]
+        if not code:
+            return None
+        bit = code & BLACK
+        i = 1 if bit else 0
+        kind = code & 7
+        key = self.key ^ ZOBRIST_CASTLING[self._castle_rights()] ^ self._zkey(frm, code)
+        fr, fc = divmod(frm, 8)
+        tr, tc = divmod(to, 8)
+        rook_moved = None
+        if kind == KING and ((abs(tr-fr)==2 and tc==fc) or (abs(tc-fc)==2 and tr==fr)):
+            dr = (tr - fr) // 2 if tr != fr else 0
+            dc = (tc - fc) // 2 if tc != fc else 0
+            slot = 1 if (dr, dc) == CASTLE_VECTORS[self.rotation]["k"] else 2
+            rook_sq = csq[3 * i + slot]
+            if rook_sq != NONE_SQ and cells[rook_sq]:
+                mid = frm + dr * 8 + dc
+                rook_moved = (rook_sq, mid, meta[rook_sq])
+                key ^= self._zkey(rook_sq, cells[rook_sq]) ^ self._zkey(mid, cells[rook_sq])
+                cells[mid], meta[mid] = cells[rook_sq], meta[rook_sq] | _MOVED
+                cells[rook_sq], meta[rook_sq] = EMPTY, _NO_NUMBER
+            csq[3 * i + slot] = NONE_SQ
+
+        if kind == KING:
+            csq[3 * i] = to
+            self.flags &= ~(3 << (2 * i))
+        if kind == ROOK:
+            for slot in (1, 2):
+                if csq[3 * i + slot] == frm:
+                    csq[3 * i + slot] = NONE_SQ
+
+        captured = cells[to]
+        if captured:
+            key ^= self._zkey(to, captured)
+            if captured & 7 == ROOK:
+                j = 1 if captured & BLACK else 0
+                for slot in (1, 2):
+                    if csq[3 * j + slot] == to:
+                        csq[3 * j + slot] = NONE_SQ
+
+        cells[to], meta[to] = code, meta[frm] | _MOVED
+        cells[frm], meta[frm] = EMPTY, _NO_NUMBER
+        if kind == PAWN and self._is_promotion_square(tr, tc, "b" if bit else "w"):
+            promo = (promotion or "Q").upper()
+            cells[to] = CODE_OF[promo if promo in ("Q", "R", "N", "B") else "Q"] | bit
+            meta[to] = _NO_NUMBER
+
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        self.turn = "w" if bit else "b"
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+        self.key = key ^ self._zkey(to, cells[to]) ^ ZOBRIST_CASTLING[self._castle_rights()]
+        return rook_moved
+
+    def make_move(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None,
+                  rotate: bool = False) -> Optional[CompactUndo]:
+        """move (then rotate_board if rotate) that unmake_move can reverse. None if nothing moved."""
+        if not (0 <= fr < 8 and 0 <= fc < 8 and 0 <= tr < 8 and 0 <= tc < 8):
+            return None
+        frm, to = fr * 8 + fc, tr * 8 + tc
+        if not self.cells[frm]:
+            return None
+        before = (self.cells[frm], self.meta[frm], self.cells[to], self.meta[to],
+                  bytes(self.castle_sq), self.flags, self.key, self.turn)
+        rook = self._move(frm, to, promotion)
+        if rotate:
+            self.rotate_board()
+        code, meta, captured, captured_meta, castling, flags, key, turn = before
+        return CompactUndo(frm, to, code, meta, captured, captured_meta, rook, castling, flags, key, turn, rotate)
+
+    def unmake_move(self, undo: CompactUndo) -> None:
+        if undo.rotated:
+            self._unrotate_board()
+        cells, meta = self.cells, self.meta
+        cells[undo.to], meta[undo.to] = undo.captured, undo.captured_meta
+        cells[undo.frm], meta[undo.frm] = undo.code, undo.meta
+        if undo.rook:
+            rfrom, rto, rmeta = undo.rook
+            cells[rfrom], meta[rfrom] = cells[rto], rmeta
+            cells[rto], meta[rto] = EMPTY, _NO_NUMBER
+        self.castle_sq[:] = undo.castling
+        self.flags, self.key, self.turn = undo.flags, undo.key, undo.turn
+
+    def rotate_board(self) -> None:
+        self.cells = bytearray(map(self.cells.__getitem__, _ROT_SRC))
+        self.meta = bytearray(map(self.meta.__getitem__, _ROT_SRC))
+        self.key ^= ZOBRIST_ROTATION[self.rotation] ^ ZOBRIST_ROTATION[(self.rotation + 1) % 4]
+        self.rotation = (self.rotation + 1) % 4
+        for i, sq in enumerate(self.castle_sq):
+            if sq != NONE_SQ:
+                r, c = divmod(sq, 8)
+                self.castle_sq[i] = c * 8 + 7 - r
+
+    def _unrotate_board(self) -> None:
+        for _ in range(3):
+            self.rotate_board()
@@ -0,0 +1,296 @@
+"""
+Headless TwistedChess search.
+
+Iterative-deepening alpha-beta (negamax) with quiescence and a size-bounded
+transposition table. The search plays by the client's rules: Board.make_move
+rotates after every second ply, so promotion squares and pawn directions
+change mid-tree; the table key folds in whether a rotation is pending, since
+the same Board.key can be reached one or two plies before a rotation.
+Positions are scored from Board.scores (material plus rotation-aware
+piece-square tables, kept up to date by every move), so evaluation is O(1).
+
+Run: python engine.py [--moves "6444 1434"] [--time 2000] [--depth N]
+"""
+import argparse
+import time
+from typing import NamedTuple, Optional
+
+from classes import _VIEW, PIECE_VALUES, PROMOTION_MASK, Board, Undo, format_move, position_key, setup
+
+VALUES = PIECE_VALUES
+MATE = 100_000
+INF = MATE + 1
+MAX_PLY = 64
+# Promotions worth searching; R and B never beat Q here without stalemate tricks
+SEARCH_PROMOTIONS = ("Q", "N")
+
+# TT entries: (key, depth, flag, score, move, generation)
+EXACT, LOWER, UPPER = 0, 1, 2
+
+Move = tuple[int, int, int, int, Optional[str]]
+
+
+class SearchResult(NamedTuple):
+    move: Optional[Move]
+    score: int          # centipawns for the side to move; |score| > MATE - MAX_PLY is a forced mate
+    depth: int          # last completed iteration
+    nodes: int
+    seconds: float
+
+    @property
+    def nps(self) -> float:
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+
+class TranspositionTable:
+    """Fixed-size, one entry per slot. An entry is replaced by a deeper search of
+    any position, or by anything once it is left over from an earlier search."""
+
+    def __init__(self, size_log2: int = 18):
+        self.mask = (1 << size_log2) - 1
+        self.slots: list[Optional[tuple[int, int, int, int, Optional[Move], int]]] = [None] * (self.mask + 1)
+        self.generation = 0
+
+    def get(self, key: int) -> Optional[tuple[int, int, int, int, Optional[Move], int]]:
+        entry = self.slots[key & self.mask]
+        return entry if entry is not None and entry[0] == key else None
+
+    def put(self, key: int, depth: int, flag: int, score: int, move: Optional[Move]) -> None:
+        i = key & self.mask
+        old = self.slots[i]
+        if old is None or old[5] != self.generation or depth >= old[1] or old[0] == key:
+            self.slots[i] = (key, depth, flag, score, move, self.generation)
+
+    def new_search(self) -> None:
+        self.generation += 1
+
+    def clear(self) -> None:
+        self.slots = [None] * (self.mask + 1)
+
+
+class _Timeout(Exception):
+    pass
+
+
+def evaluate(board: Board) -> int:
+    """Board.score (kept incrementally) from the side to move's point of view."""
+    score = board.score
+    return score if board.turn == "w" else -score
+
+
+class Searcher:
+    """Keeps the transposition table (and its statistics) between searches."""
+
+    def __init__(self, tt_size_log2: int = 18):
+        self.tt = TranspositionTable(tt_size_log2)
+        self.nodes = 0
+        self.killers: list[list[Optional[Move]]] = [[None, None] for _ in range(MAX_PLY)]
+        self.history: dict[Move, int] = {}
+        self.deadline = 0.0
+        self.root_best: Optional[Move] = None
+
+    def _moves(self, board: Board) -> list[Move]:
+        """Legal moves for board.turn with promotion choices attached."""
+        color = board.turn
+        grid = board.grid
+        view = _VIEW[board.rotation]
+        promo_mask = PROMOTION_MASK[(board.rotation, color)]
+        out: list[Move] = []
+        # grid-frame generator, converted here once rather than via board.get per move
+        for fr, fc, tr, tc in board._gen_legal(color):
+            frm, to = view[fr * 8 + fc], view[tr * 8 + tc]
+            if grid[fr][fc].type == "P" and promo_mask >> to & 1:  # type: ignore[union-attr]
+                out.extend((frm >> 3, frm & 7, to >> 3, to & 7, promo) for promo in SEARCH_PROMOTIONS)
+            else:
+                out.append((frm >> 3, frm & 7, to >> 3, to & 7, None))
+        return out
+
+    def _order(self, board: Board, moves: list[Move], tt_move: Optional[Move], ply: int) -> list[Move]:
+        killers = self.killers[ply] if ply < MAX_PLY else [None, None]
+
+        def score(m: Move) -> int:
+            if m == tt_move:
+                return 1 << 30
+            target = board.get(m[2], m[3])
+            if target is not None:  # MVV-LVA
+                return (1 << 20) + VALUES[target.type] * 16 - VALUES[board.get(m[0], m[1]).type] // 16  # type: ignore[union-attr]
+            if m[4]:
+                return (1 << 20) + VALUES[m[4]]
+            if m in killers:
+                return 1 << 19
+            return self.history.get(m, 0)
+
+        return sorted(moves, key=score, reverse=True)
+
+    def _check_time(self) -> None:
+        self.nodes += 1
+        if not self.nodes & 255 and time.perf_counter() > self.deadline:
+            raise _Timeout
+
+    def _make(self, board: Board, m: Move, rotate: bool) -> tuple[Undo, bool]:
+        """make_move, reporting whether the opponent is mated. Like main.apply_move,
+        mate is judged before the pending rotation is applied."""
+        undo = board.make_move(*m)
+        opp = board.turn
+        mated = board.is_in_check(opp) and not board.legal_moves(opp)
+        if rotate and not mated:
+            board.rotate_board()
+            undo = undo._replace(rotated=True)  # type: ignore[union-attr]
+        return undo, mated  # type: ignore[return-value]
+
+    def quiesce(self, board: Board, alpha: int, beta: int, mtr: int, ply: int) -> int:
+        self._check_time()
+        in_check = board.is_in_check(board.turn)
+        if not in_check:
+            # stand pat before generating anything; stalemate is not looked for here
+            stand = evaluate(board)
+            if stand >= beta:
+                return stand
+            alpha = max(alpha, stand)
+        moves = self._moves(board)
+        if not moves:
+            return -MATE + ply if in_check else alpha
+        if not in_check:
+            moves = [m for m in moves if m[4] in (None, "Q") and (m[4] or board.get(m[2], m[3]) is not None)]
+        rotate = mtr == 1
+        for m in self._order(board, moves, None, ply):
+            undo, mated = self._make(board, m, rotate)
+            try:
+                score = MATE - ply - 1 if mated else -self.quiesce(board, -beta, -alpha, 0 if rotate else 1, ply + 1)
+            finally:
+                board.unmake_move(undo)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def search(self, board: Board, depth: int, alpha: int, beta: int, mtr: int, ply: int) -> int:
+        if depth <= 0:
+            return self.quiesce(board, alpha, beta, mtr, ply)
+        self._check_time()
+        key = position_key(board, mtr)
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            _, e_depth, flag, score, tt_move, _ = entry
+            if ply and e_depth >= depth:
+                score = _from_tt(score, ply)
+                if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                    return score
+
+        in_check = board.is_in_check(board.turn)
+        moves = self._moves(board)
+        if not moves:
+            return -MATE + ply if in_check else 0
+        rotate = mtr == 1
+        nxt = 0 if rotate else 1
+        orig_alpha = alpha
+        best, best_move = -INF, None
+        for i, m in enumerate(self._order(board, moves, tt_move, ply)):
+            quiet = board.get(m[2], m[3]) is None and not m[4]
+            undo, mated = self._make(board, m, rotate)
+            try:
+                # principal variation search, with one ply less for late quiet moves
+                if mated:
+                    score = MATE - ply - 1
+                elif i == 0:
+                    score = -self.search(board, depth - 1, -beta, -alpha, nxt, ply + 1)
+                else:
+                    reduce = 1 if depth >= 3 and i >= 4 and quiet and not in_check else 0
+                    score = -self.search(board, depth - 1 - reduce, -alpha - 1, -alpha, nxt, ply + 1)
+                    if alpha < score < beta or (reduce and score > alpha):
+                        score = -self.search(board, depth - 1, -beta, -alpha, nxt, ply + 1)
+            finally:
+                board.unmake_move(undo)
+            if score > best:
+                best, best_move = score, m
+                if ply == 0:
+                    self.root_best = m
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if quiet and ply < MAX_PLY:
+                    if self.killers[ply][0] != m:
+                        self.killers[ply] = [m, self.killers[ply][0]]
+                    self.history[m] = self.history.get(m, 0) + depth * depth
+                break
+        flag = UPPER if best <= orig_alpha else LOWER if best >= beta else EXACT
+        self.tt.put(key, depth, flag, _to_tt(best, ply), best_move)
+        return best
+
+    def best_move(self, board: Board, time_ms: int, moves_this_round: int = 0,
+                  max_depth: int = MAX_PLY - 1, on_iteration=None) -> SearchResult:
+        """Search until time_ms runs out or max_depth completes. The board is left as it was."""
+        start = time.perf_counter()
+        self.deadline = start + time_ms / 1000
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.tt.new_search()
+        result = SearchResult(None, 0, 0, 0, 0.0)
+        root_moves = self._moves(board)
+        if not root_moves:
+            return result
+        result = SearchResult(root_moves[0], 0, 0, 0, 0.0)
+        for depth in range(1, max_depth + 1):
+            self.root_best = None
+            try:
+                score = self.search(board, depth, -INF, INF, moves_this_round, 0)
+            except _Timeout:
+                # every make_move is unmade on the way out, so the board is intact
+                break
+            result = SearchResult(self.root_best or result.move, score, depth, self.nodes, time.perf_counter() - start)
+            if on_iteration:
+                on_iteration(result)
+            if abs(score) > MATE - MAX_PLY:
+                break
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - start)
+
+
+def _to_tt(score: int, ply: int) -> int:
+    """Mate scores are stored relative to the node, not the root."""
+    if score > MATE - MAX_PLY:
+        return score + ply
+    if score < -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _from_tt(score: int, ply: int) -> int:
+    if score > MATE - MAX_PLY:
+        return score - ply
+    if score < -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+def best_move(board: Board, time_ms: int, moves_this_round: int = 0,
+              searcher: Optional[Searcher] = None) -> SearchResult:
+    """Best move (view coordinates, promotion or None) for board.turn within time_ms.
+
+    moves_this_round is 0 or 1, as in main.py. Pass a Searcher to keep the
+    transposition table across moves of one game.
+    """
+    return (searcher or Searcher()).best_move(board, time_ms, moves_this_round)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess engine")
+    ap.add_argument("--moves", default="", help='moves from the start, e.g. "6444 1434"')
+    ap.add_argument("--time", type=int, default=2000, help="milliseconds to think")
+    ap.add_argument("--depth", type=int, default=MAX_PLY - 1, help="stop after this many plies")
+    ap.add_argument("--tt", type=int, default=18, help="transposition table size as a power of two")
+    args = ap.parse_args()
+
+    board, mtr = setup(args.moves)
+
+    def report(r: SearchResult) -> None:
+        move = format_move(*r.move) if r.move else "-"
+        print(f"depth {r.depth:2}  score {r.score:6}  nodes {r.nodes:8}  {r.nps:9,.0f} nodes/sec  {move}")
+
+    result = Searcher(args.tt).best_move(board, args.time, mtr, args.depth, on_iteration=report)
+    print(f"bestmove {format_move(*result.move) if result.move else '(none)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Headless TwistedChess game flow.
+
+Game follows main.apply_move without pygame: the board rotates after every
+second ply, and classes.Termination judges each move once, checkmate on the
+position right after the move, before that rotation is applied, then
+stalemate, threefold repetition, the fifty-move rule and insufficient
+material. Moves use on-screen coordinates as sent over the wire.
+"""
+from typing import Optional
+
+from classes import CHECKMATE, Board, Termination, format_move
+
+WHITE_WINS, BLACK_WINS, DRAWN, ONGOING = "1-0", "0-1", "1/2-1/2", "*"
+PROMOTIONS = ("Q", "R", "N", "B")
+
+
+class Game:
+    def __init__(self, board: Optional[Board] = None, moves_this_round: int = 0):
+        self.board = board or Board()
+        self.moves_this_round = moves_this_round
+        self.moves: list[tuple[int, int, int, int, Optional[str]]] = []
+        self.termination = Termination(self.board, moves_this_round)
+        self.result = self._result()
+
+    @property
+    def over(self) -> bool:
+        return self.result != ONGOING
+
+    @property
+    def reason(self) -> Optional[str]:
+        """How the game ended (classes.CHECKMATE, STALEMATE, ...), None while it goes on."""
+        return self.termination.reason
+
+    def _result(self) -> str:
+        if self.termination.reason is None:
+            return ONGOING
+        if self.termination.reason == CHECKMATE:
+            return WHITE_WINS if self.termination.winner == "w" else BLACK_WINS
+        return DRAWN
+
+    def legal_moves(self) -> list[tuple[int, int, int, int]]:
+        """Legal (fr, fc, tr, tc) for the side to move; empty once the game is over."""
+        return self.termination.legal
+
+    def is_promotion(self, fr: int, fc: int, tr: int, tc: int) -> bool:
+        p = self.board.get(fr, fc)
+        return bool(p and p.type == "P" and self.board._is_promotion_square(tr, tc, p.color))
+
+    def play(self, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None, validate: bool = True) -> str:
+        """Play a move for the side to move and return the result so far.
+
+        With validate, raises ValueError for moves that are not legal here;
+        pass validate=False for moves taken from legal_moves().
+        """
+        board = self.board
+        if validate:
+            if self.over:
+                raise ValueError("game is over")
+            if (fr, fc, tr, tc) not in self.legal_moves():
+                raise ValueError(f"illegal move {format_move(fr, fc, tr, tc, promotion)}")
+            if promotion is not None and promotion.upper() not in PROMOTIONS:
+                raise ValueError(f"bad promotion {promotion!r}")
+        self.termination.move(board, fr, fc, tr, tc, promotion)
+        self.moves.append((fr, fc, tr, tc, promotion))
+        self.moves_this_round += 1
+        rotate = self.moves_this_round >= 2
+        if rotate:
+            self.moves_this_round = 0
+        self.termination.update(board, self.moves_this_round, rotate)
+        if rotate:
+            board.rotate_board()
+        self.result = self._result()
+        return self.result
+
+    def move_text(self) -> str:
+        """Space-separated moves, as classes.setup and engine.py --moves take them."""
+        return " ".join(format_move(*m) for m in self.moves)
@@ -6,10 +6,12 @@ import os
 import math
 import sys
 import classes
+import protocol
 
 # WebSocket server URL (wss:// for HTTPS, ws:// for localhost)
 # Set via env TWISTEDCHESS_SERVER or change default for Render deployment
 SERVER_URL = os.environ.get("TWISTEDCHESS_SERVER", "wss://twistedchess.onrender.com/ws")
+PROTOCOL = os.environ.get("TWISTEDCHESS_PROTOCOL", protocol.TOKEN)  # "text" for JSON moves
 
 pg.init()
 
@@ -62,11 +64,13 @@ btn_again = pg.Rect(820, 560, 160, 34)
 
 # ── STATE ─────────────────────────────────────────────────────────────────────
 board = classes.Board()
+termination = classes.Termination(board)
+move_cache = classes.MoveCache()
 moves_this_round = 0
 selected = None
 legal_moves: list[tuple[int, int]] = []
 last_move = None
-game_over = None  # None | "won" | "lost"
+game_over = None  # None | "won" | "lost" | "drawn"
 
 room_code = "".join(chr(random.randint(65, 90)) for _ in range(4))
 ws = None  # WebSocket connection
@@ -74,6 +78,8 @@ player_id = None
 my_color = "w"
 my_turn = False
 connected = False
+binary = False  # the server accepted protocol.TOKEN: moves go as binary frames
+send_seq = 0
 input_active = False
 code_input = ""
 status_msg = ""
@@ -84,10 +90,21 @@ rotation_anim = None  # { "start_rot", "start_ms" }  # animates 0..90 then we ca
 
 # ── NETWORKING ───────────────────────────────────────────────────────────────
 def apply_move(move_dict):
-    global my_color, moves_this_round, my_turn, last_move, game_over, board, selected, legal_moves, move_anim, rotation_anim
+    global my_color, moves_this_round, my_turn, last_move, game_over, board, termination, selected, legal_moves, move_anim, rotation_anim
+    if move_dict.get("resign"):
+        if not game_over:
+            game_over = "won"
+        return
+    if "result" in move_dict:  # an authoritative server's verdict; normally we reached it already
+        if not game_over:
+            result = move_dict["result"]
+            game_over = "drawn" if result == "1/2-1/2" else "won" if (result == "1-0") == (my_color == "w") else "lost"
+        return
     # check for reset signal
     if move_dict.get("promotion") == "RESET":
         board = classes.Board()
+        termination = classes.Termination(board)
+        cache_legal_moves()
         moves_this_round = 0
         selected = None
         legal_moves = []
@@ -106,23 +123,42 @@ def apply_move(move_dict):
     if not (0 <= fr < 8 and 0 <= fc < 8 and 0 <= tr < 8 and 0 <= tc < 8):
         return
     promo = move_dict.get("promotion")
-    board.move(fr, fc, tr, tc, promotion=promo)
-    last_move = (fr, fc, tr, tc)
+    termination.move(board, fr, fc, tr, tc, promotion=promo)
+    last_move = (*board.to_canonical(fr, fc), *board.to_canonical(tr, tc))  # grid frame: unaffected by rotation
     moves_this_round += 1
-    if moves_this_round >= 2:
+    rotate = moves_this_round >= 2
+    if rotate:
         moves_this_round = 0
         rotation_anim_start()
     my_turn = not my_turn
-    opp = "b" if my_color == "w" else "w" # type: ignore[attr-defined]
-    if board.is_checkmate(opp):
-        game_over = "won"
-    elif board.is_checkmate(my_color): # type: ignore[attr-defined]
-        game_over = "lost"
+    # judged once per move, before the animated rotation lands
+    if termination.update(board, moves_this_round, rotate):
+        if termination.reason != classes.CHECKMATE:
+            game_over = "drawn"
+        else:
+            game_over = "won" if termination.winner == my_color else "lost"
+    cache_legal_moves()
+
+def cache_legal_moves():
+    """Termination has just listed the next player's moves (after any pending rotation):
+    keep them, so selecting a piece is a cache hit. apply_move runs on the network
+    thread for the opponent's moves, so this costs the UI nothing."""
+    if not termination.over:
+        move_cache.put(termination.legal_key, board.turn, termination.legal)
 
 def send_move(from_pos, to_pos, promotion=None):
+    global send_seq
     if not connected or ws is None:
         return
     try:
+        if binary:
+            if promotion == "RESET":
+                frame = protocol.encode(protocol.RESET, send_seq)
+            else:
+                frame = protocol.encode_move(send_seq, *from_pos, *to_pos, promotion)
+            send_seq = (send_seq + 1) & 0xFFFF
+            ws.send_binary(frame)
+            return
         payload = {"from": list(from_pos), "to": list(to_pos)}
         if promotion:
             payload["promotion"] = promotion
@@ -130,6 +166,23 @@ def send_move(from_pos, to_pos, promotion=None):
     except Exception as e:
         print(f"Send error: {e}")
 
+def apply_frame(frame):
+    """A binary frame from the server, in apply_move's terms."""
+    try:
+        f = protocol.decode(frame)
+    except protocol.ProtocolError:
+        return
+    if f.kind == protocol.MOVE:
+        fr, fc, tr, tc, promo = f.move
+        apply_move({"from": [fr, fc], "to": [tr, tc], "promotion": promo})
+    elif f.kind == protocol.RESET:
+        apply_move({"promotion": "RESET"})
+    elif f.kind == protocol.RESIGN:
+        apply_move({"resign": True})
+    elif f.kind == protocol.RESULT:
+        result, reason = f.result
+        apply_move({"result": result, "reason": reason})
+
 def listen():
     global connected, status_msg
     while True:
@@ -137,6 +190,9 @@ def listen():
             msg = ws.recv() # type: ignore[attr-defined]
             if not msg:
                 break
+            if isinstance(msg, bytes):
+                apply_frame(msg)
+                continue
             line = msg.strip()
             if line:
                 try:
@@ -151,14 +207,20 @@ def listen():
     status_msg = "Disconnected"
 
 def _do_connect(code):
-    global player_id, my_color, connected, my_turn, status_msg, ws
+    global player_id, my_color, connected, my_turn, status_msg, ws, binary, send_seq
     conn = None
     try:
         import websocket
-        conn = websocket.create_connection(SERVER_URL)
+        # asked for on the URL, which older servers ignore, so the bare code names the
+        # same room on any server; frames are used only if the reply accepts them
+        url = SERVER_URL if PROTOCOL == "text" else f"{SERVER_URL}{'&' if '?' in SERVER_URL else '?'}protocol={PROTOCOL}"
+        conn = websocket.create_connection(url)
         conn.send(code)
         resp = conn.recv()
-        player_id = int(resp.strip())
+        index, _, token = resp.strip().partition(";")
+        player_id = int(index)
+        binary = token == protocol.TOKEN
+        send_seq = 0
         my_color = "w" if player_id == 0 else "b"
         my_turn = player_id == 0
         connected = True
@@ -188,15 +250,12 @@ def rotation_anim_start():
     rotation_anim = {"start_rot": board.rotation, "start_ms": pg.time.get_ticks()}
 
 def rotation_anim_tick():
-    global rotation_anim, last_move
+    global rotation_anim
     if rotation_anim is None:
         return
     elapsed = pg.time.get_ticks() - rotation_anim["start_ms"]
     if elapsed >= ROT_ANIM_MS:
         board.rotate_board()
-        if last_move:
-            fr, fc, tr, tc = last_move
-            last_move = (fc, 7 - fr, tc, 7 - tr)
         rotation_anim = None
         return
     rotation_anim["progress"] = elapsed / ROT_ANIM_MS  # type: ignore[attr-defined]
@@ -223,7 +282,7 @@ def draw_board_to_surface(surf, rotation_angle: float = 0):
             br, bc = (vr, vc) if my_color == "w" else (7 - vr, 7 - vc)
             rx, ry, rw, rh = _tile_rect(vr, vc)
 
-            if last_move and (br, bc) in ((last_move[0], last_move[1]), (last_move[2], last_move[3])):
+            if last_move and board.to_canonical(br, bc) in ((last_move[0], last_move[1]), (last_move[2], last_move[3])):
                 hl = pg.Surface((rw, rh), pg.SRCALPHA)
                 hl.fill((255, 140, 0, 70))
                 surf.blit(hl, (rx, ry))
@@ -339,9 +398,11 @@ def draw_ui():
         screen.blit(font_small.render(status_msg, True, (160, 160, 100)), (panel_x, 508))
 
     if game_over:
-        msg = "You won!" if game_over == "won" else "You lost."
-        col = (100, 220, 100) if game_over == "won" else (220, 100, 100)
+        msg = {"won": "You won!", "lost": "You lost.", "drawn": "Draw."}[game_over]
+        col = {"won": (100, 220, 100), "lost": (220, 100, 100), "drawn": (200, 200, 120)}[game_over]
         screen.blit(font_big.render(msg, True, col), (panel_x, 518))
+        if game_over == "drawn":
+            screen.blit(font_small.render(termination.reason or "", True, (160, 160, 160)), (panel_x, 544))
         draw_btn(btn_again, "PLAY AGAIN", active=True)
     elif connected:
         color_str = "WHITE" if my_color == "w" else "BLACK"
@@ -380,14 +441,14 @@ def handle_click(mx, my):
     if selected is None:
         if piece and piece.color == my_color:
             selected = (r, c)
-            legal_moves = board.get_legal_moves(r, c)
+            legal_moves = move_cache.get_legal_moves(board, r, c)
     else:
         if (r, c) == selected:
             selected = None
             legal_moves = []
         elif piece and piece.color == my_color:
             selected = (r, c)
-            legal_moves = board.get_legal_moves(r, c)
+            legal_moves = move_cache.get_legal_moves(board, r, c)
         elif (r, c) in legal_moves:
             fr, fc = selected # type: ignore[attr-defined]
             piece_at = board.get(fr, fc)
@@ -416,8 +477,10 @@ def handle_click(mx, my):
 
 # --- RESET -------------------------------------------------------------------
 def reset_game():
-    global my_color, board, moves_this_round, selected, legal_moves, last_move, game_over, move_anim, rotation_anim, my_turn
+    global my_color, board, termination, moves_this_round, selected, legal_moves, last_move, game_over, move_anim, rotation_anim, my_turn
     board = classes.Board()
+    termination = classes.Termination(board)
+    cache_legal_moves()
     moves_this_round = 0
     selected = None
     legal_moves = []
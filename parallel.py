@@ -0,0 +1,147 @@
+"""
+Multi-process TwistedChess analysis.
+
+Root-move splitting: each iteration of the deepening loop searches the best
+root move so far with a full window, then hands the remaining root moves to a
+pool of worker processes with a null window around that score; only moves
+that beat it are searched again. Workers play the move and search the reply
+with their own engine.Searcher, whose transposition table lives as long as
+the worker. Boards travel as their 103-byte pickled state
+(Board.__getstate__), not as ChessPiece graphs.
+
+Run: python parallel.py [--moves "6444 1434"] [--depth 5] [--workers N]
+     prints the same fixed-depth search single-process and across N workers,
+     with the speedup
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from classes import Board, format_move, setup
+from engine import INF, MATE, MAX_PLY, Move, SearchResult, Searcher, _Timeout
+
+_worker: Optional[Searcher] = None
+
+
+def _init_worker(tt_size_log2: int) -> None:
+    global _worker
+    _worker = Searcher(tt_size_log2)
+
+
+def _search_root_move(board: Board, move: Move, moves_this_round: int, depth: int, alpha: int, beta: int,
+                      deadline: float) -> tuple[Move, Optional[int], int]:
+    """Score of move for the side to move at board within (alpha, beta); None if the deadline passed."""
+    searcher = _worker or Searcher()
+    searcher.nodes = 0
+    # deadline is wall-clock time so every process agrees on it
+    searcher.deadline = time.perf_counter() + (deadline - time.time())
+    searcher.tt.new_search()
+    rotate = moves_this_round == 1
+    undo, mated = searcher._make(board, move, rotate)
+    try:
+        if mated:
+            return move, MATE - 1, 1
+        score = -searcher.search(board, depth - 1, -beta, -alpha, 0 if rotate else 1, 1)
+    except _Timeout:
+        return move, None, searcher.nodes
+    finally:
+        board.unmake_move(undo)
+    return move, score, searcher.nodes
+
+
+class ParallelSearcher:
+    """engine.Searcher.best_move across a pool of worker processes."""
+
+    def __init__(self, workers: Optional[int] = None, tt_size_log2: int = 16):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(tt_size_log2,))
+        self.nodes = 0
+
+    def best_move(self, board: Board, time_ms: int, moves_this_round: int = 0,
+                  max_depth: int = MAX_PLY - 1, on_iteration=None) -> SearchResult:
+        start = time.perf_counter()
+        deadline = time.time() + time_ms / 1000
+        moves = Searcher()._moves(board)
+        result = SearchResult(moves[0] if moves else None, 0, 0, 0, 0.0)
+        self.nodes = 0
+        for depth in range(1, max_depth + 1):
+            if not moves:
+                break
+            scores = self._run(board, moves[:1], moves_this_round, depth, -INF, INF, deadline)
+            if scores is None:
+                break
+            best, best_move = scores[0], moves[0]
+            rest = self._run(board, moves[1:], moves_this_round, depth, best, best + 1, deadline)
+            if rest is None:
+                break
+            better = [m for m, score in zip(moves[1:], rest) if score > best]
+            if better:
+                rescored = self._run(board, better, moves_this_round, depth, best, INF, deadline)
+                if rescored is None:
+                    break
+                for m, score in zip(better, rescored):
+                    if score > best:
+                        best, best_move = score, m
+            moves.remove(best_move)
+            moves.insert(0, best_move)  # searched first, with the full window, next iteration
+            result = SearchResult(best_move, best, depth, self.nodes, time.perf_counter() - start)
+            if on_iteration:
+                on_iteration(result)
+            if abs(best) > MATE - MAX_PLY:
+                break
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - start)
+
+    def _run(self, board: Board, moves: list[Move], moves_this_round: int, depth: int,
+             alpha: int, beta: int, deadline: float) -> Optional[list[int]]:
+        """Scores of moves searched in the pool, in order; None if the deadline cut any short."""
+        futures = [self.pool.submit(_search_root_move, board, m, moves_this_round, depth, alpha, beta, deadline)
+                   for m in moves]
+        scores = []
+        for fut in futures:
+            _, score, n = fut.result()
+            self.nodes += n
+            scores.append(score)
+        return None if None in scores else scores  # type: ignore[return-value]
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+    def __enter__(self) -> "ParallelSearcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def best_move(board: Board, time_ms: int, moves_this_round: int = 0, workers: Optional[int] = None) -> SearchResult:
+    """engine.best_move on workers processes (default: all cores)."""
+    with ParallelSearcher(workers) as searcher:
+        return searcher.best_move(board, time_ms, moves_this_round)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess parallel analysis")
+    ap.add_argument("--moves", default="", help='moves from the start, e.g. "6444 1434"')
+    ap.add_argument("--depth", type=int, default=5, help="fixed search depth for the comparison")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    board, mtr = setup(args.moves)
+    no_limit = 10 ** 9
+
+    single = Searcher(16).best_move(board, no_limit, mtr, args.depth)
+    with ParallelSearcher(args.workers) as searcher:
+        searcher.best_move(board, no_limit, mtr, 1)  # start the workers before timing
+        multi = searcher.best_move(board, no_limit, mtr, args.depth)
+
+    for name, r in (("1 process", single), (f"{args.workers} workers", multi)):
+        move = format_move(*r.move) if r.move else "-"
+        print(f"{name:12} depth {r.depth}  score {r.score:6}  {move:6}  nodes {r.nodes:8}  "
+              f"{r.seconds:7.2f}s  {r.nps:9,.0f} nodes/sec")
+    print(f"speedup {single.seconds / multi.seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
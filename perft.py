@@ -0,0 +1,191 @@
+"""
+Rotation-aware perft for TwistedChess.
+
+Counts the leaves of the legal move tree under the rules the client plays:
+the board rotates after every second ply (main.apply_move), castling runs
+along CASTLE_VECTORS and promotion squares depend on the rotation. Each
+promotion counts once per piece choice (Q, R, N, B).
+
+Run: python perft.py --depth 3 [--moves "6444 1434"] [--divide]
+     python perft.py --suite [--reference]   check the stored reference counts
+     python perft.py --bench                 nodes/sec over the suite
+     add --backend compact (or bitboard) to run any of these on compact.CompactBoard
+     (or bitboard.BitBoard)
+"""
+import argparse
+import time
+from typing import Optional
+
+from bitboard import BitBoard
+from classes import Board, format_move, setup
+from compact import CompactBoard
+
+BACKENDS = {"board": Board, "compact": CompactBoard, "bitboard": BitBoard}
+
+PROMOTIONS = ("Q", "R", "N", "B")
+
+# (name, moves from the start position, expected node counts for depth 1, 2, ...)
+# Moves are grid coordinates as the client sends them; the ply count sets the
+# rotation and how many plies remain before the next one.
+SUITE: list[tuple[str, str, list[int]]] = [
+    ("start", "", [20, 400, 3583, 31992]),
+    ("rotation-pending", "6444", [20, 340, 3026, 54814]),
+    ("rotation-1", "6444 1434", [17, 288, 5223, 96016]),
+    ("rotation-2", "6444 1434 6656 1626", [16, 320, 6040, 141282]),
+    ("castle-rot1", (
+        "6040 1535 6052 6775 1101 5062 7776 2333 6454 1020 5005 4454 3727 7657 2616 "
+        "2333 6151 1636 6141 0524 2234 7747 6755 6171 7666 1020"
+    ), [21, 379, 7601, 147561]),
+    ("castle-rot2", (
+        "6646 1222 6353 2535 3222 7152 2515 2234 7566 4436 6252 1626 1202 7566 3626 "
+        "4252 6242 3655 6052 3727 3525 6474 4636 5262 7236 1535 2212 1525 0001 7553 "
+        "2504 5262 5141 0113 1303 4656 3727 4252 7565 4050 7353 0001 1202 2737 1000 "
+        "6777 4505 2131 7767 0706 6420 4756 0550 5343 6656 4050 5040 1636 2111 4442 "
+        "3727 4151 6646 2232 6354 1232 6125 4555 1000 6070 7666 2232 6151 1120 1022 "
+        "2737"
+    ), [45, 760, 32997, 603920]),
+    ("promotion-rot0", (
+        "6050 1737 0001 1725 1707 4050 7565 5264 6353 2737 1101 6676 0414 6676 1725 "
+        "6445 6453 1232 1202 5666 1101 7362 4673 5363 6252 1424 7161 3646 2414 6252 "
+        "2745 0313 3010 0321 2212 1516 6757 4656 2544 2233 6555 3646 4050 6373 2212 "
+        "6373 4636 0414 5040 4656 1202 1535 1303 5464 0701 1526 5331"
+    ), [38, 1265, 36806, 1220554]),
+    ("promotion-rot3", (
+        "6656 1626 7161 5666 0120 7150 1606 1121 6454 1030 5141 5666 2111 4757 3626 "
+        "6171 7355 2030 4232 2716 1404 6171 2534 2011 6242 3040 5141 0313 1101 6575 "
+        "6646 6474 7666 1333 6151 0313 3525 3646 3433 1020 6050 3141 4454 3444 4272 "
+        "6172 7564 3343 7250 0212 1303 5766 2745 7371 7464 1232 6454 3343 3121 5755 "
+        "0211 3444 3717 3141 6555 1030 1303 3727 3727 6070 2515 7072 7363 2434 5020 "
+        "5535 2717 7573 1707 0223 6644 2021 7161 4765 1404 4757 3525 4232 7767 3344 "
+        "7160 1627 0614 6474 4737 3444 5545 1605 5344 1736 0100 5767 4535 4454 6351 "
+        "1030 0010 6547 1707 5666 1606 5465 7060 1222 7060 1221 2111 5565 5320"
+    ), [44, 1194, 54646, 1393665]),
+    ("check-rot3", (
+        "6252 1737 2212 7775 0625 5053 6656 6072 6545 3747 2002 6775 1505 5042 2414 "
+        "3252 5231 1626 3121 6575 0414 4234 6545 0212 7473 4757 3142 6575 3121 2030 "
+        "6342"
+    ), [1, 25, 704, 19911]),
+]
+
+
+def _legal(board: Board, reference: bool) -> list[tuple[int, int, int, int]]:
+    color = board.turn
+    if not reference:
+        return board.legal_moves(color)
+    # Slow path kept as an oracle: pseudo-legal moves, each trial-applied on the grid.
+    moves = []
+    for r in range(8):
+        for c in range(8):
+            p = board.grid[r][c]
+            if p and p.color == color:
+                for tr, tc in board._raw_moves(r, c):
+                    if board._move_leaves_king_safe(r, c, tr, tc, p):
+                        moves.append((*board.to_view(r, c), *board.to_view(tr, tc)))
+    return moves
+
+
+def expand(board: Board, moves: list[tuple[int, int, int, int]]) -> list[tuple[int, int, int, int, Optional[str]]]:
+    """Attach promotion choices: one entry per piece for each promoting pawn move."""
+    out: list[tuple[int, int, int, int, Optional[str]]] = []
+    for fr, fc, tr, tc in moves:
+        p = board.get(fr, fc)
+        if p and p.type == "P" and board._is_promotion_square(tr, tc, p.color):
+            out.extend((fr, fc, tr, tc, promo) for promo in PROMOTIONS)
+        else:
+            out.append((fr, fc, tr, tc, None))
+    return out
+
+
+def perft(board: Board, depth: int, moves_this_round: int = 0, reference: bool = False) -> int:
+    """Leaf count at depth. moves_this_round is 0 or 1, as in main.py."""
+    if depth == 0:
+        return 1
+    moves = expand(board, _legal(board, reference))
+    if depth == 1:
+        return len(moves)
+    rotate = moves_this_round == 1
+    nxt = 0 if rotate else 1
+    nodes = 0
+    for fr, fc, tr, tc, promo in moves:
+        undo = board.make_move(fr, fc, tr, tc, promo, rotate=rotate)
+        nodes += perft(board, depth - 1, nxt, reference)
+        board.unmake_move(undo)  # type: ignore[arg-type]
+    return nodes
+
+
+def divide(board: Board, depth: int, moves_this_round: int = 0, reference: bool = False) -> dict[str, int]:
+    """Per-root-move leaf counts."""
+    rotate = moves_this_round == 1
+    out: dict[str, int] = {}
+    for fr, fc, tr, tc, promo in expand(board, _legal(board, reference)):
+        undo = board.make_move(fr, fc, tr, tc, promo, rotate=rotate)
+        out[format_move(fr, fc, tr, tc, promo)] = perft(board, depth - 1, 0 if rotate else 1, reference)
+        board.unmake_move(undo)  # type: ignore[arg-type]
+    return out
+
+
+def run_suite(max_depth: int, reference: bool = False, backend: str = "board") -> bool:
+    ok = True
+    for name, moves, counts in SUITE:
+        board, mtr = setup(moves, BACKENDS[backend]())
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            start = time.perf_counter()
+            got = perft(board, depth, mtr, reference)
+            elapsed = time.perf_counter() - start
+            status = "ok" if got == expected else f"FAIL (expected {expected})"
+            ok &= got == expected
+            print(f"{name:18} depth {depth}  {got:>8} nodes  {elapsed:7.3f}s  {status}")
+    return ok
+
+
+def bench(max_depth: int, reference: bool = False, backend: str = "board") -> None:
+    positions = [setup(moves, BACKENDS[backend]()) for _, moves, _ in SUITE]
+    nodes = 0
+    start = time.perf_counter()
+    for (board, mtr), (_, _, counts) in zip(positions, SUITE):
+        nodes += perft(board, min(max_depth, len(counts)), mtr, reference)
+    perft_s = time.perf_counter() - start
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < 1.0:
+        for board, _ in positions:
+            _legal(board, reference)
+        calls += len(positions)
+    gen_s = time.perf_counter() - start
+    print(f"perft:   {nodes} nodes in {perft_s:.2f}s  ({nodes / perft_s:,.0f} nodes/sec)")
+    print(f"movegen: {calls / gen_s:,.0f} positions/sec")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess perft")
+    ap.add_argument("--depth", type=int, default=3)
+    ap.add_argument("--moves", default="", help='moves from the start, e.g. "6444 1434"')
+    ap.add_argument("--divide", action="store_true", help="print leaf counts per root move")
+    ap.add_argument("--suite", action="store_true", help="check the stored reference counts")
+    ap.add_argument("--bench", action="store_true", help="report nodes/sec over the suite")
+    ap.add_argument("--reference", action="store_true", help="use the slow trial-move generator")
+    ap.add_argument("--backend", choices=sorted(BACKENDS), default="board")
+    args = ap.parse_args()
+    if args.reference and args.backend != "board":
+        ap.error("--reference needs --backend board")
+
+    if args.suite:
+        raise SystemExit(0 if run_suite(args.depth, args.reference, args.backend) else 1)
+    if args.bench:
+        bench(args.depth, args.reference, args.backend)
+        return
+    board, mtr = setup(args.moves, BACKENDS[args.backend]())
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(board, args.depth, mtr, args.reference)
+        for move, n in sorted(counts.items()):
+            print(f"{move}: {n}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, args.depth, mtr, args.reference)
+    elapsed = time.perf_counter() - start
+    print(f"nodes {nodes}  time {elapsed:.3f}s  {nodes / elapsed if elapsed else 0:,.0f} nodes/sec")
+
+
+if __name__ == "__main__":
+    main()
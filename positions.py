@@ -0,0 +1,115 @@
+"""
+Bulk position files.
+
+A text file holds one Board.to_fen line per position (blank lines and lines
+starting with # are skipped); a binary file is a bare run of
+Board.to_bytes records, POSITION_BYTES each. Both are read as streams through
+a fixed-size buffer, so files of millions of positions never sit in memory.
+
+Run: python positions.py FILE [--convert OUT]
+     counts (and optionally converts) the positions in FILE, with positions/sec.
+     Files ending in .fen or .txt are text, anything else binary.
+"""
+import argparse
+import time
+from typing import BinaryIO, Iterable, Iterator
+
+from classes import POSITION_BYTES, Board
+
+CHUNK_RECORDS = 4096
+
+
+def is_text(path: str) -> bool:
+    return path.endswith((".fen", ".txt"))
+
+
+def iter_fen(path: str) -> Iterator[tuple[Board, int]]:
+    """(board, moves_this_round) per line of a Twisted-FEN file."""
+    with open(path, encoding="ascii") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                yield Board.from_fen(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{lineno}: {e}") from None
+
+
+def iter_records(path: str, chunk_records: int = CHUNK_RECORDS) -> Iterator[memoryview]:
+    """Raw POSITION_BYTES records of a binary file, without building boards.
+
+    Records are views into a buffer that is reused for the next chunk: copy
+    (bytes(record)) anything kept past the next iteration.
+    """
+    buf = bytearray(chunk_records * POSITION_BYTES)
+    view = memoryview(buf)
+    with open(path, "rb") as f:
+        while True:
+            n = _read_full(f, view)
+            if n % POSITION_BYTES:
+                raise ValueError(f"{path}: truncated record at end of file")
+            for off in range(0, n, POSITION_BYTES):
+                yield view[off:off + POSITION_BYTES]
+            if n < len(buf):
+                return
+
+
+def _read_full(f: BinaryIO, view: memoryview) -> int:
+    """readinto until view is full or the file ends."""
+    total = 0
+    while total < len(view):
+        n = f.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def iter_binary(path: str, chunk_records: int = CHUNK_RECORDS) -> Iterator[tuple[Board, int]]:
+    """(board, moves_this_round) per record of a binary file."""
+    for i, record in enumerate(iter_records(path, chunk_records)):
+        try:
+            yield Board.from_bytes(record)  # type: ignore[arg-type]
+        except ValueError as e:
+            raise ValueError(f"{path}: record {i}: {e}") from None
+
+
+def load(path: str) -> Iterator[tuple[Board, int]]:
+    """iter_fen or iter_binary, by file extension."""
+    return iter_fen(path) if is_text(path) else iter_binary(path)
+
+
+def dump(path: str, positions: Iterable[tuple[Board, int]]) -> int:
+    """Write (board, moves_this_round) pairs as text or binary by extension; returns the count."""
+    count = 0
+    if is_text(path):
+        with open(path, "w", encoding="ascii") as f:
+            for board, mtr in positions:
+                f.write(board.to_fen(mtr) + "\n")
+                count += 1
+    else:
+        with open(path, "wb") as f:
+            for board, mtr in positions:
+                f.write(board.to_bytes(mtr))
+                count += 1
+    return count
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess position files")
+    ap.add_argument("file")
+    ap.add_argument("--convert", metavar="OUT", help="write the positions to OUT (format by extension)")
+    args = ap.parse_args()
+
+    start = time.perf_counter()
+    if args.convert:
+        n = dump(args.convert, load(args.file))
+    else:
+        n = sum(1 for _ in load(args.file))
+    elapsed = time.perf_counter() - start
+    print(f"{n} positions in {elapsed:.2f}s  ({n / elapsed if elapsed else 0:,.0f} positions/sec)")
+
+
+if __name__ == "__main__":
+    main()
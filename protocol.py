@@ -0,0 +1,143 @@
+"""
+Binary framing for moves and control messages between client and server.
+
+A client asks for it with "?protocol=bin1" on the WebSocket URL (or by
+appending ";bin1" to the room code it sends first); a server that speaks it
+answers with the player index followed by ";bin1" (e.g. "0;bin1"), and from
+then on that connection sends binary frames. Servers that predate it ignore
+the URL parameter and answer a bare index, so the client stays on text and
+the room code means the same room everywhere. Every
+frame starts with a type byte and the sender's sequence number (u16, +1 per
+frame, wrapping), little-endian:
+
+    MOVE    01 seq seq  move move     5 bytes; move as in selfplay records:
+                                      from square | to square << 6 | promotion << 12,
+                                      squares r * 8 + c on screen, promotion 0 or 1-4 for Q, R, N, B
+    RESET   02 seq seq                3 bytes; start a new game, colours swap
+    RESIGN  03 seq seq
+    PING    04 seq seq                answered by the server with PONG echoing seq;
+    PONG    05 seq seq                neither is relayed
+    RESULT  06 seq seq  result reason server only, in authoritative mode: the game's
+                                      end, seq its ply count; result indexes RESULTS,
+                                      reason REASONS
+
+The text protocol (JSON moves, resets as promotion "RESET") stays; the server
+converts between the two when the players of a room differ. Only the server
+stands between them, so a later version can add types under a new token.
+"""
+import json
+import struct
+from typing import NamedTuple, Optional, Union
+
+VERSION = 1
+TOKEN = f"bin{VERSION}"
+
+MOVE, RESET, RESIGN, PING, PONG, RESULT = 1, 2, 3, 4, 5, 6
+_SIZES = {MOVE: 5, RESET: 3, RESIGN: 3, PING: 3, PONG: 3, RESULT: 5}
+_HEAD = struct.Struct("<BH")
+_MOVE = struct.Struct("<BHH")
+_RESULT = struct.Struct("<BHBB")
+PROMOTIONS = "QRNB"
+# game.WHITE_WINS, BLACK_WINS, DRAWN and the classes.Termination reasons
+RESULTS = ("1-0", "0-1", "1/2-1/2")
+REASONS = ("checkmate", "stalemate", "threefold repetition", "fifty-move rule", "insufficient material")
+
+# A relayed message: text for JSON clients, bytes for binary ones.
+Message = Union[str, bytes]
+Move = tuple[int, int, int, int, Optional[str]]
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class Frame(NamedTuple):
+    kind: int
+    seq: int
+    move: Optional[Move] = None
+    result: Optional[tuple[str, str]] = None  # (result, reason) of a RESULT frame
+
+
+def encode_move(seq: int, fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> bytes:
+    promo = PROMOTIONS.index(promotion.upper()) + 1 if promotion else 0
+    return _MOVE.pack(MOVE, seq & 0xFFFF, fr * 8 + fc | (tr * 8 + tc) << 6 | promo << 12)
+
+
+def encode(kind: int, seq: int) -> bytes:
+    """A control frame: RESET, RESIGN, PING or PONG."""
+    return _HEAD.pack(kind, seq & 0xFFFF)
+
+
+def encode_result(seq: int, result: str, reason: str) -> bytes:
+    return _RESULT.pack(RESULT, seq & 0xFFFF, RESULTS.index(result), REASONS.index(reason))
+
+
+def check(frame: bytes, seq: int) -> int:
+    """Validate a frame from a peer whose next sequence number is seq; returns its type.
+    The relay's whole per-frame cost: a length, a type, a sequence number and,
+    for moves, the promotion bits."""
+    if not frame or _SIZES.get(frame[0]) != len(frame):
+        raise ProtocolError(f"bad frame {frame[:8].hex()}")
+    kind, got = _HEAD.unpack_from(frame)
+    if got != seq & 0xFFFF:
+        raise ProtocolError(f"sequence {got}, expected {seq & 0xFFFF}")
+    if kind == MOVE and frame[4] >> 4 > len(PROMOTIONS):
+        raise ProtocolError("bad promotion")
+    return kind
+
+
+def decode(frame: bytes) -> Frame:
+    if not frame or _SIZES.get(frame[0]) != len(frame):
+        raise ProtocolError(f"bad frame {frame[:8].hex()}")
+    if frame[0] == RESULT:
+        kind, seq, result, reason = _RESULT.unpack(frame)
+        if result >= len(RESULTS) or reason >= len(REASONS):
+            raise ProtocolError("bad result")
+        return Frame(kind, seq, result=(RESULTS[result], REASONS[reason]))
+    if frame[0] != MOVE:
+        return Frame(*_HEAD.unpack(frame))
+    kind, seq, move = _MOVE.unpack(frame)
+    frm, to, promo = move & 63, move >> 6 & 63, move >> 12
+    if promo > len(PROMOTIONS):
+        raise ProtocolError("bad promotion")
+    return Frame(kind, seq, (frm >> 3, frm & 7, to >> 3, to & 7, PROMOTIONS[promo - 1] if promo else None))
+
+
+def game_frame(data: Message, seq: int = 0) -> Optional[bytes]:
+    """data as a MOVE, RESET or RESIGN frame (text numbered seq); None for anything else.
+    What a room's log keeps: resets clear it, the rest is appended."""
+    if isinstance(data, bytes):
+        return data if data[:1] in (b"\x01", b"\x02", b"\x03") else None
+    return from_json(data, seq)
+
+
+def to_json(frame: bytes) -> Optional[str]:
+    """The text-protocol form of a frame; None for frames text clients have no use for."""
+    f = decode(frame)
+    if f.kind == MOVE:
+        fr, fc, tr, tc, promo = f.move  # type: ignore[misc]
+        return json.dumps({"from": [fr, fc], "to": [tr, tc], **({"promotion": promo} if promo else {})})
+    if f.kind == RESET:
+        return '{"from": [-1, -1], "to": [-1, -1], "promotion": "RESET"}'
+    if f.kind == RESIGN:
+        return '{"resign": true}'
+    if f.kind == RESULT:
+        result, reason = f.result  # type: ignore[misc]
+        return json.dumps({"result": result, "reason": reason})
+    return None
+
+
+def from_json(text: str, seq: int) -> Optional[bytes]:
+    """The frame for a text-protocol message, numbered seq; None if it is not a move, reset or resignation."""
+    try:
+        msg = json.loads(text)
+        if msg.get("promotion") == "RESET":
+            return encode(RESET, seq)
+        if msg.get("resign"):
+            return encode(RESIGN, seq)
+        (fr, fc), (tr, tc) = msg["from"], msg["to"]
+        if not all(isinstance(v, int) and 0 <= v < 8 for v in (fr, fc, tr, tc)):
+            return None
+        return encode_move(seq, fr, fc, tr, tc, msg.get("promotion"))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
@@ -0,0 +1,135 @@
+"""
+Headless self-play game generator.
+
+Plays games with game.Game (random legal moves, or the engine with a time
+budget per move) across a process pool and appends compact records to a
+file. A record is a little-endian header (ply count: u16, result: u8)
+followed by one u16 per ply: from square | to square << 6 | promotion << 12,
+squares as r * 8 + c on screen, promotion 0 for none or 1-4 for Q, R, N, B.
+
+Run: python selfplay.py --games 1000 [-o games.bin] [--workers N] [--engine-ms 50 [--random-plies 4]]
+     python selfplay.py --dump games.bin   print records as result + moves
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+from multiprocessing import Pool
+from typing import Iterator, Optional
+
+from classes import format_move
+from engine import Searcher
+from game import BLACK_WINS, DRAWN, ONGOING, PROMOTIONS, WHITE_WINS, Game
+
+RESULTS = (ONGOING, WHITE_WINS, BLACK_WINS, DRAWN)
+_HEADER = struct.Struct("<HB")
+
+Move = tuple[int, int, int, int, Optional[str]]
+
+
+def encode_move(fr: int, fc: int, tr: int, tc: int, promotion: Optional[str] = None) -> int:
+    return fr * 8 + fc | (tr * 8 + tc) << 6 | (PROMOTIONS.index(promotion.upper()) + 1 if promotion else 0) << 12
+
+
+def decode_move(ply: int) -> Move:
+    frm, to, promo = ply & 63, ply >> 6 & 63, ply >> 12
+    return frm >> 3, frm & 7, to >> 3, to & 7, PROMOTIONS[promo - 1] if promo else None
+
+
+def encode_game(moves: list[Move], result: str) -> bytes:
+    plies = [encode_move(*m) for m in moves]
+    return _HEADER.pack(len(plies), RESULTS.index(result)) + struct.pack(f"<{len(plies)}H", *plies)
+
+
+def iter_games(path: str) -> Iterator[tuple[list[Move], str]]:
+    """(moves, result) per record of a self-play file."""
+    with open(path, "rb") as f:
+        while header := f.read(_HEADER.size):
+            if len(header) < _HEADER.size:
+                raise ValueError(f"{path}: truncated record header")
+            n, result = _HEADER.unpack(header)
+            data = f.read(2 * n)
+            if len(data) < 2 * n:
+                raise ValueError(f"{path}: truncated record")
+            yield [decode_move(ply) for ply in struct.unpack(f"<{n}H", data)], RESULTS[result]
+
+
+def play_game(seed: int, max_plies: int = 300, engine_ms: int = 0, random_plies: int = 4) -> tuple[bytes, int]:
+    """One game from the start position; returns (record, plies). With engine_ms,
+    the first random_plies moves are still random so engine games differ."""
+    rng = random.Random(seed)
+    game = Game()
+    searcher = Searcher(16) if engine_ms else None
+    while not game.over and len(game.moves) < max_plies:
+        if searcher and len(game.moves) >= random_plies:
+            move = searcher.best_move(game.board, engine_ms, game.moves_this_round).move
+            assert move is not None  # the game would be over
+            fr, fc, tr, tc, promo = move
+        else:
+            fr, fc, tr, tc = rng.choice(game.legal_moves())
+            promo = rng.choice(PROMOTIONS) if game.is_promotion(fr, fc, tr, tc) else None
+        game.play(fr, fc, tr, tc, promo, validate=False)
+    return encode_game(game.moves, game.result), len(game.moves)
+
+
+def _play(args: tuple[int, int, int, int]) -> tuple[bytes, int]:
+    return play_game(*args)
+
+
+def run(games: int, out_path: str, workers: int = 1, seed: int = 0, max_plies: int = 300,
+        engine_ms: int = 0, random_plies: int = 4, progress=sys.stderr) -> tuple[int, int, float]:
+    """Play games and append their records to out_path; returns (games, plies, seconds)."""
+    tasks = ((seed + i, max_plies, engine_ms, random_plies) for i in range(games))
+    start = last_report = time.perf_counter()
+    done = plies = 0
+    with open(out_path, "ab") as out:
+        if workers <= 1:
+            results: Iterator[tuple[bytes, int]] = map(_play, tasks)
+            pool = None
+        else:
+            pool = Pool(workers)
+            results = pool.imap_unordered(_play, tasks, chunksize=max(1, min(64, games // (workers * 8))))
+        try:
+            for record, n in results:
+                out.write(record)
+                done += 1
+                plies += n
+                now = time.perf_counter()
+                if progress and now - last_report >= 1.0:
+                    last_report = now
+                    progress.write(f"\r{done}/{games} games  {done / (now - start):,.1f} games/sec  "
+                                   f"{plies / (now - start):,.0f} plies/sec")
+                    progress.flush()
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+    return done, plies, time.perf_counter() - start
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="TwistedChess self-play")
+    ap.add_argument("--games", type=int, default=100)
+    ap.add_argument("-o", "--output", default="games.bin", help="record file, appended to")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=0, help="game i uses seed + i")
+    ap.add_argument("--max-plies", type=int, default=300, help="stop unfinished games here (result *)")
+    ap.add_argument("--engine-ms", type=int, default=0, help="engine time per move; 0 plays random moves")
+    ap.add_argument("--random-plies", type=int, default=4, help="random opening plies before the engine plays")
+    ap.add_argument("--dump", metavar="FILE", help="print the records in FILE and exit")
+    args = ap.parse_args()
+
+    if args.dump:
+        for moves, result in iter_games(args.dump):
+            print(result, " ".join(format_move(*m) for m in moves))
+        return
+    games, plies, elapsed = run(args.games, args.output, args.workers, args.seed, args.max_plies, args.engine_ms,
+                                args.random_plies)
+    print(f"\r{games} games, {plies} plies in {elapsed:.2f}s  "
+          f"({games / elapsed:,.1f} games/sec, {plies / elapsed:,.0f} plies/sec)")
+
+
+if __name__ == "__main__":
+    main()
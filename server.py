@@ -1,28 +1,401 @@
 """
 TwistedChess WebSocket server for Render deployment.
+
+The first message names the room. Players send the bare code and get back
+their index, "0" (white) or "1" (black). Spectators send "CODE;watch" and
+get back "watch" followed by a snapshot, {"moves": [...]} holding every move
+and resignation relayed since the last reset as text-protocol objects, then
+each message as it is relayed.
+A spectator that falls a full queue behind is sent a fresh snapshot in place
+of its backlog, so a snapshot always replaces whatever it has replayed.
+
+Players that connect with "?protocol=bin1" or add ";bin1" to the code (see
+protocol.py) get "0;bin1" or "1;bin1" back and exchange binary frames. The relay checks each frame's
+length, type and sequence number, answers pings itself, and converts between
+frames and JSON only when the two players of a room speak different protocols.
+
+With TWISTEDCHESS_BROKER set (see broker.py) the connections of one room can
+be spread over several workers: slots are claimed through the broker, and
+each worker fans relayed messages out to the connections it holds.
+
+With TWISTEDCHESS_AUTHORITATIVE=1 each room also keeps a game.Game: a move
+is played there (legality, whose turn, the rotation every second ply) before
+it is relayed, and a player who sends an illegal one, or a reset before the
+game has ended or someone resigned, is disconnected (1008).
+The end of a game is judged once, by classes.Termination on the server, and
+sent to everyone in the room as {"result": "1-0", "reason": "checkmate"} or
+a RESULT frame. Validation runs on the event loop (about 150 us a move) or,
+with TWISTEDCHESS_VALIDATE_IN_THREAD=1, in asyncio.to_thread; GET /stats
+reports its cost.
+
 Run: uvicorn server:app --host 0.0.0.0 --port $PORT
 """
-import asyncio, os
+import asyncio, os, threading, time
 from contextlib import asynccontextmanager
+from typing import Callable, Optional
 SERVER_URL = os.environ.get("TWISTEDCHESS_SERVER", "wss://twistedchess.onrender.com/ws")
 
 import subprocess, sys
 subprocess.check_call([sys.executable, "-m", "pip", "install", "fastapi", "uvicorn", "websockets"])
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-rooms: dict[str, list[WebSocket]] = {}
-_rooms_lock = asyncio.Lock()
+import protocol
+from broker import MAX_LOG, make_broker
+from game import Game
+from protocol import Message
+
+broker = make_broker(os.environ.get("TWISTEDCHESS_BROKER"))
+
+# Outbound queue per connection: TWISTEDCHESS_OUTBOX messages at most, then
+# TWISTEDCHESS_OUTBOX_POLICY decides: "disconnect" the slow peer (default; a
+# relayed move must never vanish), "drop" the new message, or "coalesce" by
+# dropping the oldest queued one so the latest gets through.
+OUTBOX_LIMIT = int(os.environ.get("TWISTEDCHESS_OUTBOX", "64"))
+OUTBOX_POLICY = os.environ.get("TWISTEDCHESS_OUTBOX_POLICY", "disconnect")
+if OUTBOX_POLICY not in ("disconnect", "drop", "coalesce"):
+    raise ValueError(f"TWISTEDCHESS_OUTBOX_POLICY must be disconnect, drop or coalesce, not {OUTBOX_POLICY!r}")
+# Spectators always "resync": one that falls a full queue behind has its
+# backlog replaced by a fresh snapshot, so it never holds up the players.
+SPECTATOR_OUTBOX = int(os.environ.get("TWISTEDCHESS_SPECTATOR_OUTBOX", "32"))
+MAX_SPECTATORS = int(os.environ.get("TWISTEDCHESS_MAX_SPECTATORS", "1000"))
+AUTHORITATIVE = os.environ.get("TWISTEDCHESS_AUTHORITATIVE", "") not in ("", "0")
+VALIDATE_IN_THREAD = os.environ.get("TWISTEDCHESS_VALIDATE_IN_THREAD", "") not in ("", "0")
+
+# totals over connections that have already gone, for /stats
+_totals = {"dropped": 0, "slow_disconnects": 0, "resyncs": 0}
+# authoritative mode: moves judged for this worker's players, and the time it took
+_validation = {"moves": 0, "rejected": 0, "seconds": 0.0, "max": 0.0}
+_validation_lock = threading.Lock()
+
+
+class IllegalMove(Exception):
+    pass
+
+
+class Connection:
+    """A WebSocket with a bounded outbound queue drained by its own writer task.
+
+    send() never waits, so a stalled peer only fills its own queue and never
+    holds up the connection that is relaying to it.
+    """
+
+    def __init__(self, ws: WebSocket, limit: int = OUTBOX_LIMIT, policy: str = OUTBOX_POLICY,
+                 resync: Optional[Callable[[], str]] = None, binary: bool = False):
+        self.ws = ws
+        self.policy = policy
+        self.resync = resync
+        self.binary = binary
+        self.seq = 0  # the next sequence number expected from the peer
+        self.queue: asyncio.Queue[Message] = asyncio.Queue(limit)
+        self.dropped = 0
+        self.closing = False
+        self._writer = asyncio.create_task(self._write())
+        self._closer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def next_seq(self) -> int:
+        seq, self.seq = self.seq, (self.seq + 1) & 0xFFFF
+        return seq
+
+    def send(self, data: Message) -> None:
+        if self.closing:
+            return
+        try:
+            self.queue.put_nowait(data)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "disconnect":
+            _totals["slow_disconnects"] += 1
+            self._close(1013)  # try again later
+            return
+        if self.policy == "resync" and self.resync is not None:
+            _totals["resyncs"] += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.resync())
+            return
+        self.dropped += 1
+        if self.policy == "coalesce":
+            self.queue.get_nowait()
+            self.queue.put_nowait(data)
+
+    async def _write(self) -> None:
+        try:
+            while True:
+                data = await self.queue.get()
+                if isinstance(data, bytes):
+                    await self.ws.send_bytes(data)
+                else:
+                    await self.ws.send_text(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the peer is gone; its own receive loop will notice and leave the room
+            self._close(1011)
+
+    def _close(self, code: int) -> None:
+        if not self.closing:
+            self.closing = True
+            self._writer.cancel()
+            self._closer = asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        """Stop the writer and close the socket (idempotent)."""
+        self._close(1000)
+        if self._closer:
+            await self._closer
+        _totals["dropped"] += self.dropped
+        self.dropped = 0
+
+
+class Room:
+    """One game as seen by this worker: the player slots and spectators it
+    holds, and the messages relayed since the last reset. Only the room's own
+    connections touch it, so relaying looks up the opponent here without any lock."""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.players: list[Optional[Connection]] = [None, None]
+        self.spectators: set[Connection] = set()
+        self.log: list[bytes] = []  # moves and resignations since the last reset, as frames
+        self._snapshot: Optional[str] = None
+        self.white = 0  # the slot playing white; colours swap on every reset
+        self.game: Optional[Game] = Game() if AUTHORITATIVE else None
+        self.resigned = False
+        self.result_sent = False
+        self._game_lock = threading.Lock()
+        self.lock = asyncio.Lock()  # held across this room's joins and leaves, broker calls included
+        self.opened = False
+
+    def join(self, index: int, conn: Connection) -> None:
+        """Seat conn in a slot the broker has granted."""
+        self.players[index] = conn
+
+    def leave(self, index: int) -> None:
+        self.players[index] = None
+
+    def opponent(self, index: int) -> Optional[Connection]:
+        return self.players[1 - index]
+
+    def relay(self, index: int, data: Message, seq: int) -> None:
+        """Message seq from this worker's player index: deliver it here and hand it to the broker."""
+        self.deliver(index, data, seq)
+        broker.publish(self.code, index, data, seq)
+
+    def receive(self, index: int, data: Message, seq: int) -> None:
+        """A message relayed by another worker, which has already judged it."""
+        if self.game is not None:
+            self._play(index, data, seq, trusted=True)
+        self.deliver(index, data, seq)
+
+    def deliver(self, index: int, data: Message, seq: int) -> None:
+        """Queue player index's message for the opponent and every spectator on this worker.
+
+        The same object goes to each queue and each writer task sends it, so
+        the fan-out costs the sender one put_nowait per watcher. A receiver
+        on the other protocol gets a converted copy, made at most once.
+        """
+        binary = isinstance(data, bytes)
+        # None: text that is not a move, reset or resignation, relayed but never logged
+        frame = protocol.game_frame(data, seq)
+        if frame is not None:
+            if frame[0] == protocol.RESET:
+                self.log.clear()
+                self.white = 1 - self.white
+            elif len(self.log) >= MAX_LOG:
+                self._end(f"the game passed {MAX_LOG} logged moves")
+                return
+            else:
+                self.log.append(frame)
+            self._snapshot = None
+        converted: Optional[Message] = None if binary else frame or ""
+        for conn in (self.players[1 - index], *self.spectators):
+            if conn is None:
+                continue
+            if conn.binary == binary:
+                conn.send(data)
+                continue
+            if converted is None:
+                converted = protocol.to_json(data) or ""  # type: ignore[arg-type]
+            if converted:
+                conn.send(converted)
+        if self.game is not None and self.game.over and not self.result_sent:
+            self.result_sent = True
+            self._announce()
+
+    def judge(self, index: int, data: Message, seq: int) -> Optional[str]:
+        """Authoritative mode: play message seq from player index on the room's game.
+        Returns why it is refused, or None. Holds the game lock, so it can run in a thread."""
+        start = time.perf_counter()
+        refusal = self._play(index, data, seq)
+        elapsed = time.perf_counter() - start
+        with _validation_lock:
+            _validation["moves"] += 1
+            _validation["seconds"] += elapsed
+            _validation["max"] = max(_validation["max"], elapsed)
+            if refusal:
+                _validation["rejected"] += 1
+        return refusal
+
+    def _play(self, index: int, data: Message, seq: int, trusted: bool = False) -> Optional[str]:
+        try:
+            frame = protocol.decode(data) if isinstance(data, bytes) else _text_frame(data, seq)
+        except protocol.ProtocolError as e:
+            return str(e)
+        if frame is None:
+            return None if trusted else "not a move, reset or resignation"
+        with self._game_lock:
+            game = self.game
+            assert game is not None
+            if frame.kind == protocol.RESET:
+                if not (trusted or game.over or self.resigned):
+                    return "the game is not over"
+                self.game = Game()
+                self.resigned = self.result_sent = False
+            elif frame.kind == protocol.RESIGN:
+                self.resigned = True
+            elif frame.kind == protocol.MOVE:
+                if game.over or self.resigned:
+                    return None if trusted else "the game is over"
+                if trusted:
+                    game.play(*frame.move, validate=False)  # type: ignore[misc]
+                    return None
+                if (index == self.white) != (game.board.turn == "w"):
+                    return "not your turn"
+                try:
+                    game.play(*frame.move)  # type: ignore[misc]
+                except ValueError as e:
+                    return str(e)
+        return None
+
+    def _announce(self) -> None:
+        """Send the game's end to every player and spectator on this worker."""
+        game = self.game
+        assert game is not None and game.reason is not None
+        frame = protocol.encode_result(len(game.moves), game.result, game.reason)
+        text = protocol.to_json(frame)
+        for conn in (*self.players, *self.spectators):
+            if conn is not None:
+                conn.send(frame if conn.binary else text)  # type: ignore[arg-type]
+        print(f"[{self.code}] {game.result} by {game.reason}")
+
+    def _end(self, why: str) -> None:
+        """Close every connection this worker holds on the room (1008); each leaves as it notices."""
+        for conn in (*self.players, *self.spectators):
+            if conn is not None:
+                conn._close(1008)
+        print(f"[{self.code}] ended: {why}")
+
+    def restore(self, log: list[Message], white: int) -> None:
+        """Take the log and colours from another worker's view of the room."""
+        frames = (protocol.game_frame(data) for data in log)
+        self.log = [frame for frame in frames if frame is not None][:MAX_LOG]
+        self.white = white
+        self._snapshot = None
+        if self.game is not None:
+            self.game = Game()
+            self.resigned = False
+            for frame in self.log:
+                self._play(-1, frame, 0, trusted=True)
+            self.result_sent = self.game.over  # announced where the last move was played
+
+    def snapshot(self) -> str:
+        """{"moves": [...]}: what a spectator needs to replay the game so far; built once per move."""
+        if self._snapshot is None:
+            # every logged frame is a move or resignation, so each to_json is one JSON object
+            self._snapshot = '{"moves": [' + ", ".join(protocol.to_json(f) for f in self.log) + "]}"  # type: ignore[misc]
+        return self._snapshot
+
+    @property
+    def empty(self) -> bool:
+        return self.players == [None, None] and not self.spectators
+
+
+def _text_frame(text: str, seq: int) -> Optional[protocol.Frame]:
+    frame = protocol.from_json(text, seq)
+    return protocol.decode(frame) if frame else None
+
+
+# Joins and leaves take the room's own lock, so a hub round trip for one room
+# never holds up another; relayed messages take no lock at all.
+rooms: dict[str, Room] = {}
+
+
+@asynccontextmanager
+async def _opened_room(code: str):
+    """This worker's Room for code, opened with the broker, with its lock held."""
+    while True:
+        room = rooms.get(code)
+        if room is None:
+            room = rooms[code] = Room(code)
+        async with room.lock:
+            if rooms.get(code) is not room:
+                continue  # emptied and closed while we waited for the lock
+            if not room.opened:
+                await broker.open(code, room)
+                room.opened = True
+            yield room
+            return
+
+
+async def _close_if_empty(room: Room) -> None:
+    """Call with room.lock held."""
+    if room.empty and rooms.get(room.code) is room:
+        del rooms[room.code]
+        await broker.close(room.code)
+
+
+async def join_room(code: str, conn: Connection) -> tuple[Room, int]:
+    async with _opened_room(code) as room:
+        index = await broker.claim(code)
+        if index >= 0:
+            room.join(index, conn)
+        else:
+            await _close_if_empty(room)
+        return room, index
+
+
+async def watch_room(code: str, conn: Connection) -> Optional[Room]:
+    """Add a spectator; None if this worker already has MAX_SPECTATORS on the room."""
+    async with _opened_room(code) as room:
+        if len(room.spectators) >= MAX_SPECTATORS:
+            return None
+        room.spectators.add(conn)
+        return room
+
+
+async def leave_room(room: Room, index: int, conn: Optional[Connection] = None) -> None:
+    """Free player slot index, or with index -1 remove spectator conn."""
+    async with room.lock:
+        if index >= 0:
+            room.leave(index)
+            await broker.release(room.code, index)
+        else:
+            room.spectators.discard(conn)  # type: ignore[arg-type]
+        await _close_if_empty(room)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await broker.start()
     yield
-    for room in rooms.values():
-        for ws in room:
-            try:
-                await ws.close()
-            except Exception:
-                pass
+    for room in list(rooms.values()):
+        for conn in [*room.players, *room.spectators]:
+            if conn is not None:
+                await conn.close()
+    await broker.stop()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -38,70 +411,165 @@ app.add_middleware(
 
 @app.get("/")
 def health():
-    """Health check for Render."""
+    """Health check for Render; 503 once this worker has lost its broker hub."""
+    if not broker.healthy:
+        return JSONResponse({"status": "broker lost", "service": "twistedchess"}, status_code=503)
     return {"status": "ok", "service": "twistedchess"}
 
 
+@app.get("/stats")
+def stats():
+    """Outbound queue depths per room, and messages lost to full queues."""
+    conns = [c for room in rooms.values() for c in (*room.players, *room.spectators) if c is not None]
+    return {
+        "broker": broker.name,
+        "rooms": len(rooms),
+        "connections": len(conns),
+        "spectators": sum(len(room.spectators) for room in rooms.values()),
+        "outbox_limit": OUTBOX_LIMIT,
+        "outbox_policy": OUTBOX_POLICY,
+        "queued": sum(c.depth for c in conns),
+        "max_queue": max((c.depth for c in conns), default=0),
+        "dropped": _totals["dropped"] + sum(c.dropped for c in conns),
+        "slow_disconnects": _totals["slow_disconnects"],
+        "spectator_resyncs": _totals["resyncs"],
+        "authoritative": AUTHORITATIVE,
+        "validation": {
+            "in_thread": VALIDATE_IN_THREAD,
+            "moves": _validation["moves"],
+            "rejected": _validation["rejected"],
+            "mean_us": round(_validation["seconds"] / _validation["moves"] * 1e6, 1) if _validation["moves"] else 0,
+            "max_us": round(_validation["max"] * 1e6, 1),
+        },
+        "queues": {code: [c.depth if c else None for c in room.players]
+                   + [max((c.depth for c in room.spectators), default=0)] for code, room in rooms.items()},
+    }
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    conn: Optional[Connection] = None
     code = ""
+    options: list[str] = []
+    room: Optional[Room] = None
     player_index = -1
 
     try:
-        # First message: room code
+        # First message: room code, with ";watch" for spectators and ";bin1" for binary frames
         raw = await websocket.receive_text()
-        code = raw.strip()
+        code, *options = raw.strip().split(";")
         if not code:
             await websocket.close(code=1008)
             return
+        if "watch" in options:
+            await watch(websocket, code)
+            return
 
-        async with _rooms_lock:
-            if code not in rooms:
-                rooms[code] = [websocket]
-                player_index = 0
-                await websocket.send_text("0")
-                print(f"[{code}] created — waiting for second player")
-            else:
-                rooms[code].append(websocket)
-                player_index = 1
-                await websocket.send_text("1")
-                print(f"[{code}] full — game on!")
+        binary = protocol.TOKEN in options or websocket.query_params.get("protocol") == protocol.TOKEN
+        conn = Connection(websocket, binary=binary)
+        room, player_index = await join_room(code, conn)
+        if player_index < 0:
+            print(f"[{code}] full — refused a third connection")
+            await websocket.close(code=1008)
+            return
+        conn.send(f"{player_index};{protocol.TOKEN}" if binary else str(player_index))
+        if player_index == 0:
+            print(f"[{code}] created — waiting for second player")
+        else:
+            print(f"[{code}] full — game on!")
 
-        # Relay messages to the other player
+        # Relay messages to the other player's and spectators' queues; their writer tasks do the sending
         while True:
-            data = await websocket.receive_text()
-            async with _rooms_lock:
-                room = rooms.get(code, [])
-            if len(room) == 2:
-                other = room[1 - player_index]
-                try:
-                    await other.send_text(data)
-                except Exception:
-                    break
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = message.get("bytes")
+            if data is None:
+                data, seq = message["text"], conn.next_seq()
+            else:
+                kind = protocol.check(data, conn.seq)
+                seq = conn.next_seq()
+                if kind == protocol.PING:
+                    conn.send(protocol.encode(protocol.PONG, seq))
+                    continue
+                if kind == protocol.PONG:
+                    continue
+                if kind == protocol.RESULT:
+                    raise protocol.ProtocolError("only the server sends results")
+            if room.game is not None:
+                if VALIDATE_IN_THREAD:
+                    refusal = await asyncio.to_thread(room.judge, player_index, data, seq)
+                else:
+                    refusal = room.judge(player_index, data, seq)
+                if refusal:
+                    raise IllegalMove(refusal)
+            room.relay(player_index, data, seq)
 
     except WebSocketDisconnect:
         pass
+    except IllegalMove as e:
+        print(f"[{code}] player {player_index} refused: {e}")
+        await websocket.close(code=1008)
+    except protocol.ProtocolError as e:
+        print(f"[{code}] player {player_index}: {e}")
+        await websocket.close(code=1007)
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        async with _rooms_lock:
-            if code in rooms:
-                try:
-                    rooms[code].remove(websocket)
-                except ValueError:
-                    pass
-                if not rooms[code]:
-                    del rooms[code]
         try:
-            await websocket.close()
-        except Exception:
-            pass
-        print(f"Player {player_index} left room {code}")
+            if room is not None and player_index >= 0:
+                await leave_room(room, player_index)
+        finally:
+            if conn is not None:
+                await conn.close()
+        if "watch" not in options:
+            print(f"Player {player_index} left room {code}")
+
+
+async def watch(websocket: WebSocket, code: str) -> None:
+    """A spectator: snapshot first, then every relayed message; anything it sends is ignored."""
+    room: Optional[Room] = None
+    conn = Connection(websocket, SPECTATOR_OUTBOX, "resync", lambda: room.snapshot())  # type: ignore[union-attr]
+    try:
+        room = await watch_room(code, conn)
+        if room is None:
+            print(f"[{code}] refused a spectator — {MAX_SPECTATORS} already watching")
+            await websocket.close(code=1013)
+            return
+        conn.send("watch")
+        conn.send(room.snapshot())
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        try:
+            if room is not None:
+                await leave_room(room, -1, conn)
+        finally:
+            await conn.close()
 
 
 if __name__ == "__main__":
     import os
     import uvicorn
     port = int(os.environ.get("PORT", 5555))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("TWISTEDCHESS_WORKERS", "1"))
+    if workers <= 1:
+        uvicorn.run(app, host="0.0.0.0", port=port)
+    else:
+        # several workers on this box: unless told otherwise, a local hub routes rooms between them
+        hub = None
+        if "TWISTEDCHESS_BROKER" not in os.environ:
+            address = "unix:/tmp/twistedchess-broker.sock"
+            os.environ["TWISTEDCHESS_BROKER"] = address
+            hub = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "broker.py"),
+                                    "--listen", address])
+        try:
+            uvicorn.run("server:app", host="0.0.0.0", port=port, workers=workers)
+        finally:
+            if hub:
+                hub.terminate()
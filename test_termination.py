@@ -0,0 +1,31 @@
+"""classes.Termination through game.Game. Run: python -m pytest -q"""
+from classes import REPETITION, Board
+from game import DRAWN, Game
+
+
+def _pawn_moves(game: Game) -> list[tuple[int, int, int, int]]:
+    return [m for m in game.legal_moves() if game.board.get(m[0], m[1]).type == "P"]  # type: ignore[union-attr]
+
+
+def test_pawn_cycle_is_a_threefold_draw():
+    # Each side only pushes its pawn. The push direction turns with the board,
+    # so both pawns walk a loop and the position comes back every 8 plies.
+    board, mtr = Board.from_fen("k7/8/6p1/8/8/1P6/8/7K w 0 - 0")
+    game = Game(board, mtr)
+    start = game.board.key
+    while not game.over and len(game.moves) < 40:
+        moves = _pawn_moves(game)
+        assert len(moves) == 1
+        game.play(*moves[0])
+        if len(game.moves) == 8:
+            assert game.board.key == start
+    assert (game.result, game.termination.reason) == (DRAWN, REPETITION)
+    assert len(game.moves) == 16
+
+
+def test_pawn_push_keeps_the_history():
+    board, mtr = Board.from_fen("k7/8/6p1/8/8/1P6/8/7K w 0 - 0")
+    game = Game(board, mtr)
+    game.play(*_pawn_moves(game)[0])
+    assert len(game.termination.history) == 2
+    assert game.termination.quiet_plies == 1